@@ -0,0 +1,312 @@
+"""Run agent scenarios end to end against a local stand-in for the API.
+
+Usage:
+    python -m benchmarks.agent_suite [SCENARIO ...]
+
+Without arguments, every scenario in `benchmarks/scenarios` is run. Each
+scenario runs headlessly in its own process and reports the number of steps,
+the wall time split into time waiting on the model and time spent in
+actions (including the agent's own overhead), the prompt and completion
+tokens, the peak RSS, the completions per model and the prefetched loads
+used.
+
+A scenario is a JSON file with:
+    request: The user request.
+    responses: The scripted completions, in order.
+    config: Optional `AgentConfig` fields, plus `use_async`.
+    tree: Optional directory tree created for the run (see `build_tree`).
+    pages: Optional pages served by a local web server, by path.
+    inputs: Optional answers to confirmation prompts and questions.
+    latency_s: Optional simulated model latency per request.
+
+`${tree}` and `${web}` in the request and responses are replaced with the
+path of the tree and the URL of the web server. With `--record`, requests
+are sent to the real API and the recorded completions replace the scripted
+ones in the scenario file.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import builtins
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Union
+
+import click
+from openai import AsyncOpenAI, OpenAI
+from rich.console import Console
+from rich.table import Table
+
+from gpt_do.actions.choose import Choose
+from gpt_do.actions.completion_cache import COMPLETION_CACHE
+from gpt_do.actions.file_index import FILE_INDEX
+from gpt_do.actions.page_cache import PAGE_CACHE
+from gpt_do.actions.routing import MODEL_ROUTER
+from gpt_do.actions.schema import response_schema
+from gpt_do.actions.session_state import SessionState
+from gpt_do.actions.step import Step
+from gpt_do.agent import AgentConfig, arun_session, run_session
+
+from .fake_openai import FakeOpenAI
+from .fixtures import FixtureWebServer, build_tree
+
+SCENARIO_DIR = Path(__file__).parent / "scenarios"
+STEP_FORMATS = (
+    response_schema(Step.Args).response_format,
+    response_schema(Choose.Args).response_format,
+)
+
+
+@dataclass
+class Result:
+    scenario: str
+    steps: int = 0
+    llm_calls: int = 0
+    wall_s: float = 0.0
+    llm_s: float = 0.0
+    action_s: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    peak_rss_mb: float = 0.0
+    # Completions per model, as routed.
+    models: dict[str, int] = field(default_factory=dict)
+    # Loads prefetched from the plan, and those served to an action.
+    prefetched: int = 0
+    prefetch_hits: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class Timer:
+    llm_s: float = 0.0
+    steps: int = 0
+
+    def count(self, kwargs: dict[str, Any]) -> None:
+        if kwargs.get("response_format") in STEP_FORMATS:
+            self.steps += 1
+
+
+def time_completions(client: Union[OpenAI, AsyncOpenAI], timer: Timer) -> None:
+    """Wrap the completion calls of a client to add up the time spent in them."""
+    completions: Any = client.chat.completions
+    streams: Any = client.beta.chat.completions
+    create, stream = completions.create, streams.stream
+
+    if isinstance(client, AsyncOpenAI):
+
+        async def acreate(*args: Any, **kwargs: Any) -> Any:
+            timer.count(kwargs)
+            started = time.perf_counter()
+            try:
+                return await create(*args, **kwargs)
+            finally:
+                timer.llm_s += time.perf_counter() - started
+
+        @contextlib.asynccontextmanager
+        async def astream(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+            timer.count(kwargs)
+            started = time.perf_counter()
+            try:
+                async with stream(*args, **kwargs) as events:
+                    yield events
+            finally:
+                timer.llm_s += time.perf_counter() - started
+
+        completions.create, streams.stream = acreate, astream
+        return
+
+    def sync_create(*args: Any, **kwargs: Any) -> Any:
+        timer.count(kwargs)
+        started = time.perf_counter()
+        try:
+            return create(*args, **kwargs)
+        finally:
+            timer.llm_s += time.perf_counter() - started
+
+    @contextlib.contextmanager
+    def sync_stream(*args: Any, **kwargs: Any) -> Iterator[Any]:
+        timer.count(kwargs)
+        started = time.perf_counter()
+        try:
+            with stream(*args, **kwargs) as events:
+                yield events
+        finally:
+            timer.llm_s += time.perf_counter() - started
+
+    completions.create, streams.stream = sync_create, sync_stream
+
+
+def scripted_input(answers: list[str]) -> Callable[..., str]:
+    """Return an `input` replacement answering from a script, then "y"."""
+
+    def answer(prompt: str = "") -> str:
+        reply = answers.pop(0) if answers else "y"
+        print(f"{prompt}{reply}")
+        return reply
+
+    return answer
+
+
+def substitute(value: Any, replacements: dict[str, str]) -> Any:
+    """Replace the placeholders in every string of a JSON value."""
+    text = json.dumps(value)
+    for placeholder, replacement in replacements.items():
+        text = text.replace(placeholder, json.dumps(replacement)[1:-1])
+    return json.loads(text)
+
+
+def run_scenario(path: Path, upstream_key: Optional[str] = None) -> Result:
+    """Run one scenario in the current process."""
+    scenario = json.loads(path.read_text())
+    result = Result(scenario=path.stem)
+    config = dict(scenario.get("config", {}))
+    use_async = config.pop("use_async", False)
+
+    with contextlib.ExitStack() as stack:
+        workdir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        tree = workdir / "tree"
+        build_tree(tree, scenario.get("tree", {}))
+        web = stack.enter_context(FixtureWebServer(scenario.get("pages", {})))
+        replacements = {"${tree}": str(tree), "${web}": web.url}
+        fake = stack.enter_context(
+            FakeOpenAI(
+                responses=substitute(scenario["responses"], replacements),
+                latency_s=scenario.get("latency_s", 0.0),
+                upstream_key=upstream_key,
+            )
+        )
+        # Keep the caches of the run out of the working directory.
+        PAGE_CACHE.directory = workdir / "http_cache"
+        FILE_INDEX.path = workdir / "file_index.sqlite3"
+        COMPLETION_CACHE.configure(mode="off")
+        builtins.input = scripted_input(list(scenario.get("inputs", [])))
+
+        request = substitute(scenario["request"], replacements)
+        timer = Timer()
+        client: Union[OpenAI, AsyncOpenAI]
+        if use_async:
+            client = AsyncOpenAI(api_key="fake", base_url=fake.base_url)
+        else:
+            client = OpenAI(api_key="fake", base_url=fake.base_url)
+        time_completions(client, timer)
+        state = SessionState()
+        started = time.perf_counter()
+        try:
+            if isinstance(client, AsyncOpenAI):
+                asyncio.run(arun_session(client, request, AgentConfig(**config), state))
+            else:
+                run_session(client, request, AgentConfig(**config), state)
+        except Exception as e:  # pylint: disable=broad-except
+            result.error = f"{type(e).__name__}: {e}"
+        result.wall_s = time.perf_counter() - started
+
+        result.steps = timer.steps
+        result.llm_calls = fake.stats.requests
+        result.llm_s = timer.llm_s
+        result.action_s = result.wall_s - timer.llm_s
+        result.prompt_tokens = fake.stats.prompt_tokens
+        result.completion_tokens = fake.stats.completion_tokens
+        result.models = {
+            model: stats.calls for model, stats in MODEL_ROUTER.stats.items()
+        }
+        result.prefetched = state.prefetcher.stats.predicted
+        result.prefetch_hits = state.prefetcher.stats.hits
+        if upstream_key is not None and result.error is None:
+            # Put the placeholders back in place of the paths of this run.
+            restore = {str(tree): "${tree}", web.url: "${web}"}
+            scenario["responses"] = substitute(fake.recorded, restore)
+            path.write_text(json.dumps(scenario, indent=2) + "\n")
+
+    # ru_maxrss is in KiB on Linux.
+    result.peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def _run_child(path: Path, upstream_key: Optional[str], results: Any) -> None:
+    results.put(asdict(run_scenario(path, upstream_key)))
+
+
+def run_isolated(path: Path, upstream_key: Optional[str] = None) -> Result:
+    """Run one scenario in a fresh process so its peak RSS is its own."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_child, args=(path, upstream_key, results))
+    process.start()
+    process.join()
+    if results.empty():
+        return Result(scenario=path.stem, error=f"exit code {process.exitcode}")
+    return Result(**results.get())
+
+
+def report(results: list[Result]) -> None:
+    table = Table(title="Agent benchmarks")
+    for column in (
+        "scenario",
+        "steps",
+        "LLM calls",
+        "wall (s)",
+        "LLM (s)",
+        "actions (s)",
+        "prompt tok",
+        "completion tok",
+        "peak RSS (MB)",
+        "models",
+        "prefetch hits",
+        "error",
+    ):
+        table.add_column(column)
+    for result in results:
+        table.add_row(
+            result.scenario,
+            str(result.steps),
+            str(result.llm_calls),
+            f"{result.wall_s:.3f}",
+            f"{result.llm_s:.3f}",
+            f"{result.action_s:.3f}",
+            str(result.prompt_tokens),
+            str(result.completion_tokens),
+            f"{result.peak_rss_mb:.1f}",
+            ", ".join(f"{model} x{calls}" for model, calls in result.models.items()),
+            f"{result.prefetch_hits}/{result.prefetched}" if result.prefetched else "",
+            result.error or "",
+        )
+    Console().print(table)
+
+
+@click.command()
+@click.argument("scenarios", nargs=-1, type=click.Path(exists=True, path_type=Path))
+@click.option("--repeat", type=int, default=1, show_default=True)
+@click.option(
+    "--record",
+    is_flag=True,
+    default=False,
+    help="Send requests to the real API and save the completions to the scenarios.",
+)
+@click.option("--json", "json_path", type=click.Path(path_type=Path), default=None)
+def main(
+    scenarios: tuple[Path, ...], repeat: int, record: bool, json_path: Path
+) -> None:
+    """Run agent scenarios against a local stand-in for the API."""
+    paths = list(scenarios) or sorted(SCENARIO_DIR.glob("*.json"))
+    upstream_key = os.environ["OPENAI_API_KEY"] if record else None
+    results = []
+    for path in paths:
+        runs = [run_isolated(path, upstream_key) for _ in range(repeat)]
+        results.append(min(runs, key=lambda run: run.wall_s))
+    report(results)
+    if json_path is not None:
+        json_path.write_text(json.dumps([asdict(r) for r in results], indent=2))
+    if any(result.error for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
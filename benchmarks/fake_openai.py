@@ -0,0 +1,224 @@
+"""A local stand-in for the OpenAI chat completions endpoint.
+
+Responses are served from a script, in order. With an upstream URL and API
+key, requests are forwarded instead and the completions recorded, so a
+script can be captured from a live run and replayed offline.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+import requests
+
+from gpt_do.context import CHARS_PER_TOKEN, estimate_tokens
+
+UPSTREAM_URL = "https://api.openai.com/v1"
+# Size of the content deltas sent when streaming.
+STREAM_CHUNK_CHARS = 16
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    rate_limited: int = 0
+
+
+@dataclass
+class FakeOpenAI:
+    """Serve scripted chat completions on a local port.
+
+    Args:
+        responses: The JSON payloads returned as the content of the
+            successive completions.
+        latency_s: Simulated model latency per request.
+        upstream_key: If set, forward the requests to the real API instead
+            and record the completions in `recorded`.
+        requests_per_minute: If set, answer requests over this rate with 429
+            and report the limit in `x-ratelimit-*` headers like the API.
+            Up to a second's worth of requests can be sent at once.
+    """
+
+    responses: list[Any] = field(default_factory=list)
+    latency_s: float = 0.0
+    upstream_key: Optional[str] = None
+    upstream_url: str = UPSTREAM_URL
+    recorded: list[Any] = field(default_factory=list)
+    requests_per_minute: Optional[float] = None
+    stats: ServerStats = field(default_factory=ServerStats)
+    _server: Optional[ThreadingHTTPServer] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _allowance: float = 0.0
+    _allowance_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}/v1"
+
+    def __enter__(self) -> FakeOpenAI:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                fake.handle(self, request)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        assert self._server is not None
+        self._server.shutdown()
+        self._server.server_close()
+
+    def next_content(self, request: dict[str, Any]) -> str:
+        """Return the content of the next completion."""
+        if self.upstream_key is not None:
+            response = requests.post(
+                f"{self.upstream_url}/chat/completions",
+                headers={"Authorization": f"Bearer {self.upstream_key}"},
+                json={**request, "stream": False},
+                timeout=300,
+            )
+            response.raise_for_status()
+            content = response.json()["choices"][0]["message"]["content"]
+            with self._lock:
+                self.recorded.append(json.loads(content))
+            return str(content)
+        time.sleep(self.latency_s)
+        with self._lock:
+            if not self.responses:
+                raise RuntimeError("The script has no responses left")
+            return json.dumps(self.responses.pop(0))
+
+    def admit(self) -> tuple[bool, dict[str, str]]:
+        """Return whether a request is within the rate limit, and the headers."""
+        if self.requests_per_minute is None:
+            return True, {}
+        per_s = self.requests_per_minute / 60
+        burst = max(1.0, per_s)
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._allowance_at
+            self._allowance = min(burst, self._allowance + elapsed * per_s)
+            self._allowance_at = now
+            admitted = self._allowance >= 1
+            if admitted:
+                self._allowance -= 1
+            else:
+                self.stats.rate_limited += 1
+            reset_ms = max(0.0, (1 - self._allowance) / per_s * 1000)
+            headers = {
+                "x-ratelimit-limit-requests": str(int(self.requests_per_minute)),
+                "x-ratelimit-remaining-requests": str(int(self._allowance)),
+                "x-ratelimit-reset-requests": f"{reset_ms:.0f}ms",
+            }
+        if not admitted:
+            headers["retry-after-ms"] = f"{reset_ms:.0f}"
+        return admitted, headers
+
+    def handle(self, handler: BaseHTTPRequestHandler, request: dict[str, Any]) -> None:
+        admitted, rate_headers = self.admit()
+        if not admitted:
+            error = {
+                "error": {
+                    "message": "Rate limit reached for requests",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }
+            }
+            handler.send_response(429)
+            for name, value in rate_headers.items():
+                handler.send_header(name, value)
+            handler.send_header("Content-Type", "application/json")
+            handler.end_headers()
+            handler.wfile.write(json.dumps(error).encode())
+            return
+        try:
+            content = self.next_content(request)
+        except (RuntimeError, requests.RequestException) as e:
+            error = {"error": {"message": str(e), "type": "fake"}}
+            handler.send_response(500)
+            handler.send_header("Content-Type", "application/json")
+            handler.end_headers()
+            handler.wfile.write(json.dumps(error).encode())
+            return
+
+        prompt_tokens = sum(
+            estimate_tokens(message) for message in request.get("messages", [])
+        )
+        completion_tokens = len(content) // CHARS_PER_TOKEN + 1
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.prompt_tokens += prompt_tokens
+            self.stats.completion_tokens += completion_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        base = {
+            "id": f"chatcmpl-fake-{self.stats.requests}",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+        }
+
+        handler.send_response(200)
+        for name, value in rate_headers.items():
+            handler.send_header(name, value)
+        if not request.get("stream"):
+            message = {"role": "assistant", "content": content, "refusal": None}
+            body = {
+                **base,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "stop",
+                        "logprobs": None,
+                    }
+                ],
+                "usage": usage,
+            }
+            handler.send_header("Content-Type", "application/json")
+            handler.end_headers()
+            handler.wfile.write(json.dumps(body).encode())
+            return
+
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.end_headers()
+        chunk = {**base, "object": "chat.completion.chunk"}
+        deltas: list[dict[str, Any]] = [{"role": "assistant", "content": ""}]
+        deltas.extend(
+            {"content": content[i : i + STREAM_CHUNK_CHARS]}
+            for i in range(0, len(content), STREAM_CHUNK_CHARS)
+        )
+        events = [
+            {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            for delta in deltas
+        ]
+        events.append(
+            {
+                **chunk,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+        )
+        for event in events:
+            handler.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+        handler.wfile.write(b"data: [DONE]\n\n")
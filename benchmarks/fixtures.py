@@ -0,0 +1,83 @@
+"""Fixture directory trees and web servers for the agent benchmarks."""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional, Union
+
+# A file is its text; a directory maps names to files and directories.
+Tree = dict[str, Union[str, "Tree"]]
+
+
+def build_tree(root: Path, tree: Tree) -> None:
+    """Create the files and directories of `tree` under `root`."""
+    root.mkdir(parents=True, exist_ok=True)
+    for name, node in tree.items():
+        if isinstance(node, dict):
+            build_tree(root / name, node)
+        else:
+            (root / name).write_text(node)
+
+
+@dataclass
+class FixtureWebServer:
+    """Serve fixed pages on a local port.
+
+    Pages are cacheable and carry an ETag, so conditional requests can be
+    exercised too.
+    """
+
+    pages: dict[str, str] = field(default_factory=dict)
+    hits: dict[str, int] = field(default_factory=dict)
+    _server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def __enter__(self) -> FixtureWebServer:
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                fixture.hits[self.path] = fixture.hits.get(self.path, 0) + 1
+                page = fixture.pages.get(self.path)
+                if page is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = f'"{hash(page) & 0xFFFFFFFF:x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = page.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "max-age=60")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        assert self._server is not None
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,92 @@
+"""Compare the lxml main-content extraction against the BeautifulSoup baseline.
+
+Usage:
+    python -m benchmarks.html_extraction [FILE_OR_URL ...]
+
+Without arguments, synthetic pages of increasing size are used.
+"""
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Callable
+
+import click
+
+from gpt_do.actions import web
+from gpt_do.actions.html_extract import extract, extract_bs4
+from gpt_do.context import CHARS_PER_TOKEN
+
+Extractor = Callable[[str, str], tuple[str, list[str]]]
+
+EXTRACTORS: dict[str, Extractor] = {
+    "bs4": extract_bs4,
+    "lxml": extract,
+}
+
+
+def synthetic_page(sections: int) -> str:
+    """Return a documentation-like page with navigation and boilerplate."""
+    nav = "".join(f'<li><a href="/page/{i}">Page {i}</a></li>' for i in range(200))
+    body = "".join(
+        f"<section><h2>Section {i}</h2>"
+        f"<p>{'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 6}"
+        f'<a href="/ref/{i}">reference {i}</a></p>'
+        f"<pre>def f{i}(x):\n    return x * {i}</pre>"
+        f"<ul><li>point one</li><li>point two</li></ul></section>"
+        for i in range(sections)
+    )
+    script = "<script>" + "var x = 1;" * 500 + "</script>"
+    footer = "".join(f'<a href="/legal/{i}">Legal {i}</a>' for i in range(50))
+    return (
+        f"<html><head><style>body{{}}</style>{script}</head><body>"
+        f'<nav class="sidebar"><ul>{nav}</ul></nav>'
+        f'<div class="cookie-banner">We use cookies.</div>'
+        f"<main>{body}</main><footer>{footer}</footer>{script}</body></html>"
+    )
+
+
+def load(source: str) -> str:
+    if source.startswith(("http://", "https://")):
+        response = web.get(source)
+        response.raise_for_status()
+        return response.text
+    return Path(source).read_text(errors="replace")
+
+
+def best_time(extractor: Extractor, html: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extractor(html, "https://example.com/")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command()
+@click.argument("sources", nargs=-1)
+@click.option("--repeat", type=int, default=5, show_default=True)
+def main(sources: tuple[str, ...], repeat: int) -> None:
+    pages = (
+        {source: load(source) for source in sources}
+        if sources
+        else {f"synthetic-{n}": synthetic_page(n) for n in (10, 100, 1000)}
+    )
+    print(
+        f"{'page':<24} {'input KiB':>10} {'extractor':>9} {'ms':>9} "
+        f"{'~tokens':>9} {'links':>6}"
+    )
+    for name, html in pages.items():
+        for extractor_name, extractor in EXTRACTORS.items():
+            seconds = best_time(extractor, html, repeat)
+            text, links = extractor(html, "https://example.com/")
+            print(
+                f"{name[:24]:<24} {len(html) / 1024:>10.1f} {extractor_name:>9} "
+                f"{seconds * 1000:>9.2f} {len(text) // CHARS_PER_TOKEN:>9} "
+                f"{len(links):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -1,6 +1,8 @@
 from pathlib import Path
 
 MODEL = "gpt-4o"
+# Model of the completions routed to the fast tier.
+FAST_MODEL = "gpt-4o-mini"
 
 TMP_DIR = Path.cwd() / "tmp"
 LOG_DIR = TMP_DIR / "logs"
@@ -8,3 +10,7 @@ LOG_DIR = TMP_DIR / "logs"
 
 class GptDont(Exception):
     """Base exception for gpt_do package."""
+
+
+class StepLimitReached(GptDont):
+    """The session took more steps than allowed."""
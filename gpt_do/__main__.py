@@ -1,17 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import datetime as dt
+import importlib
 import logging
-from typing import Any, Optional
+import threading
+from pathlib import Path
+from typing import Optional
 
 import click
-from openai import OpenAI
-from openai.types.chat import ChatCompletionMessageParam
 from rich import print as rprint
 from rich.logging import RichHandler
 
-from . import LOG_DIR
-from .actions import Action, ActionEnum, Choose, Complete
+from . import FAST_MODEL, LOG_DIR, MODEL
+from .actions import web
+from .actions.action import PROMPT_CACHE_STATS
+from .actions.completion_cache import COMPLETION_CACHE
+from .actions.execute_bash_command import ExecuteBashCommand
+from .actions.page_cache import PAGE_CACHE
+from .actions.rate_limit import RATE_LIMITER
+from .actions.read_file import ReadFile
+from .actions.routing import MODEL_ROUTER, parse_routes
+from .actions.session_state import SessionState
+from .actions.shell_session import SHELL_SESSION
+from .agent import AgentConfig, arun_session, run_session
+from .tracing import TRACER
 
 logger = logging.getLogger("gpt_do")
 
@@ -71,6 +85,30 @@ def init_logging(verbosity: int, quiet: int) -> None:
     logger.debug("File log level: DEBUG")
 
 
+def preload(*modules: str) -> None:
+    """Import modules on a background thread, e.g. while waiting for input."""
+
+    def load() -> None:
+        # Import errors are raised again where the modules are used.
+        with contextlib.suppress(ImportError):
+            for module in modules:
+                importlib.import_module(module)
+
+    threading.Thread(target=load, name="preload", daemon=True).start()
+
+
+def write_trace() -> None:
+    """Export the spans of the session next to the log files."""
+    timestamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+    jsonl_path = LOG_DIR / f"trace_{timestamp}.jsonl"
+    chrome_path = LOG_DIR / f"trace_{timestamp}.trace.json"
+    TRACER.export_jsonl(jsonl_path)
+    TRACER.export_chrome(chrome_path)
+    for name, (count, total_s) in sorted(TRACER.summary().items()):
+        logger.info(f"[bold]Trace[/]: {name} x{count} {total_s:.3f}s")
+    logger.info(f"[bold]Trace[/]: {jsonl_path} (Chrome trace: {chrome_path})")
+
+
 @click.command()
 @click.option(
     "--api-key",
@@ -90,10 +128,306 @@ def init_logging(verbosity: int, quiet: int) -> None:
     count=True,
     help="Decrease verbosity. Can be used multiple times.",
 )
+@click.option(
+    "--step-mode",
+    type=click.Choice(["fused", "two-phase"]),
+    default="fused",
+    show_default=True,
+    help=(
+        "Whether each step selects the action and its arguments in a single "
+        "completion (fused) or in two separate completions (two-phase)."
+    ),
+)
+@click.option(
+    "--context-budget",
+    type=int,
+    default=32_000,
+    show_default=True,
+    help="Approximate token budget for the history before older turns are compacted.",
+)
+@click.option(
+    "--keep-recent",
+    type=int,
+    default=8,
+    show_default=True,
+    help="Number of most recent messages that are never compacted.",
+)
+@click.option(
+    "--compaction",
+    type=click.Choice(["summarize", "evict"]),
+    default="summarize",
+    show_default=True,
+    help="Whether older turns are summarized or dropped once over budget.",
+)
+@click.option(
+    "--prompt-layout",
+    type=click.Choice(["cacheable", "inline"]),
+    default="cacheable",
+    show_default=True,
+    help=(
+        "Whether action instructions and volatile facts are sent only with each "
+        "request (cacheable) or kept in the history (inline)."
+    ),
+)
+@click.option(
+    "--stream/--no-stream",
+    default=False,
+    show_default=True,
+    help=(
+        "Stream completions, previewing them live as they arrive and starting "
+        "the read-only actions of a step while the rest of it streams."
+    ),
+)
+@click.option(
+    "--max-workers",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Maximum number of read-only actions performed concurrently in one step.",
+)
+@click.option(
+    "--async",
+    "use_async",
+    is_flag=True,
+    default=False,
+    help="Drive the session with the asyncio engine and AsyncOpenAI.",
+)
+@click.option(
+    "--http-timeout",
+    type=float,
+    default=10,
+    show_default=True,
+    help="Timeout in seconds for the HTTP requests made by actions.",
+)
+@click.option(
+    "--http-pool-size",
+    type=int,
+    default=10,
+    show_default=True,
+    help="Number of keep-alive connections pooled per host.",
+)
+@click.option(
+    "--http-retries",
+    type=int,
+    default=3,
+    show_default=True,
+    help="Number of retries for failed or throttled HTTP requests.",
+)
+@click.option(
+    "--http-cache/--no-http-cache",
+    default=True,
+    show_default=True,
+    help="Cache loaded web pages on disk and revalidate them with conditional GETs.",
+)
+@click.option(
+    "--http-cache-size",
+    type=int,
+    default=256,
+    show_default=True,
+    help="Maximum size of the web page cache in MiB.",
+)
+@click.option(
+    "--read-size-cap",
+    type=int,
+    default=1024,
+    show_default=True,
+    help="Maximum number of KiB of a file decoded by a single ReadFile.",
+)
+@click.option(
+    "--bash-timeout",
+    type=float,
+    default=300,
+    show_default=True,
+    help="Default timeout in seconds after which Bash commands are killed.",
+)
+@click.option(
+    "--bash-capture",
+    type=int,
+    default=8,
+    show_default=True,
+    help="KiB kept from both the start and the end of each command output.",
+)
+@click.option(
+    "--bash-spill/--no-bash-spill",
+    default=True,
+    show_default=True,
+    help="Save the full output of commands to a file when it is cut.",
+)
+@click.option(
+    "--persistent-shell/--no-persistent-shell",
+    default=False,
+    show_default=True,
+    help="Run Bash commands in one long-lived shell that keeps its state.",
+)
+@click.option(
+    "--completion-cache",
+    type=click.Choice(["off", "read-only", "read-write", "record"]),
+    default="off",
+    show_default=True,
+    help=(
+        "Reuse cached completions of identical requests (read-only, read-write) "
+        "or send every request and cache its completion (record)."
+    ),
+)
+@click.option(
+    "--completion-cache-ttl",
+    type=float,
+    default=7 * 24,
+    show_default=True,
+    help="Hours after which cached completions expire.",
+)
+@click.option(
+    "--completion-cache-size",
+    type=int,
+    default=64,
+    show_default=True,
+    help="Maximum size of the completion cache in MiB.",
+)
+@click.option(
+    "--fast-model",
+    default=FAST_MODEL,
+    show_default=True,
+    help="Model of the completions routed to the fast tier.",
+)
+@click.option(
+    "--strong-model",
+    default=MODEL,
+    show_default=True,
+    help="Model of the completions routed to the strong tier.",
+)
+@click.option(
+    "--route",
+    "routes",
+    multiple=True,
+    metavar="ROUTE=TIER",
+    help=(
+        "Route the completions of an action (e.g. READ_FILE), or of STEP, "
+        "CHOOSE or SUMMARY, to a tier (fast or strong) or a model. "
+        "Can be used multiple times."
+    ),
+)
+@click.option(
+    "--escalate/--no-escalate",
+    default=True,
+    show_default=True,
+    help="Request refused or invalid fast completions again from the strong model.",
+)
+@click.option(
+    "--prefetch/--no-prefetch",
+    default=False,
+    show_default=True,
+    help=(
+        "Read the files and list the directories named in the plan while the "
+        "next step is selected. Loads needing confirmation, such as web pages, "
+        "are never prefetched."
+    ),
+)
+@click.option(
+    "--rate-limit/--no-rate-limit",
+    default=True,
+    show_default=True,
+    help=(
+        "Pace the API requests of all sessions within the rate limits and "
+        "retry throttled or failed requests."
+    ),
+)
+@click.option(
+    "--requests-per-minute",
+    type=float,
+    default=None,
+    help="API requests allowed per minute. Defaults to the limit the API reports.",
+)
+@click.option(
+    "--tokens-per-minute",
+    type=float,
+    default=None,
+    help="API tokens allowed per minute. Defaults to the limit the API reports.",
+)
+@click.option(
+    "--api-retries",
+    type=int,
+    default=6,
+    show_default=True,
+    help="Number of retries for throttled or failed API requests.",
+)
+@click.option(
+    "--api-concurrency",
+    type=int,
+    default=16,
+    show_default=True,
+    help="Maximum number of concurrent API requests.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Trace the session and write the spans as JSONL and Chrome trace events.",
+)
+@click.option(
+    "--batch",
+    "batch_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help=(
+        "Run the requests of a JSONL file unattended instead of prompting for "
+        "one. Each line has a request and optionally an id and a policy."
+    ),
+)
+@click.option(
+    "--batch-results",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help=(
+        "JSONL file the batch results are appended to. Requests with a result "
+        "there are skipped. Defaults to FILE.results.jsonl next to the batch."
+    ),
+)
+@click.option(
+    "--batch-workers",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Number of batch sessions run concurrently.",
+)
 def cli(
     api_key: Optional[str],
     verbose: int,
     quiet: int,
+    step_mode: str,
+    context_budget: int,
+    keep_recent: int,
+    compaction: str,
+    prompt_layout: str,
+    stream: bool,
+    max_workers: int,
+    use_async: bool,
+    http_timeout: float,
+    http_pool_size: int,
+    http_retries: int,
+    http_cache: bool,
+    http_cache_size: int,
+    read_size_cap: int,
+    bash_timeout: float,
+    bash_capture: int,
+    bash_spill: bool,
+    persistent_shell: bool,
+    completion_cache: str,
+    completion_cache_ttl: float,
+    completion_cache_size: int,
+    fast_model: str,
+    strong_model: str,
+    routes: tuple[str, ...],
+    escalate: bool,
+    prefetch: bool,
+    rate_limit: bool,
+    requests_per_minute: Optional[float],
+    tokens_per_minute: Optional[float],
+    api_retries: int,
+    api_concurrency: int,
+    profile: bool,
+    batch_path: Optional[Path],
+    batch_results: Optional[Path],
+    batch_workers: int,
 ) -> None:
     """
     Command-line interface for the gpt_do tool.
@@ -102,30 +436,106 @@ def cli(
         api_key (Optional[str]): OpenAI API key.
         verbose (int): Verbosity level (number of `-v` flags).
         quiet (int): Quietness level (number of `-q` flags).
+        step_mode (str): Either "fused" or "two-phase".
+        context_budget (int): Approximate token budget for the history.
+        keep_recent (int): Number of recent messages kept verbatim.
+        compaction (str): Either "summarize" or "evict".
+        prompt_layout (str): Either "cacheable" or "inline".
+        stream (bool): Whether to stream completions.
+        max_workers (int): Maximum number of concurrent actions per step.
+        use_async (bool): Whether to use the asyncio engine.
+        http_timeout (float): Timeout for HTTP requests made by actions.
+        http_pool_size (int): Number of pooled connections per host.
+        http_retries (int): Number of retries for HTTP requests.
+        http_cache (bool): Whether to cache loaded web pages on disk.
+        http_cache_size (int): Maximum size of the web page cache in MiB.
+        read_size_cap (int): Maximum size of a single file read in KiB.
+        bash_timeout (float): Default timeout for Bash commands in seconds.
+        bash_capture (int): KiB kept from each end of a command output.
+        bash_spill (bool): Whether to save cut command outputs to files.
+        persistent_shell (bool): Whether to run commands in a long-lived shell.
+        completion_cache (str): Either "off", "read-only", "read-write" or "record".
+        completion_cache_ttl (float): Lifetime of cached completions in hours.
+        completion_cache_size (int): Maximum size of the completion cache in MiB.
+        fast_model (str): Model of the fast tier.
+        strong_model (str): Model of the strong tier.
+        routes (tuple[str, ...]): Routes of completions to tiers or models.
+        escalate (bool): Whether to escalate failed fast completions.
+        prefetch (bool): Whether to prefetch the loads named in the plan.
+        rate_limit (bool): Whether to pace and retry the API requests.
+        requests_per_minute (Optional[float]): API requests allowed per minute.
+        tokens_per_minute (Optional[float]): API tokens allowed per minute.
+        api_retries (int): Number of retries for API requests.
+        api_concurrency (int): Maximum number of concurrent API requests.
+        profile (bool): Whether to trace the session and export the spans.
+        batch_path (Optional[Path]): JSONL file of requests to run unattended.
+        batch_results (Optional[Path]): JSONL file the batch results go to.
+        batch_workers (int): Number of concurrent batch sessions.
     """
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
     init_logging(verbosity=verbose, quiet=quiet)
 
-    client = OpenAI(api_key=api_key)
-    system_lines = [
-        "You are an agent autonomously executing a task.",
-        "You will have the ability to execute a sequence of actions.",
-        "You must fully fulfill the user's request.",
-        "Do not hallucinate any details.",
-        "You have access to the following tools:",
-        ActionEnum.list(),
-        f"The current date and time is {dt.datetime.now().isoformat()}.",
-        "The user is in the Pacific time zone",
-    ]
-    history: list[ChatCompletionMessageParam] = [
-        {"role": "system", "content": "\n".join(system_lines)},
-    ]
-
-    ActionEnum.validate()
+    web.configure(
+        timeout_s=http_timeout,
+        pool_maxsize=http_pool_size,
+        retries=http_retries,
+    )
+    PAGE_CACHE.configure(enabled=http_cache, max_bytes=http_cache_size * 1024 * 1024)
+    ReadFile.SIZE_CAP = read_size_cap * 1024
+    ExecuteBashCommand.TIMEOUT_S = bash_timeout
+    ExecuteBashCommand.CAPTURE_BYTES = bash_capture * 1024
+    if not bash_spill:
+        ExecuteBashCommand.SPILL_DIR = None
+    if batch_path is not None and persistent_shell:
+        logger.warning("The persistent shell can't be shared by batch sessions")
+        persistent_shell = False
+    SHELL_SESSION.configure(enabled=persistent_shell)
+    COMPLETION_CACHE.configure(
+        mode=completion_cache,
+        ttl_s=completion_cache_ttl * 60 * 60,
+        max_bytes=completion_cache_size * 1024 * 1024,
+    )
+    try:
+        parsed_routes = parse_routes(routes)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--route") from None
+    MODEL_ROUTER.configure(
+        fast_model=fast_model,
+        strong_model=strong_model,
+        routes=parsed_routes,
+        escalate=escalate,
+    )
+    RATE_LIMITER.configure(
+        enabled=rate_limit,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        max_retries=api_retries,
+        max_concurrency=api_concurrency,
+    )
+    TRACER.configure(enabled=profile)
+    config = AgentConfig(
+        step_mode=step_mode,
+        prompt_layout=prompt_layout,
+        stream=stream,
+        max_workers=max_workers,
+        context_budget=context_budget,
+        keep_recent=keep_recent,
+        compaction=compaction,
+        prefetch=prefetch,
+    )
+
+    if batch_path is not None:
+        if batch_results is None:
+            batch_results = batch_path.with_suffix(".results.jsonl")
+        run_batch_cli(api_key, batch_path, batch_results, batch_workers, config)
+        return
 
     # TODO: build (and confirm) objectives?
 
+    # The client library is the slowest import by far; load it while the
+    # user is typing.
+    preload("openai")
     rprint("[bold]User Request[/]")
     user_request = input()
     print()
@@ -151,20 +561,88 @@ def cli(
     #     "https://docs.google.com/forms/d/e/1FAIpQLSdEAmP0HKukCwP-dvHFBNK5gw6OdeJkcJ_flWDVozF4NKCCGg/viewform"
     # )
     # pylint: enable=line-too-long
-    history.append({"role": "user", "content": user_request})
-
-    while True:
-        # select action
-        select_output: Choose.Output = Choose.run(client, history)
-        # perform action
-        action: type[Action[Any, Any]] = select_output.action.to_action()
-        logger.info(f"[bold]Action[/]: {action.__name__} - {action.summary()}")
-        action.run(client, history)
-        # check if done
-        if action == Complete:
-            # TODO: allow denying the completion
-            break
-        # TODO: summarize context
+
+    from openai import AsyncOpenAI, OpenAI
+
+    state = SessionState()
+    try:
+        if use_async:
+            asyncio.run(
+                arun_session(
+                    AsyncOpenAI(
+                        api_key=api_key,
+                        **RATE_LIMITER.client_options(asynchronous=True),
+                    ),
+                    user_request,
+                    config,
+                    state,
+                )
+            )
+        else:
+            run_session(
+                OpenAI(api_key=api_key, **RATE_LIMITER.client_options()),
+                user_request,
+                config,
+                state,
+            )
+    finally:
+        # Don't leave the persistent shell behind, e.g. on a denied action.
+        SHELL_SESSION.close()
+        # A trace is most useful for the sessions that went wrong.
+        if TRACER.enabled:
+            write_trace()
+
+    log_cache_stats()
+    logger.debug(f"File cache: {state.file_cache.stats}")
+    if config.stream:
+        logger.debug(f"Early dispatch: {state.dispatch.stats}")
+    if config.prefetch:
+        logger.info(f"[bold]Prefetch[/]: {state.prefetcher.stats}")
+
+
+def run_batch_cli(
+    api_key: Optional[str],
+    batch_path: Path,
+    results_path: Path,
+    workers: int,
+    config: AgentConfig,
+) -> None:
+    """Run a batch file with the asyncio engine."""
+    from openai import AsyncOpenAI
+
+    from .batch import run_batch
+
+    try:
+        asyncio.run(
+            run_batch(
+                AsyncOpenAI(
+                    api_key=api_key, **RATE_LIMITER.client_options(asynchronous=True)
+                ),
+                batch_path,
+                results_path,
+                config,
+                workers=workers,
+            )
+        )
+    finally:
+        if TRACER.enabled:
+            write_trace()
+    log_cache_stats()
+
+
+def log_cache_stats() -> None:
+    logger.info(
+        f"[bold]Prompt cache[/]: {PROMPT_CACHE_STATS.cached_tokens}"
+        f"/{PROMPT_CACHE_STATS.prompt_tokens} prompt tokens cached "
+        f"({PROMPT_CACHE_STATS.hit_rate:.0%})"
+    )
+    logger.debug(f"Page cache: {PAGE_CACHE.stats}")
+    if COMPLETION_CACHE.enabled:
+        logger.info(f"[bold]Completion cache[/]: {COMPLETION_CACHE.stats}")
+    if RATE_LIMITER.enabled:
+        logger.info(f"[bold]Rate limiter[/]: {RATE_LIMITER.stats}")
+    for model, stats in sorted(MODEL_ROUTER.stats.items()):
+        logger.info(f"[bold]Model[/]: {model}: {stats}")
 
 
 if __name__ == "__main__":
@@ -1,10 +1,14 @@
 from .action import Action
 from .choose import ActionEnum, Choose
 from .complete import Complete
+from .step import Step, aexecute_steps, execute_steps
 
 __all__ = [
     "Action",
     "Choose",
     "Complete",
     "ActionEnum",
+    "Step",
+    "execute_steps",
+    "aexecute_steps",
 ]
@@ -1,17 +1,35 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import functools
 import json
 import logging
 import textwrap
+import time
 from abc import abstractmethod
-from typing import Any, Protocol, Type, TypeVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional, Protocol, Sequence, Type, TypeVar
 
-import openai
-from openai import OpenAI
-from openai.types.chat import ChatCompletionMessageParam
 from pydantic import BaseModel
 
-from .. import MODEL, GptDont
+from .. import GptDont
+from ..prompt import volatile_message
+from ..tracing import TRACER, Span
+from .completion_cache import COMPLETION_CACHE
+from .rate_limit import RATE_LIMITER
+from .registry import REGISTRY
+from .routing import MODEL_ROUTER
+from .schema import response_schema
+from .session_state import current_session
+from .streaming import astream_parse, stream_parse
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types import CompletionUsage
+    from openai.types.chat import ChatCompletion, ChatCompletionMessageParam
+
+    from .prefetch import Speculation
 
 logger = logging.getLogger(__name__)
 
@@ -19,12 +37,43 @@ ArgsT = TypeVar("ArgsT", bound=BaseModel)
 OutputT = TypeVar("OutputT", bound=BaseModel)
 
 
+@dataclass
+class PromptCacheStats:
+    """Running totals of prompt tokens served from the provider's prefix cache."""
+
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    def record(self, usage: CompletionUsage) -> None:
+        cached = 0
+        if usage.prompt_tokens_details is not None:
+            cached = usage.prompt_tokens_details.cached_tokens or 0
+        self.prompt_tokens += usage.prompt_tokens
+        self.cached_tokens += cached
+        logger.debug(f"Prompt cache: {cached}/{usage.prompt_tokens} tokens cached")
+
+    @property
+    def hit_rate(self) -> float:
+        if not self.prompt_tokens:
+            return 0.0
+        return self.cached_tokens / self.prompt_tokens
+
+
+PROMPT_CACHE_STATS = PromptCacheStats()
+
+
 class Action(Protocol[ArgsT, OutputT]):
     """Base class for actions."""
 
     Args: Type[ArgsT]
     Output: Type[OutputT]
     confirm: bool
+    # Dotted paths of string arguments rendered live while streaming.
+    preview_fields: tuple[str, ...] = ()
+    # Whether the action is free of side effects and user interaction.
+    read_only: bool = False
+    # Tier of the model filling in the arguments, unless routed otherwise.
+    model_tier: str = "strong"
 
     @classmethod
     def description(cls) -> str:
@@ -39,56 +88,421 @@ class Action(Protocol[ArgsT, OutputT]):
         """Return the action summary."""
         return cls.description().split("\n", maxsplit=1)[0].strip()
 
+    @classmethod
+    def route(cls) -> str:
+        """Return the route of the completions of the action (see `ModelRouter`)."""
+        try:
+            return REGISTRY.name_of(cls)
+        except NotImplementedError:
+            return cls.__name__.upper()
+
+    @classmethod
+    def speculate(cls, target: str) -> Optional[Speculation]:
+        """Return the load implied by a URL or path named in the plan, if any.
+
+        Only read-only actions that need no confirmation are asked (see
+        `Prefetcher`).
+        """
+        return None
+
+    @classmethod
+    def dispatch_partial(cls, partial_args: Any) -> None:
+        """Start what a streaming completion of the arguments already settles.
+
+        Called with the partially parsed arguments as they grow.
+        """
+
+    @classmethod
+    def escalation_reason(cls, args: ArgsT) -> Optional[str]:
+        """Return why arguments filled in by the fast model need the strong one.
+
+        Only asked with escalation, before the last model is tried.
+        """
+        return None
+
     @classmethod
     @abstractmethod
     def perform(cls, args: ArgsT) -> OutputT:
         """Perform the action."""
 
     @classmethod
-    def run(cls, client: OpenAI, context: list[ChatCompletionMessageParam]) -> OutputT:
-        """Run the action."""
+    def run(
+        cls,
+        client: OpenAI,
+        context: list[ChatCompletionMessageParam],
+        cacheable: bool = False,
+        stream: bool = False,
+    ) -> OutputT:
+        """Run the action.
+
+        With a cacheable layout the action instructions and the volatile facts
+        are only sent with this request instead of being added to the context,
+        so the context stays a stable prefix across requests.
 
-        context.append(
+        With streaming the arguments are previewed as they arrive, and what
+        they already settle can be started early (see `dispatch_partial`).
+        """
+        with TRACER.span(f"{cls.__name__}.run", history=context):
+            instructions = cls._instructions(context, cacheable)
+            if cls.Args.model_fields:
+                args = cls.complete(client, context, instructions, stream)
+            else:
+                args = cls.Args()
+            return cls.execute(args, context)
+
+    @classmethod
+    async def arun(
+        cls,
+        client: AsyncOpenAI,
+        context: list[ChatCompletionMessageParam],
+        cacheable: bool = False,
+        stream: bool = False,
+    ) -> OutputT:
+        """Run the action on the event loop (see `run`)."""
+        with TRACER.span(f"{cls.__name__}.run", history=context):
+            instructions = cls._instructions(context, cacheable)
+            if cls.Args.model_fields:
+                args = await cls.acomplete(client, context, instructions, stream)
+            else:
+                args = cls.Args()
+            return await cls.aexecute(args, context)
+
+    @classmethod
+    def _instructions(
+        cls, context: list[ChatCompletionMessageParam], cacheable: bool
+    ) -> list[ChatCompletionMessageParam]:
+        """Return the messages to send after the context for this action.
+
+        With an inline layout they are added to the context instead.
+        """
+        instructions: list[ChatCompletionMessageParam] = [
             {"role": "system", "content": cls.description()},
-        )
+        ]
+        if cacheable:
+            instructions.append(volatile_message())
+        else:
+            context.extend(instructions)
+            instructions = []
         logger.debug(context)
-        if cls.Args.__fields__:
+        return instructions
+
+    @classmethod
+    def complete(
+        cls,
+        client: OpenAI,
+        context: list[ChatCompletionMessageParam],
+        instructions: Sequence[ChatCompletionMessageParam] = (),
+        stream: bool = False,
+    ) -> ArgsT:
+        """Ask the model to fill in the action arguments.
+
+        The instructions are appended to the request but not to the context.
+        The model is picked by `MODEL_ROUTER`, which can escalate a refused or
+        invalid completion, or one rejected by `escalation_reason`, to the
+        strong model.
+        """
+        messages = [*context, *instructions]
+        models = MODEL_ROUTER.models_for(cls.route(), cls.model_tier)
+        for model in models[:-1]:
+            size = len(context)
+            try:
+                args = cls._complete(client, model, context, messages, stream)
+            except ValueError as e:
+                logger.warning(f"{model} failed on {cls.__name__}, escalating: {e}")
+                continue
+            reason = cls.escalation_reason(args)
+            if reason is None:
+                return args
+            del context[size:]
+            logger.info(f"Escalating {cls.__name__} from {model}: {reason}")
+        escalated = len(models) > 1
+        return cls._complete(client, models[-1], context, messages, stream, escalated)
+
+    @classmethod
+    async def acomplete(
+        cls,
+        client: AsyncOpenAI,
+        context: list[ChatCompletionMessageParam],
+        instructions: Sequence[ChatCompletionMessageParam] = (),
+        stream: bool = False,
+    ) -> ArgsT:
+        """Ask the model to fill in the action arguments (see `complete`)."""
+        messages = [*context, *instructions]
+        models = MODEL_ROUTER.models_for(cls.route(), cls.model_tier)
+        for model in models[:-1]:
+            size = len(context)
+            try:
+                args = await cls._acomplete(client, model, context, messages, stream)
+            except ValueError as e:
+                logger.warning(f"{model} failed on {cls.__name__}, escalating: {e}")
+                continue
+            reason = cls.escalation_reason(args)
+            if reason is None:
+                return args
+            del context[size:]
+            logger.info(f"Escalating {cls.__name__} from {model}: {reason}")
+        escalated = len(models) > 1
+        return await cls._acomplete(
+            client, models[-1], context, messages, stream, escalated
+        )
+
+    @classmethod
+    def _complete(
+        cls,
+        client: OpenAI,
+        model: str,
+        context: list[ChatCompletionMessageParam],
+        messages: list[ChatCompletionMessageParam],
+        stream: bool,
+        escalated: bool = False,
+    ) -> ArgsT:
+        """Request the arguments from a model and add its completion to the context.
+
+        The response format is precomputed, so the request goes through plain
+        `create` and the response is validated here.
+        """
+        schema = response_schema(cls.Args)
+        with TRACER.span(
+            "llm", history=messages, action=cls.__name__, model=model
+        ) as span:
+            key = COMPLETION_CACHE.key(model, messages, cls.Args)
+            cached = cls._cached_args(key, context)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+            on_completion = functools.partial(
+                cls._record_completion, span=span, model=model
+            )
+            started = time.perf_counter()
+            try:
+                if stream:
+                    args, content = RATE_LIMITER.call(
+                        functools.partial(
+                            stream_parse,
+                            client,
+                            model,
+                            messages,
+                            schema,
+                            preview_fields=cls.preview_fields,
+                            on_completion=on_completion,
+                            on_partial=cls.dispatch_partial,
+                        ),
+                        messages,
+                    )
+                    context.append({"role": "assistant", "content": content})
+                    COMPLETION_CACHE.put(key, content)
+                    return args
+                # Already loaded with the client; not needed to define the actions.
+                import openai
+
+                try:
+                    completion = RATE_LIMITER.call(
+                        functools.partial(
+                            client.chat.completions.create,
+                            model=model,
+                            messages=messages,
+                            response_format=schema.response_format,
+                        ),
+                        messages,
+                    )
+                except openai.BadRequestError:
+                    logger.debug(json.dumps(schema.response_format))
+                    raise
+                on_completion(completion)
+                return cls._accept_completion(completion, context, key)
+            finally:
+                MODEL_ROUTER.record_call(
+                    model, time.perf_counter() - started, escalated
+                )
+
+    @classmethod
+    async def _acomplete(
+        cls,
+        client: AsyncOpenAI,
+        model: str,
+        context: list[ChatCompletionMessageParam],
+        messages: list[ChatCompletionMessageParam],
+        stream: bool,
+        escalated: bool = False,
+    ) -> ArgsT:
+        """Request the arguments from a model (see `_complete`)."""
+        schema = response_schema(cls.Args)
+        with TRACER.span(
+            "llm", history=messages, action=cls.__name__, model=model
+        ) as span:
+            key = COMPLETION_CACHE.key(model, messages, cls.Args)
+            cached = cls._cached_args(key, context)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+            on_completion = functools.partial(
+                cls._record_completion, span=span, model=model
+            )
+            started = time.perf_counter()
             try:
-                completion = client.beta.chat.completions.parse(
-                    model=MODEL,
-                    messages=context,
-                    response_format=cls.Args,
+                if stream:
+                    args, content = await RATE_LIMITER.acall(
+                        functools.partial(
+                            astream_parse,
+                            client,
+                            model,
+                            messages,
+                            schema,
+                            preview_fields=cls.preview_fields,
+                            on_completion=on_completion,
+                            on_partial=cls.dispatch_partial,
+                        ),
+                        messages,
+                    )
+                    context.append({"role": "assistant", "content": content})
+                    COMPLETION_CACHE.put(key, content)
+                    return args
+                import openai
+
+                try:
+                    completion = await RATE_LIMITER.acall(
+                        functools.partial(
+                            client.chat.completions.create,
+                            model=model,
+                            messages=messages,
+                            response_format=schema.response_format,
+                        ),
+                        messages,
+                    )
+                except openai.BadRequestError:
+                    logger.debug(json.dumps(schema.response_format))
+                    raise
+                on_completion(completion)
+                return cls._accept_completion(completion, context, key)
+            finally:
+                MODEL_ROUTER.record_call(
+                    model, time.perf_counter() - started, escalated
                 )
-            except openai.BadRequestError:
-                logger.debug(json.dumps(cls.Args.model_json_schema()))
-                raise
-            logger.debug(completion)
-            response = completion.choices[0].message
-            if response.refusal:
-                raise ValueError(f"Refusal: {response.refusal}")
-            assert response.content is not None
-            context.append({"role": "assistant", "content": response.content})
-            args = response.parsed
-            assert isinstance(args, cls.Args)
+
+    @classmethod
+    def _accept_completion(
+        cls,
+        completion: ChatCompletion,
+        context: list[ChatCompletionMessageParam],
+        cache_key: Optional[str] = None,
+    ) -> ArgsT:
+        """Validate a completion, add it to the context and return its arguments."""
+        response = completion.choices[0].message
+        if response.refusal:
+            raise ValueError(f"Refusal: {response.refusal}")
+        assert response.content is not None
+        args = response_schema(cls.Args).parse(response.content)
+        context.append({"role": "assistant", "content": response.content})
+        COMPLETION_CACHE.put(cache_key, response.content)
+        return args
+
+    @classmethod
+    def _cached_args(
+        cls, key: Optional[str], context: list[ChatCompletionMessageParam]
+    ) -> Optional[ArgsT]:
+        """Return the arguments of a cached completion and add it to the context."""
+        content = COMPLETION_CACHE.get(key)
+        if content is None:
+            return None
+        context.append({"role": "assistant", "content": content})
+        return cls.Args.model_validate_json(content)
+
+    @staticmethod
+    def _record_completion(
+        completion: ChatCompletion,
+        span: Optional[Span] = None,
+        model: Optional[str] = None,
+    ) -> None:
+        logger.debug(completion)
+        if completion.usage is not None:
+            PROMPT_CACHE_STATS.record(completion.usage)
+            current_session().usage.record(completion.usage, model)
+            if model is not None:
+                MODEL_ROUTER.record_usage(model, completion.usage)
+        if span is not None:
+            span.record_usage(completion.usage)
+
+    @classmethod
+    def execute(cls, args: ArgsT, context: list[ChatCompletionMessageParam]) -> OutputT:
+        """Confirm and perform the action with already known arguments."""
+        output = cls.confirm_and_perform(args)
+        context.append(cls.output_message(output))
+        return output
+
+    @classmethod
+    async def aexecute(
+        cls, args: ArgsT, context: list[ChatCompletionMessageParam]
+    ) -> OutputT:
+        """Confirm and perform the action on the event loop (see `execute`)."""
+        output = await cls.aconfirm_and_perform(args)
+        context.append(cls.output_message(output))
+        return output
+
+    @classmethod
+    def confirm_and_perform(cls, args: ArgsT) -> OutputT:
+        """Log the arguments, ask for confirmation if needed and perform."""
+        cls._log_args(args)
+        if cls.confirm:
+            with TRACER.span("confirm", action=cls.__name__):
+                cls._confirm()
+        with TRACER.span(f"{cls.__name__}.perform"):
+            return cls.perform(args)
+
+    @classmethod
+    async def aconfirm_and_perform(cls, args: ArgsT) -> OutputT:
+        """Log the arguments, ask for confirmation if needed and perform.
+
+        The confirmation prompt is read on an executor thread so other sessions
+        sharing the event loop keep running.
+        """
+        cls._log_args(args)
+        if cls.confirm:
+            with TRACER.span("confirm", action=cls.__name__):
+                await asyncio.get_running_loop().run_in_executor(
+                    None, contextvars.copy_context().run, cls._confirm
+                )
+        with TRACER.span(f"{cls.__name__}.perform"):
+            return await cls.aperform(args)
+
+    @classmethod
+    async def aperform(cls, args: ArgsT) -> OutputT:
+        """Perform the action without blocking the event loop.
+
+        Blocking actions are run on the default executor, in a copy of the
+        session context. Actions with native async I/O can override this.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, contextvars.copy_context().run, cls.perform, args
+        )
+
+    @classmethod
+    def _log_args(cls, args: ArgsT) -> None:
+        if cls.Args.model_fields:
             arg_log_level = logging.INFO if cls.confirm else logging.DEBUG
             pretty_args = "\n".join(
-                f"  {key} = {value}" for key, value in args.dict().items()
+                f"  {key} = {value}" for key, value in args.model_dump().items()
             )
             logger.log(arg_log_level, f"[bold]Arguments[/]:\n{pretty_args}")
-        else:
-            args = cls.Args()
-        if cls.confirm:
-            # TODO: clean this up
-            # TODO: allow sending a message back instead of killing it
-            user_response = input("\nProceed? [y/N] ")
-            if user_response.lower() != "y":
-                raise GptDont()
-            print()
-        output = cls.perform(args)
-        context.append(
-            {"role": "system", "content": f"Output: {output.model_dump_json()}"}
-        )
-        return output
+
+    @classmethod
+    def _confirm(cls) -> None:
+        """Ask the prompter of the session whether to proceed."""
+        if not current_session().prompter.confirm(REGISTRY.name_of(cls)):
+            raise GptDont(f"Action denied: {REGISTRY.name_of(cls)}")
+
+    @classmethod
+    def output_message(
+        cls, output: OutputT, label: bool = False
+    ) -> ChatCompletionMessageParam:
+        """Return the history message for the action output."""
+        prefix = f"Output ({cls.__name__})" if label else "Output"
+        return {"role": "system", "content": f"{prefix}: {output.model_dump_json()}"}
+
+    @classmethod
+    def parallel_safe(cls) -> bool:
+        """Whether the action can run concurrently with other actions."""
+        return cls.read_only and not cls.confirm
 
 
 GenericAction = type[Action[Any, Any]]
@@ -5,13 +5,15 @@ import subprocess as sp
 from typing import Optional
 from zoneinfo import ZoneInfo
 
-from ics import Calendar, Event
 from pydantic import BaseModel
 
 from .. import TMP_DIR
 from .action import Action
+from .registry import register
+from .session_state import current_session
 
 
+@register("ADD_TO_CALENDAR")
 class AddToCalendar(Action["AddToCalendar.Args", "AddToCalendar.Output"]):
     """Create an event to add to the user's calendar.
 
@@ -51,6 +53,8 @@ class AddToCalendar(Action["AddToCalendar.Args", "AddToCalendar.Output"]):
     @classmethod
     def perform(cls, args: Args) -> Output:
         """Execute the action."""
+        from ics import Calendar, Event
+
         begin = (
             dt.datetime.fromisoformat(args.begin).replace(
                 tzinfo=ZoneInfo("America/Los_Angeles")
@@ -81,7 +85,6 @@ class AddToCalendar(Action["AddToCalendar.Args", "AddToCalendar.Output"]):
 
         sp.check_call(["open", ics_path])
         if cls.confirm:
-            input("Press Enter to continue...")
-            print()
+            current_session().prompter.pause("Press Enter to continue...")
 
         return cls.Output(success=True)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from pydantic import BaseModel
-from rich import print as rprint
 
 from .action import Action
+from .registry import register
+from .session_state import current_session
 
 
+@register("ASK_USER")
 class AskUser(Action["AskUser.Args", "AskUser.Output"]):
     """Ask the user clarifying for clarifying information or general knowledge.
 
@@ -17,6 +19,8 @@ class AskUser(Action["AskUser.Args", "AskUser.Output"]):
     """
 
     confirm = False
+    model_tier = "fast"
+    preview_fields = ("question",)
 
     class Args(BaseModel):
         question: str
@@ -29,7 +33,5 @@ class AskUser(Action["AskUser.Args", "AskUser.Output"]):
         """Execute the action."""
         # TODO: print helper
         question = args.question.replace(r"\\\\", r"\\")
-        rprint(f"Question: {question}\n")
-        answer = input("Answer: ")
-        print()
+        answer = current_session().prompter.ask(question)
         return cls.Output(user_response=answer)
@@ -5,8 +5,10 @@ import datetime as dt
 from pydantic import BaseModel
 
 from .action import Action
+from .registry import register
 
 
+@register("CHECK_DATE_TIME")
 class CheckDateTime(Action["CheckDateTime.Args", "CheckDateTime.Output"]):
     """Get the current date and time.
 
@@ -18,6 +20,8 @@ class CheckDateTime(Action["CheckDateTime.Args", "CheckDateTime.Output"]):
     """
 
     confirm = False
+    read_only = True
+    model_tier = "fast"
 
     class Args(BaseModel):
         pass
@@ -3,14 +3,16 @@ from __future__ import annotations
 import logging
 from typing import Optional
 
-import requests
 from pydantic import BaseModel
 
+from . import web
 from .action import Action
+from .registry import register
 
 logger = logging.getLogger(__name__)
 
 
+@register("CHECK_LOCATION")
 class CheckLocation(Action["CheckLocation.Args", "CheckLocation.Output"]):
     """Get the user's location, based on IP.
 
@@ -25,6 +27,8 @@ class CheckLocation(Action["CheckLocation.Args", "CheckLocation.Output"]):
     """
 
     confirm = True
+    read_only = True
+    model_tier = "fast"
 
     class Args(BaseModel):
         pass
@@ -38,8 +42,10 @@ class CheckLocation(Action["CheckLocation.Args", "CheckLocation.Output"]):
     @classmethod
     def perform(cls, args: Args) -> Output:
         """Execute the action."""
+        import requests
+
         try:
-            response = requests.get("http://ipinfo.io", timeout=5)
+            response = web.get("http://ipinfo.io", timeout=5)
             response.raise_for_status()
         except requests.RequestException as e:
             logger.exception("Failed to load web page")
@@ -1,89 +1,85 @@
 from __future__ import annotations
 
+import importlib
 import logging
 from enum import Enum
+from typing import TYPE_CHECKING
 
 from pydantic import BaseModel
 
 from .action import Action, GenericAction
-from .add_to_calendar import AddToCalendar
-from .ask_user import AskUser
-from .check_date_time import CheckDateTime
-from .check_location import CheckLocation
-from .complete import Complete
-from .display_to_user import DisplayToUser
-from .execute_bash_command import ExecuteBashCommand
-from .list_directory import ListDirectory
-from .load_web_page import LoadWebPage
-from .read_file import ReadFile
-
-# from .search_duck_duck_go import SearchDuckDuckGo
-# from .search_wikipedia import SearchWikipedia
+from .registry import REGISTRY
+from .session_state import current_session
 
 logger = logging.getLogger(__name__)
 
-
-class ActionEnum(Enum):
-    DISPLAY_TO_USER = DisplayToUser.summary()
-    ASK_USER = AskUser.summary()
-    READ_FILE = ReadFile.summary()
-    LIST_DIRECTORY = ListDirectory.summary()
-    ADD_TO_CALENDAR = AddToCalendar.summary()
-    CHECK_DATE_TIME = CheckDateTime.summary()
-    CHECK_LOCATION = CheckLocation.summary()
-    LOAD_WEB_PAGE = LoadWebPage.summary()
-    # SEARCH_WIKIPEDIA = SearchWikipedia.summary()
-    # SEARCH_DUCK_DUCK_GO = SearchDuckDuckGo.summary()
-    EXECUTE_BASH_COMMAND = ExecuteBashCommand.summary()
-
-    COMPLETE = Complete.summary()
+# Modules of the built-in actions, in the order they are listed to the model.
+BUILTIN_ACTIONS = (
+    "display_to_user",
+    "ask_user",
+    "read_file",
+    "list_directory",
+    "search_files",
+    "add_to_calendar",
+    "check_date_time",
+    "check_location",
+    "load_web_page",
+    "search_document",
+    # "search_wikipedia",
+    # "search_duck_duck_go",
+    "execute_bash_command",
+    "complete",
     # TODO:
     # send email
     # perform advanced reasoning
     # send text
     # actual search
     # brainstorm (propose ideas, criticize, repeat)
+)
+
+for _module in BUILTIN_ACTIONS:
+    importlib.import_module(f".{_module}", __package__)
+REGISTRY.load_plugins()
+
+
+class ActionChoice(Enum):
+    """Base of `ActionEnum`, whose members are the registered actions.
+
+    Member names are the registered names and values are the action
+    summaries, so the summaries are part of the schema sent to the model.
+    """
 
     @classmethod
     def list(cls) -> str:
         """Return a list of action descriptions."""
         return "\n".join(f"- {action.name}: {action.value}" for action in cls)
 
-    @classmethod
-    def validate(cls) -> None:
-        """Verify all the variants have an associated action."""
-        for action in cls:
-            action.to_action()
-
     def to_action(self) -> GenericAction:
         """Return the action class."""
-        match self:
-            case ActionEnum.READ_FILE:
-                return ReadFile
-            case ActionEnum.COMPLETE:
-                return Complete
-            case ActionEnum.DISPLAY_TO_USER:
-                return DisplayToUser
-            case ActionEnum.LOAD_WEB_PAGE:
-                return LoadWebPage
-            case ActionEnum.LIST_DIRECTORY:
-                return ListDirectory
-            case ActionEnum.ADD_TO_CALENDAR:
-                return AddToCalendar
-            case ActionEnum.CHECK_DATE_TIME:
-                return CheckDateTime
-            case ActionEnum.ASK_USER:
-                return AskUser
-            case ActionEnum.CHECK_LOCATION:
-                return CheckLocation
-            # case ActionEnum.SEARCH_WIKIPEDIA:
-            #     return SearchWikipedia
-            # case ActionEnum.SEARCH_DUCK_DUCK_GO:
-            #     return SearchDuckDuckGo
-            case ActionEnum.EXECUTE_BASH_COMMAND:
-                return ExecuteBashCommand
-            case _:
-                raise NotImplementedError(f"Action not implemented: {self}")
+        return REGISTRY.get(self.name)
+
+
+def _action_enum() -> type[ActionChoice]:
+    """Build the enum of the registered actions."""
+    members = [(name, action.summary()) for name, action in REGISTRY.items()]
+    summaries = [summary for _, summary in members]
+    duplicates = {summary for summary in summaries if summaries.count(summary) > 1}
+    if duplicates:
+        # Members with equal values would silently become aliases.
+        raise ValueError(f"Actions with the same summary: {duplicates}")
+    enum: type[ActionChoice] = ActionChoice(  # type: ignore[call-arg,assignment]
+        "ActionEnum", members, module=__name__
+    )
+    return enum
+
+
+if TYPE_CHECKING:
+
+    class ActionEnum(ActionChoice):
+        pass
+
+else:
+    ActionEnum = _action_enum()
 
 
 class Choose(Action["Choose.Args", "Choose.Output"]):
@@ -105,6 +101,8 @@ class Choose(Action["Choose.Args", "Choose.Output"]):
     """
 
     confirm = False
+    model_tier = "fast"
+    preview_fields = ("reasoning",)
 
     class Args(BaseModel):
         reasoning: str
@@ -120,4 +118,5 @@ class Choose(Action["Choose.Args", "Choose.Output"]):
         logger.info(f"[bold]Reasoning[/]: {args.reasoning}")
         pretty_plan = "\n".join(f"- {x}" for x in args.current_plan)
         logger.info(f"[bold]Current plan[/]:\n{pretty_plan}")
+        current_session().plan = args.current_plan
         return cls.Output(action=args.action)
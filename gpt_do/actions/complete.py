@@ -5,10 +5,12 @@ import logging
 from pydantic import BaseModel
 
 from .action import Action
+from .registry import register
 
 logger = logging.getLogger(__name__)
 
 
+@register("COMPLETE")
 class Complete(Action["Complete.Args", "Complete.Output"]):
     """The user's request has been completely handled.
 
@@ -23,6 +25,7 @@ class Complete(Action["Complete.Args", "Complete.Output"]):
     """
 
     confirm = False
+    model_tier = "fast"
 
     class Args(BaseModel):
         completed_objectives: list[str]
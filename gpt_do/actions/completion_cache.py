@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from pydantic import BaseModel
+
+from .. import TMP_DIR
+from ..prompt import VOLATILE_FACTS_RE
+from .schema import response_schema
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = TMP_DIR / "completion_cache.sqlite3"
+MAX_BYTES = 64 * 1024 * 1024
+TTL_S = 7 * 24 * 60 * 60
+MODES = ("off", "read-only", "read-write", "record")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_accessed_at ON completions (accessed_at);
+"""
+
+
+@dataclass
+class CompletionCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} hits, {self.misses} misses, "
+            f"{self.stores} stored, {self.evictions} evicted"
+        )
+
+
+def _stable(message: ChatCompletionMessageParam) -> dict[str, Any]:
+    # The current time sent with each request would make every key unique.
+    stable = dict(message)
+    content = stable.get("content")
+    if isinstance(content, str):
+        stable["content"] = VOLATILE_FACTS_RE.sub("", content)
+    return stable
+
+
+class CompletionCache:
+    """SQLite cache of structured completions, keyed by their request.
+
+    The key is a hash of the model, the messages (without the current time)
+    and the digest of the response format's JSON schema. Entries expire after a TTL
+    and the least recently used ones are evicted above a size limit.
+
+    Modes:
+        off: The cache is not used.
+        read-only: Cached completions are reused, new ones are not stored.
+        read-write: Cached completions are reused and new ones are stored.
+        record: Every request is sent and its completion stored, replacing
+            any cached one.
+    """
+
+    def __init__(
+        self,
+        path: Path = CACHE_PATH,
+        mode: str = "off",
+        ttl_s: float = TTL_S,
+        max_bytes: int = MAX_BYTES,
+    ) -> None:
+        self.path = path
+        self.mode = mode
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.stats = CompletionCacheStats()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def configure(
+        self,
+        mode: Optional[str] = None,
+        ttl_s: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        if mode is not None:
+            assert mode in MODES, mode
+            self.mode = mode
+        if ttl_s is not None:
+            self.ttl_s = ttl_s
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def key(
+        self,
+        model: str,
+        messages: Iterable[ChatCompletionMessageParam],
+        response_format: type[BaseModel],
+    ) -> Optional[str]:
+        """Return the cache key of a request, or None if the cache is off."""
+        if not self.enabled:
+            return None
+        request = {
+            "model": model,
+            "messages": [_stable(message) for message in messages],
+            "schema": response_schema(response_format).digest,
+        }
+        encoded = json.dumps(request, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """Return the cached completion content for a key, if any."""
+        if key is None or self.mode not in ("read-only", "read-write"):
+            return None
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT content FROM completions WHERE key = ? AND stored_at > ?",
+                (key, now - self.ttl_s),
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            if self.mode == "read-write":
+                self.connection.execute(
+                    "UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self.connection.commit()
+            self.stats.hits += 1
+        logger.debug(f"Completion cache hit: {key[:12]}")
+        return str(row[0])
+
+    def put(self, key: Optional[str], content: str) -> None:
+        """Store the content of a completion."""
+        if key is None or self.mode not in ("read-write", "record"):
+            return
+        now = time.time()
+        with self._lock:
+            db = self.connection
+            db.execute(
+                "INSERT OR REPLACE INTO completions "
+                "(key, content, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, content, len(content.encode()), now, now),
+            )
+            self.stats.stores += 1
+            self._evict(now)
+            db.commit()
+
+    def _evict(self, now: float) -> None:
+        """Remove the expired entries, then the least recently used ones."""
+        db = self.connection
+        self.stats.evictions += db.execute(
+            "DELETE FROM completions WHERE stored_at <= ?", (now - self.ttl_s,)
+        ).rowcount
+        total = db.execute("SELECT coalesce(sum(size), 0) FROM completions").fetchone()
+        excess = total[0] - self.max_bytes
+        if excess <= 0:
+            return
+        doomed = []
+        for key, size in db.execute(
+            "SELECT key, size FROM completions ORDER BY accessed_at"
+        ):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        db.executemany("DELETE FROM completions WHERE key = ?", doomed)
+        self.stats.evictions += len(doomed)
+
+
+COMPLETION_CACHE = CompletionCache()
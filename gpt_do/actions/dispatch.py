@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 4
+
+
+@lru_cache(maxsize=None)
+def _executor() -> ThreadPoolExecutor:
+    """The threads the actions of all sessions run on, started on first use."""
+    return ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="dispatch")
+
+
+@dataclass
+class DispatchStats:
+    # Actions started while their step was streaming.
+    started: int = 0
+    # Actions whose result was used by the finished step.
+    used: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.used}/{self.started} early dispatched actions used"
+
+
+@dataclass
+class EarlyDispatch:
+    """Actions of a streamed step started before the step finished streaming.
+
+    Parallel-safe actions are started on background threads as soon as their
+    arguments are complete, while the rest of the step streams, and the
+    finished step takes their results instead of performing them again.
+    Actions the finished step does not select (e.g. once it was escalated)
+    are dropped at the next step.
+    """
+
+    stats: DispatchStats = field(default_factory=DispatchStats)
+    _pending: dict[Hashable, Future[Any]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def start(self, key: Hashable, perform: Callable[[], Any]) -> None:
+        """Start performing an action, unless it was already started."""
+        with self._lock:
+            if key in self._pending:
+                return
+            # Traced under the completion that selected it.
+            future = _executor().submit(contextvars.copy_context().run, perform)
+            self._pending[key] = future
+            self.stats.started += 1
+        logger.debug(f"Dispatched {key} early")
+
+    def take(self, key: Hashable) -> Optional[Future[Any]]:
+        """Return the started action for a key, if any."""
+        with self._lock:
+            future = self._pending.pop(key, None)
+            if future is not None:
+                self.stats.used += 1
+            return future
+
+    def clear(self) -> None:
+        """Drop the actions not taken, e.g. at the start of the next step."""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
@@ -4,13 +4,14 @@ import logging
 
 from pydantic import BaseModel
 from rich import print as rprint
-from rich.markdown import Markdown
 
 from .action import Action
+from .registry import register
 
 logger = logging.getLogger(__name__)
 
 
+@register("DISPLAY_TO_USER")
 class DisplayToUser(Action["DisplayToUser.Args", "DisplayToUser.Output"]):
     """Display a message to the user (no user response will be provided).
 
@@ -22,6 +23,8 @@ class DisplayToUser(Action["DisplayToUser.Args", "DisplayToUser.Output"]):
     """
 
     confirm = False
+    model_tier = "fast"
+    preview_fields = ("message",)
 
     class Args(BaseModel):
         message: str
@@ -32,6 +35,8 @@ class DisplayToUser(Action["DisplayToUser.Args", "DisplayToUser.Output"]):
     @classmethod
     def perform(cls, args: Args) -> Output:
         """Execute the action."""
+        from rich.markdown import Markdown
+
         # TODO: print helper
         msg = args.message.replace(r"\\\\", r"\\")
         # Console().print(md)
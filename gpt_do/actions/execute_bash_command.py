@@ -1,53 +1,98 @@
 from __future__ import annotations
 
+import datetime as dt
 import logging
-import subprocess as sp
+from pathlib import Path
 from typing import Optional
 
 from pydantic import BaseModel
 
+from .. import TMP_DIR
 from .action import Action
+from .process import run_streaming
+from .registry import register
+from .shell_session import SHELL_SESSION
 
 logger = logging.getLogger(__name__)
 
 
+@register("EXECUTE_BASH_COMMAND")
 class ExecuteBashCommand(
     Action["ExecuteBashCommand.Args", "ExecuteBashCommand.Output"]
 ):
     """Execute an arbitrary Bash command.
 
+    Commands are killed when they time out. Only the start and end of long
+    outputs are returned; the full output is saved to a file. If a persistent
+    shell is used, the working directory and variables carry over between
+    commands.
+
     Args:
         command: The Bash command to execute.
+        timeout_s: The timeout in seconds. Leave empty for the default.
 
     Output:
         stdout: The standard output.
         stderr: The standard error.
         return_code: The return code.
+        timed_out: Whether the command was killed after timing out.
+        stdout_bytes: The total size of the standard output.
+        stderr_bytes: The total size of the standard error.
+        output_files: The files holding the full output, if it was cut.
     """
 
     confirm = True
 
+    TIMEOUT_S: Optional[float] = 300
+    # Bytes kept from both the start and the end of each stream.
+    CAPTURE_BYTES = 8 * 1024
+    SPILL_DIR: Optional[Path] = TMP_DIR / "commands"
+    ECHO = True
+
     class Args(BaseModel):
         command: str
+        timeout_s: Optional[float]
 
     class Output(BaseModel):
         stdout: Optional[str]
         stderr: Optional[str]
         return_code: Optional[int]
+        timed_out: bool
+        stdout_bytes: int
+        stderr_bytes: int
+        output_files: list[str]
 
     @classmethod
     def perform(cls, args: Args) -> Output:
         """Execute the Bash command."""
-        result = sp.run(
+        spill_prefix = None
+        if cls.SPILL_DIR is not None:
+            spill_prefix = cls.SPILL_DIR / dt.datetime.now().strftime(
+                "%Y-%m-%d_%H-%M-%S_%f"
+            )
+        run = SHELL_SESSION.run if SHELL_SESSION.enabled else run_streaming
+        result = run(
             args.command,
-            shell=True,
-            text=True,
-            check=False,
-            capture_output=True,
+            timeout_s=args.timeout_s or cls.TIMEOUT_S,
+            capture_bytes=cls.CAPTURE_BYTES,
+            spill_prefix=spill_prefix,
+            echo=cls.ECHO,
+        )
+        logger.debug(
+            f"Command finished in {result.duration_s:.1f}s "
+            f"({result.stdout.total} bytes out, {result.stderr.total} bytes err)"
         )
 
         return cls.Output(
-            stdout=result.stdout,
-            stderr=result.stderr,
-            return_code=result.returncode,
+            stdout=result.stdout.text(),
+            stderr=result.stderr.text(),
+            return_code=result.return_code,
+            timed_out=result.timed_out,
+            stdout_bytes=result.stdout.total,
+            stderr_bytes=result.stderr.total,
+            output_files=[
+                path
+                for path in (result.stdout.spilled, result.stderr.spilled)
+                if path is not None
+            ],
         )
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import difflib
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedRead:
+    """A file read already shown in the history."""
+
+    mtime_ns: int
+    size: int
+    step: int
+    text: str
+    document: Optional[str] = None
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+
+@dataclass
+class FileCacheStats:
+    unchanged: int = 0
+    diffs: int = 0
+    misses: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.unchanged} unchanged, {self.diffs} diffs, {self.misses} misses"
+
+
+@dataclass
+class FileCache:
+    """Per-session record of the file reads shown in the history.
+
+    Entries are keyed by what was read (path and range) and validated with the
+    modification time and size of the file, so a repeated read can refer back
+    to the earlier output or show only what changed.
+    """
+
+    step: int = 0
+    entries: dict[Hashable, CachedRead] = field(default_factory=dict)
+    stats: FileCacheStats = field(default_factory=FileCacheStats)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def advance(self) -> int:
+        """Start the next step of the session and return its number."""
+        with self._lock:
+            self.step += 1
+            return self.step
+
+    def clear(self) -> None:
+        """Forget all reads, e.g. once their outputs left the history."""
+        with self._lock:
+            self.entries.clear()
+
+    def lookup(
+        self,
+        key: Hashable,
+        stat: os.stat_result,
+        valid: Optional[Callable[[CachedRead], bool]] = None,
+    ) -> Optional[CachedRead]:
+        """Return the previous read if the file has not changed since.
+
+        A previous read that is no longer `valid`, e.g. whose document was
+        evicted, is forgotten so the file is read again in full.
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or not entry.matches(stat):
+                return None
+            if valid is not None and not valid(entry):
+                del self.entries[key]
+                return None
+            self.stats.unchanged += 1
+            return entry
+
+    def update(
+        self,
+        key: Hashable,
+        stat: os.stat_result,
+        text: str,
+        document: Optional[str] = None,
+    ) -> Optional[CachedRead]:
+        """Record a fresh read and return the previous one, if any."""
+        with self._lock:
+            previous = self.entries.get(key)
+            self.entries[key] = CachedRead(
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                step=self.step,
+                text=text,
+                document=document,
+            )
+            if previous is None:
+                self.stats.misses += 1
+            else:
+                self.stats.diffs += 1
+            return previous
+
+
+def unified_diff(name: str, previous: CachedRead, text: str) -> str:
+    """Return a unified diff from an earlier read to the current text."""
+    return "".join(
+        difflib.unified_diff(
+            previous.text.splitlines(keepends=True),
+            text.splitlines(keepends=True),
+            fromfile=f"{name} (step {previous.step})",
+            tofile=f"{name} (now)",
+        )
+    )
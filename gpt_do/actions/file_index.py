@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .. import TMP_DIR
+from .mapped_file import SNIFF_BYTES, sniff_encoding
+from .walk import Walker
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = TMP_DIR / "file_index.sqlite3"
+# Larger files are indexed by name only.
+MAX_FILE_BYTES = 1024 * 1024
+# Trigram indexes can't match shorter queries, which fall back to a scan.
+MIN_TRIGRAM_CHARS = 3
+WORKERS = os.cpu_count() or 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS content USING fts5(
+    path, body, tokenize='trigram'
+);
+"""
+
+
+@dataclass
+class LineMatch:
+    path: str
+    line: int
+    text: str
+
+
+@dataclass
+class RefreshStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.added} added, {self.updated} updated, "
+            f"{self.removed} removed, {self.unchanged} unchanged"
+        )
+
+
+def _read_text(path: str, size: int) -> str:
+    """Return the text of a file, or an empty string if binary or too large."""
+    if size > MAX_FILE_BYTES:
+        return ""
+    try:
+        data = Path(path).read_bytes()
+    except OSError:
+        return ""
+    encoding = sniff_encoding(data[:SNIFF_BYTES])
+    if encoding is None:
+        return ""
+    return data.decode(encoding, errors="replace")
+
+
+def _fts_phrase(query: str) -> str:
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _root_range(root: str) -> tuple[str, str]:
+    """Return the bounds of the paths under `root`."""
+    prefix = root.rstrip(os.sep) + os.sep
+    return prefix, prefix + "\U0010ffff"
+
+
+def _is_under(path: str, root: str) -> bool:
+    """Whether `path` is `root` or a path under it."""
+    return path == root or path.startswith(_root_range(root)[0])
+
+
+class FileIndex:
+    """Persistent name and content index of local files.
+
+    File paths and contents are kept in an SQLite FTS5 table with a trigram
+    tokenizer, so any substring of three or more characters is looked up
+    without scanning. The index is refreshed incrementally from the
+    modification times and sizes of the files before searches, skipping the
+    `exclude` directories (the caches and logs of the agent by default).
+    """
+
+    def __init__(
+        self,
+        path: Path = INDEX_PATH,
+        workers: int = WORKERS,
+        exclude: tuple[Path, ...] = (TMP_DIR,),
+    ) -> None:
+        self.path = path
+        self.workers = workers
+        self.exclude = exclude
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        # When each root was last refreshed, by `time.monotonic`.
+        self._refreshed: dict[str, float] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The connection used for writes, opened on first use."""
+        if self._connection is None:
+            self._connection = self._connect()
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def refresh(self, root: str, since: Optional[float] = None) -> RefreshStats:
+        """Bring the index of the files under `root` up to date.
+
+        With `since` (by `time.monotonic`), e.g. the start of the current
+        step, a refresh of `root` or of a directory above it done since then
+        is enough, and nothing is refreshed again.
+        """
+        stats = RefreshStats()
+        low, high = _root_range(root)
+        with self._lock:
+            if since is not None and any(
+                refreshed >= since and _is_under(root, other)
+                for other, refreshed in self._refreshed.items()
+            ):
+                logger.debug(f"File index of {root} already refreshed")
+                return stats
+            self._refreshed[root] = time.monotonic()
+            db = self.connection
+            known = {
+                path: (file_id, mtime_ns, size)
+                for file_id, path, mtime_ns, size in db.execute(
+                    "SELECT id, path, mtime_ns, size FROM files "
+                    "WHERE path >= ? AND path < ?",
+                    (low, high),
+                )
+            }
+            changed: list[tuple[Optional[int], str, os.stat_result]] = []
+            exclude = [str(path) for path in self.exclude]
+            for entry in Walker(root, exclude=exclude):
+                # Skip directories, and the database and its journal files.
+                if entry.is_dir or entry.path.startswith(str(self.path)):
+                    continue
+                try:
+                    stat = os.stat(entry.path)
+                except OSError:
+                    continue
+                file_id, mtime_ns, size = known.pop(entry.path, (None, None, None))
+                if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size):
+                    stats.unchanged += 1
+                else:
+                    changed.append((file_id, entry.path, stat))
+
+            # Reading files is I/O bound, so threads overlap it.
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                texts = pool.map(
+                    lambda item: _read_text(item[1], item[2].st_size), changed
+                )
+                for (file_id, path, stat), text in zip(changed, texts):
+                    if file_id is None:
+                        stats.added += 1
+                    else:
+                        stats.updated += 1
+                        db.execute("DELETE FROM content WHERE rowid = ?", (file_id,))
+                    cursor = db.execute(
+                        "INSERT OR REPLACE INTO files (id, path, mtime_ns, size) "
+                        "VALUES (?, ?, ?, ?)",
+                        (file_id, path, stat.st_mtime_ns, stat.st_size),
+                    )
+                    db.execute(
+                        "INSERT INTO content (rowid, path, body) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, path, text),
+                    )
+            for file_id, _, _ in known.values():
+                db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                db.execute("DELETE FROM content WHERE rowid = ?", (file_id,))
+                stats.removed += 1
+            db.commit()
+        logger.debug(f"Refreshed file index of {root}: {stats}")
+        return stats
+
+    def search(
+        self,
+        root: str,
+        query: str,
+        names: bool = True,
+        contents: bool = True,
+        max_files: int = 50,
+        max_lines: int = 5,
+    ) -> tuple[list[str], list[LineMatch]]:
+        """Return the files under `root` whose name or contents contain `query`.
+
+        The id range of the indexed files is split into one shard per worker
+        and each shard is queried on its own connection; SQLite releases the
+        GIL while it searches, so the shards run in parallel.
+
+        Returns:
+            The matching file paths and the matching lines.
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT max(id) FROM files").fetchone()
+        top = row[0] or 0
+        step = top // self.workers + 1
+        shards = [(lo, lo + step - 1) for lo in range(0, top + 1, step)]
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            results = list(
+                pool.map(
+                    lambda shard: self._search_shard(
+                        root, query, names, contents, shard, max_files, max_lines
+                    ),
+                    shards,
+                )
+            )
+        files = sorted({path for shard_files, _ in results for path in shard_files})
+        lines = sorted(
+            (match for _, shard_lines in results for match in shard_lines),
+            key=lambda match: (match.path, match.line),
+        )
+        matched = set(files) | {match.path for match in lines}
+        kept = set(sorted(matched)[:max_files])
+        return [path for path in files if path in kept], [
+            match for match in lines if match.path in kept
+        ]
+
+    def _search_shard(
+        self,
+        root: str,
+        query: str,
+        names: bool,
+        contents: bool,
+        shard: tuple[int, int],
+        max_files: int,
+        max_lines: int,
+    ) -> tuple[list[str], list[LineMatch]]:
+        low, high = _root_range(root)
+        connection = self._connect()
+        try:
+            rows = self._candidates(connection, query, names, contents, shard)
+            files: list[str] = []
+            lines: list[LineMatch] = []
+            needle = query.lower()
+            for path, body in rows:
+                if not low <= path < high:
+                    continue
+                if names and needle in os.path.relpath(path, root).lower():
+                    files.append(path)
+                if contents:
+                    lines.extend(self._matching_lines(path, body, needle, max_lines))
+                if len(files) + len({match.path for match in lines}) >= max_files:
+                    break
+            return files, lines
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _candidates(
+        connection: sqlite3.Connection,
+        query: str,
+        names: bool,
+        contents: bool,
+        shard: tuple[int, int],
+    ) -> Iterator[tuple[str, str]]:
+        columns = [name for name, on in (("path", names), ("body", contents)) if on]
+        if len(query) >= MIN_TRIGRAM_CHARS:
+            match = " OR ".join(
+                f"{column} : {_fts_phrase(query)}" for column in columns
+            )
+            return connection.execute(
+                "SELECT path, body FROM content WHERE content MATCH ? "
+                "AND rowid BETWEEN ? AND ?",
+                (match, *shard),
+            )
+        where = " OR ".join(f"instr(lower({column}), lower(?))" for column in columns)
+        return connection.execute(
+            f"SELECT path, body FROM content WHERE ({where}) "
+            "AND rowid BETWEEN ? AND ?",
+            (*[query] * len(columns), *shard),
+        )
+
+    @staticmethod
+    def _matching_lines(
+        path: str, body: str, needle: str, max_lines: int
+    ) -> Iterator[LineMatch]:
+        found = 0
+        for number, line in enumerate(body.splitlines(), start=1):
+            if needle in line.lower():
+                yield LineMatch(path, number, line.strip()[:200])
+                found += 1
+                if found >= max_lines:
+                    return
+
+
+FILE_INDEX = FileIndex()
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import re
+from typing import Optional
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+
+# Never part of the readable content.
+DROP_TAGS = (
+    "head",
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "canvas",
+    "iframe",
+    "object",
+    "embed",
+    "button",
+    "select",
+    "input",
+    "textarea",
+    "nav",
+    "aside",
+    "footer",
+)
+# Class and id tokens of boilerplate, matched whole or as `-`/`_` compounds
+# made only of these words (e.g. `cookie-banner`, but not `has-sidebar`).
+BOILERPLATE_NAMES = {
+    "nav",
+    "navbar",
+    "menu",
+    "footer",
+    "sidebar",
+    "breadcrumb",
+    "breadcrumbs",
+    "cookie",
+    "cookies",
+    "banner",
+    "advert",
+    "ads",
+    "social",
+    "share",
+    "related",
+    "comment",
+    "comments",
+    "popup",
+    "modal",
+    "skip-link",
+    "toc",
+}
+# Boilerplate unless they hold most of the text, as forms wrapping whole pages
+# (e.g. ASP.NET WebForms) do.
+BOILERPLATE_TAGS = {"form"}
+# Never dropped as boilerplate, whatever their class or id.
+CONTENT_TAGS = {"html", "body", "main", "article"}
+# Fraction of the text of the page above which an element is kept anyway.
+MAX_BOILERPLATE_SHARE = 0.5
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search"}
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "blockquote",
+    "body",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "figcaption",
+    "figure",
+    "header",
+    "hr",
+    "main",
+    "ol",
+    "p",
+    "section",
+    "table",
+    "tr",
+    "ul",
+    "br",
+}
+# Paragraph-like elements used to score main content candidates.
+SCORED_TAGS = ("p", "pre", "td", "blockquote", "li")
+MIN_SCORED_LENGTH = 25
+
+
+def _is_boilerplate_name(token: str) -> bool:
+    token = token.lower()
+    return token in BOILERPLATE_NAMES or all(
+        part in BOILERPLATE_NAMES for part in re.split(r"[-_]+", token)
+    )
+
+
+def _is_boilerplate(el: lxml_html.HtmlElement) -> bool:
+    if el.tag in CONTENT_TAGS or el.get("role") == "main":
+        return False
+    if el.tag in BOILERPLATE_TAGS:
+        return True
+    if el.get("hidden") is not None or el.get("aria-hidden") == "true":
+        return True
+    if el.get("role") in BOILERPLATE_ROLES:
+        return True
+    names = f"{el.get('id', '')} {el.get('class', '')}".split()
+    return any(_is_boilerplate_name(name) for name in names)
+
+
+def _main_content(doc: lxml_html.HtmlElement) -> lxml_html.HtmlElement:
+    """Return the element holding the main content of the page."""
+    for xpath in ("//main", "//*[@role='main']", "//article"):
+        found = doc.xpath(xpath)
+        if len(found) == 1:
+            return found[0]
+    # Readability-style scoring: paragraphs vote for their parent and
+    # (with half the weight) their grandparent.
+    scores: dict[lxml_html.HtmlElement, float] = {}
+    for el in doc.iter(*SCORED_TAGS):
+        length = len(el.text_content())
+        if length < MIN_SCORED_LENGTH:
+            continue
+        parent = el.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + length
+        grandparent = parent.getparent()
+        if grandparent is not None:
+            scores[grandparent] = scores.get(grandparent, 0) + length / 2
+    if scores:
+        return max(scores, key=scores.__getitem__)
+    body = doc.find("body")
+    return body if body is not None else doc
+
+
+class _Renderer:
+    """Render an element tree as compact markdown-like text."""
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url
+        self.lines: list[str] = []
+        self.links: list[str] = []
+        self.inline: list[str] = []
+        self.prefix = ""
+        self.list_depth = 0
+
+    def flush(self) -> None:
+        text = " ".join("".join(self.inline).split())
+        if text:
+            self.lines.append(self.prefix + text)
+            self.prefix = ""
+        self.inline = []
+
+    def add_link(self, href: Optional[str]) -> None:
+        if not href or href.startswith(("#", "javascript:")):
+            return
+        self.links.append(urljoin(self.base_url, href.strip()))
+
+    def walk(self, el: lxml_html.HtmlElement) -> None:
+        tag = el.tag if isinstance(el.tag, str) else ""
+        if tag in HEADINGS:
+            self.flush()
+            text = " ".join(el.text_content().split())
+            if text:
+                self.lines.append(f"{'#' * HEADINGS[tag]} {text}")
+            for link in el.iter("a"):
+                self.add_link(link.get("href"))
+        elif tag == "pre":
+            self.flush()
+            code = el.text_content().strip("\n")
+            if code.strip():
+                self.lines.append(f"```\n{code}\n```")
+        elif tag == "li":
+            self.flush()
+            self.prefix = "  " * max(self.list_depth - 1, 0) + "- "
+            self._children(el)
+            self.flush()
+            self.prefix = ""
+        elif tag in ("ul", "ol"):
+            self.flush()
+            self.list_depth += 1
+            self._children(el)
+            self.list_depth -= 1
+            self.flush()
+        elif tag in ("td", "th"):
+            if self.inline:
+                self.inline.append(" | ")
+            self._children(el)
+        elif tag == "blockquote":
+            self.flush()
+            self.prefix = "> "
+            self._children(el)
+            self.flush()
+            self.prefix = ""
+        elif tag in BLOCK_TAGS:
+            self.flush()
+            self._children(el)
+            self.flush()
+        else:
+            if tag == "a":
+                self.add_link(el.get("href"))
+            elif tag == "img" and el.get("alt"):
+                self.inline.append(f" [image: {el.get('alt')}] ")
+            self._children(el)
+        if el.tail:
+            self.inline.append(el.tail)
+
+    def _children(self, el: lxml_html.HtmlElement) -> None:
+        if el.text:
+            self.inline.append(el.text)
+        for child in el:
+            self.walk(child)
+
+
+def extract(html: str, base_url: str) -> tuple[str, list[str]]:
+    """Extract the main content of a page as markdown-like text.
+
+    Scripts, navigation, footers and other boilerplate are dropped, headings
+    are kept as `#` lines and only the links inside the main content are
+    returned.
+
+    Raises:
+        lxml.etree.ParserError: If the document is empty.
+    """
+    doc = lxml_html.document_fromstring(html)
+    for el in [
+        el
+        for el in doc.iter(etree.Comment, etree.ProcessingInstruction, *DROP_TAGS)
+        if el.getparent() is not None
+    ]:
+        # Elements can be nested (e.g. a `<script>` in a `<form>`).
+        if el.getparent() is not None:
+            el.drop_tree()
+    # An element holding most of the text is the content, whatever its name.
+    max_length = len(doc.text_content()) * MAX_BOILERPLATE_SHARE
+    for el in [
+        el
+        for el in doc.iter(etree.Element)
+        if el.getparent() is not None and _is_boilerplate(el)
+    ]:
+        if el.getparent() is not None and len(el.text_content()) <= max_length:
+            el.drop_tree()
+
+    renderer = _Renderer(base_url)
+    renderer.walk(_main_content(doc))
+    renderer.flush()
+    return "\n".join(renderer.lines), list(dict.fromkeys(renderer.links))
+
+
+def extract_bs4(html: str, base_url: str) -> tuple[str, list[str]]:
+    """Extract every string and every link of a page with BeautifulSoup.
+
+    This is the original, slower extraction, kept as a fallback and as the
+    benchmark baseline.
+    """
+    soup = BeautifulSoup(html, "lxml")
+
+    # Extract text
+    # text = soup.get_text(separator="\n", strip=True)
+    text = "\n".join(text for text in soup.stripped_strings if text)
+
+    # Extract links
+    links = []
+    for link in soup.find_all("a", href=True):
+        href = str(link["href"])
+        full_url = urljoin(base_url, href)
+        links.append(full_url)
+    # deduplicate links while preserving order
+    links = list(dict.fromkeys(links))
+
+    return text, links
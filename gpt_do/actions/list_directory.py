@@ -1,80 +1,152 @@
 from __future__ import annotations
 
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 from pydantic import BaseModel
 
 from .action import Action
+from .registry import register
+from .session_state import current_session
+from .walk import Entry, Walker
 
+if TYPE_CHECKING:
+    from .prefetch import Speculation
 
+
+@register("LIST_DIRECTORY")
 class ListDirectory(Action["ListDirectory.Args", "ListDirectory.Output"]):
     """List the items in a directory.
 
-    The output has a maximum of 100 items.
+    Directories matched by `.gitignore` files (and the likes of `node_modules`
+    and `.venv`) are reported but not descended into. Results are returned in
+    pages of 100 items; pass the cursor to get the next page.
 
     Args:
         path: The path to the directory to list items for.
-        recursive: Whether to list the directory recursively.
-        extension: An optional file extension filter (including the leading '.').
+        max_depth: How many levels to descend; 1 only lists the directory itself.
+            Leave empty for no limit.
+        globs: Optional glob filters for files, e.g. "*.py" or "src/**/test_*.py".
         include_hidden: Whether to include hidden files.
+        include_ignored: Whether to also descend into ignored directories.
+        cursor: The cursor returned by a previous listing, to get its next page.
+            The other arguments are then ignored.
 
     Output:
         files: A list of files.
-        dirs: A list of directories.
+        dirs: A list of directories, with the number of files and directories
+            directly inside them.
+        ignored: A list of ignored directories that were not descended into.
+        cursor: A cursor to get the next page, if there are more items.
         error: An error message.
     """
 
     confirm = False
+    read_only = True
+    model_tier = "fast"
 
-    ITEM_LIMIT = 100
+    PAGE_SIZE = 100
 
     class Args(BaseModel):
         path: str
-        recursive: bool
-        extension: Optional[str]
+        max_depth: Optional[int]
+        globs: Optional[list[str]]
         include_hidden: bool
+        include_ignored: bool
+        cursor: Optional[str]
+
+    class Dir(BaseModel):
+        path: str
+        files: int
+        dirs: int
 
     class Output(BaseModel):
         files: list[str]
-        dirs: list[str]
+        dirs: list[ListDirectory.Dir]
+        ignored: list[str]
+        cursor: Optional[str]
         error: Optional[str]
 
+    @classmethod
+    def error(cls, message: str) -> Output:
+        return cls.Output(files=[], dirs=[], ignored=[], cursor=None, error=message)
+
     @classmethod
     def perform(cls, args: Args) -> Output:
         """Execute the action."""
 
-        path = Path(args.path)
-        if not Path.exists(path):
-            return cls.Output(error=f"Path not found: {path}", files=[], dirs=[])
-        if not Path.is_dir(path):
-            return cls.Output(
-                error=f"Path is not a directory: {path}", files=[], dirs=[]
+        if args.cursor is not None:
+            next_walker = current_session().walks.pop(args.cursor)
+            if next_walker is None:
+                return cls.error(f"Unknown or exhausted cursor: {args.cursor!r}")
+            walker = next_walker
+            entries, more = walker.take(cls.PAGE_SIZE)
+        else:
+            path = Path(args.path)
+            if not Path.exists(path):
+                return cls.error(f"Path not found: {path}")
+            if not Path.is_dir(path):
+                return cls.error(f"Path is not a directory: {path}")
+            mtime_ns = path.stat().st_mtime_ns
+            _, walker, entries, more = current_session().prefetcher.take(
+                ("LIST_DIRECTORY", *cls._key(path, args)),
+                partial(cls._first_page, path, args),
+                # Only changes to the directory itself are noticed.
+                valid=lambda page: page[0] == mtime_ns,
             )
+        output = cls.Output(
+            files=[entry.path for entry in entries if not entry.is_dir],
+            dirs=[
+                cls.Dir(path=entry.path, files=entry.files, dirs=entry.dirs)
+                for entry in entries
+                if entry.is_dir and not entry.ignored
+            ],
+            ignored=[entry.path for entry in entries if entry.ignored],
+            cursor=current_session().walks.add(walker) if more else None,
+            error=None,
+        )
+        return output
+
+    @classmethod
+    def speculate(cls, target: str) -> Optional[Speculation]:
+        """List the top level of a directory named in the plan."""
+        path = Path(target).expanduser()
+        if not path.is_dir():
+            return None
+        args = cls.Args(
+            path=str(path),
+            max_depth=1,
+            globs=None,
+            include_hidden=False,
+            include_ignored=False,
+            cursor=None,
+        )
+        key = ("LIST_DIRECTORY", *cls._key(path, args))
+        return key, partial(cls._first_page, path, args)
+
+    @staticmethod
+    def _key(path: Path, args: Args) -> tuple[Any, ...]:
+        return (
+            str(path.resolve()),
+            args.max_depth,
+            tuple(args.globs or ()),
+            args.include_hidden,
+            args.include_ignored,
+        )
 
-        dirs_to_check = [path]
-
-        files = []
-        dirs = []
-
-        while dirs_to_check:
-            current_dir = dirs_to_check.pop()
-            for item in current_dir.iterdir():
-                if not args.include_hidden and item.name.startswith("."):
-                    continue
-                if item.is_dir():
-                    dirs.append(str(item))
-                    if args.recursive:
-                        dirs_to_check.append(item)
-                elif item.is_file():
-                    if args.extension and not item.suffix == args.extension:
-                        continue
-                    files.append(str(item))
-                if len(files) + len(dirs) >= cls.ITEM_LIMIT:
-                    return cls.Output(
-                        error=f"Too many items to list (limit: {cls.ITEM_LIMIT})",
-                        files=files,
-                        dirs=dirs,
-                    )
-
-        return cls.Output(files=files, dirs=dirs, error=None)
+    @classmethod
+    def _first_page(
+        cls, path: Path, args: Args
+    ) -> tuple[int, Walker, list[Entry], bool]:
+        """Start a walk and take its first page, noting the directory's mtime."""
+        mtime_ns = path.stat().st_mtime_ns
+        walker = Walker(
+            str(path),
+            max_depth=args.max_depth,
+            globs=args.globs,
+            include_hidden=args.include_hidden,
+            include_ignored=args.include_ignored,
+        )
+        entries, more = walker.take(cls.PAGE_SIZE)
+        return mtime_ns, walker, entries, more
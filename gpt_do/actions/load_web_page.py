@@ -2,94 +2,139 @@ from __future__ import annotations
 
 import logging
 from typing import Optional
-from urllib.parse import urljoin
 
-import requests
-from bs4 import BeautifulSoup
 from pydantic import BaseModel
 
+from . import web
 from .action import Action
+from .page_cache import PAGE_CACHE, CachedPage
+from .registry import register
+from .session_state import current_session
 
 logger = logging.getLogger(__name__)
 
-TIMEOUT_S = 10
+# Identifies the extraction in cached parse results; bump when it changes.
+PARSER = "lxml-main-content-2"
 
 HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/85.0.4183.102 Safari/537.36"
-    ),
     "Accept": (
         "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
     ),
-    "Accept-Language": "en-US,en;q=0.5",
     "Accept-Encoding": "gzip, deflate, br",
-    "Connection": "keep-alive",
     "Upgrade-Insecure-Requests": "1",
 }
 
 
+@register("LOAD_WEB_PAGE")
 class LoadWebPage(Action["LoadWebPage.Args", "LoadWebPage.Output"]):
     """Load a web page given a URL.
 
     If you don't know the exact URL, you can start from the home page
     and follow links to the desired page.
 
+    Large pages are not returned whole: only the sections most relevant
+    to the objective are, along with a document handle to retrieve more.
+
     Args:
         url: The URL of the web page.
+        objective: What you are looking for on the page.
 
     Output:
-        text: The text content of the web page.
-        links: A list of URLs found in the web page.
+        text: The main content of the web page as markdown-like text.
+        links: A list of URLs found in the main content of the web page.
+        document: A handle to retrieve more of a large page, if it was truncated.
         error: An error message if the page could not be loaded.
     """
 
     confirm = True
+    read_only = True
+    model_tier = "fast"
 
     class Args(BaseModel):
         url: str
+        objective: Optional[str]
 
     class Output(BaseModel):
         text: Optional[str]
         links: Optional[list[str]]
+        document: Optional[str]
         error: Optional[str]
 
     @classmethod
     def perform(cls, args: Args) -> Output:
         """Execute the action."""
+        output = cls._load(args.url)
+        if output.text is None:
+            return output
+        text, document = current_session().documents.retrieve(
+            args.url, output.text, args.objective
+        )
+        return output.model_copy(update={"text": text, "document": document})
+
+    @classmethod
+    def _load(cls, url: str) -> Output:
+        """Load and parse a page, going through the page cache."""
+        cached = PAGE_CACHE.lookup(url, PARSER)
+        if cached is not None and cached.fresh:
+            output = cls._from_cache(cached)
+            if output is not None:
+                PAGE_CACHE.hit()
+                logger.debug(f"Page cache hit: {url}")
+                return output
+
+        import requests
+
+        headers = HEADERS if cached is None else {**HEADERS, **cached.validators()}
         try:
-            response = requests.get(
-                args.url,
-                timeout=TIMEOUT_S,
+            response = web.get(
+                url,
                 allow_redirects=True,
-                headers=HEADERS,
+                headers=headers,
             )
+            if response.status_code == 304 and cached is not None:
+                PAGE_CACHE.revalidated(cached, response.headers)
+                output = cls._from_cache(cached)
+                if output is not None:
+                    logger.debug(f"Page cache revalidated: {url}")
+                    return output
+                response = web.get(url, allow_redirects=True, headers=HEADERS)
             response.raise_for_status()
         except requests.RequestException as e:
             logger.exception("Failed to load web page")
-            return cls.Output(error=str(e), text=None, links=None)
+            return cls.Output(error=str(e), text=None, links=None, document=None)
+        PAGE_CACHE.miss()
 
         # Ensure correct encoding
         if response.encoding is None:
             response.encoding = response.apparent_encoding
 
-        response_text = response.text
+        # The final URL after redirects
+        text, links = cls.parse(response.text, response.url)
+        PAGE_CACHE.store(url, response, PARSER, text, links)
+        return cls.Output(text=text, links=links, document=None, error=None)
 
-        soup = BeautifulSoup(response_text, "lxml")
-
-        # Extract text
-        # text = soup.get_text(separator="\n", strip=True)
-        text = "\n".join(text for text in soup.stripped_strings if text)
-
-        # Extract links
-        base_url = response.url  # The final URL after redirects
-        links = []
-        for link in soup.find_all("a", href=True):
-            href = link["href"]
-            full_url = urljoin(base_url, href)
-            links.append(full_url)
-        # deduplicate links while preserving order
-        links = list(dict.fromkeys(links))
+    @classmethod
+    def _from_cache(cls, cached: CachedPage) -> Optional[Output]:
+        """Return the output for a cache entry, re-parsing the body if needed."""
+        if cached.text is None or cached.links is None:
+            body = PAGE_CACHE.body(cached)
+            if body is None:
+                return None
+            cached.text, cached.links = cls.parse(body, cached.final_url)
+            PAGE_CACHE.store_parsed(cached, PARSER, cached.text, cached.links)
+        return cls.Output(
+            text=cached.text, links=cached.links, document=None, error=None
+        )
+
+    @staticmethod
+    def parse(html: str, base_url: str) -> tuple[str, list[str]]:
+        """Extract the main content and its links from a page."""
+        from lxml import etree
+
+        from .html_extract import extract, extract_bs4
 
-        return cls.Output(text=text, links=links, error=None)
+        try:
+            return extract(html, base_url)
+        except (etree.ParserError, ValueError):
+            logger.debug("lxml extraction failed, falling back to BeautifulSoup")
+            return extract_bs4(html, base_url)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import codecs
+import mmap
+from pathlib import Path
+from types import TracebackType
+from typing import Optional
+
+SNIFF_BYTES = 8 * 1024
+# Block size used when scanning the mapping for newlines.
+SCAN_BYTES = 1024 * 1024
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def sniff_encoding(head: bytes) -> Optional[str]:
+    """Guess the encoding of a file from its first bytes.
+
+    Returns:
+        The encoding, or None if the file looks binary.
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    if b"\0" in head:
+        return None
+    try:
+        # An incremental decoder tolerates a character cut off by the sniff.
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        pass
+    else:
+        return "utf-8"
+    # Mostly control characters other than whitespace means binary.
+    control = sum(1 for b in head if b < 32 and b not in b"\t\n\r\f\b")
+    if head and control / len(head) > 0.1:
+        return None
+    return "cp1252"
+
+
+class MappedFile:
+    """Read-only memory mapping of a file with line-aware slicing.
+
+    Only the pages that are actually sliced or scanned are read from disk.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        self.size = path.stat().st_size
+        self._map: Optional[mmap.mmap] = None
+        if self.size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self) -> MappedFile:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def read(self, start: int, end: int) -> bytes:
+        """Return the bytes in `[start, end)`."""
+        if self._map is None:
+            return b""
+        return self._map[max(start, 0) : min(end, self.size)]
+
+    def head(self, n: int = SNIFF_BYTES) -> bytes:
+        return self.read(0, n)
+
+    def line_count(self) -> int:
+        """Count the lines, including a last line without a newline."""
+        if self._map is None:
+            return 0
+        count = 0
+        for start in range(0, self.size, SCAN_BYTES):
+            count += self._map[start : start + SCAN_BYTES].count(b"\n")
+        if self._map[self.size - 1 : self.size] != b"\n":
+            count += 1
+        return count
+
+    def line_offset(self, line: int) -> int:
+        """Return the byte offset where the 0-based `line` starts."""
+        if self._map is None or line <= 0:
+            return 0
+        remaining = line
+        for start in range(0, self.size, SCAN_BYTES):
+            block = self._map[start : start + SCAN_BYTES]
+            newlines = block.count(b"\n")
+            if newlines < remaining:
+                remaining -= newlines
+                continue
+            position = -1
+            for _ in range(remaining):
+                position = block.find(b"\n", position + 1)
+            return start + position + 1
+        return self.size
+
+    def tail_offset(self, lines: int) -> int:
+        """Return the byte offset where the last `lines` lines start."""
+        if self._map is None or lines <= 0:
+            return self.size
+        end = self.size
+        if self._map[end - 1 : end] == b"\n":
+            end -= 1
+        for _ in range(lines):
+            newline = self._map.rfind(b"\n", 0, end)
+            if newline == -1:
+                return 0
+            end = newline
+        return end + 1
+
+    def line_boundary(self, offset: int) -> int:
+        """Return the offset just after the last newline before `offset`."""
+        if self._map is None or offset >= self.size:
+            return min(offset, self.size)
+        newline = self._map.rfind(b"\n", 0, offset)
+        return newline + 1 if newline != -1 else offset
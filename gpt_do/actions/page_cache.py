@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Mapping, Optional
+
+from .. import TMP_DIR
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = TMP_DIR / "http_cache"
+MAX_BYTES = 256 * 1024 * 1024
+# Upper bound for the heuristic freshness of responses without max-age.
+MAX_HEURISTIC_S = 24 * 60 * 60
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    revalidated: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} hits, {self.revalidated} revalidated, "
+            f"{self.misses} misses, {self.stores} stored, "
+            f"{self.evictions} evicted"
+        )
+
+
+@dataclass
+class CachedPage:
+    """Metadata of a cached response, plus its parsed result if available."""
+
+    url: str
+    final_url: str
+    encoding: Optional[str]
+    stored_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    max_age: Optional[float] = None
+    no_cache: bool = False
+    parser: Optional[str] = None
+    text: Optional[str] = field(default=None, repr=False)
+    links: Optional[list[str]] = field(default=None, repr=False)
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the response can be reused without revalidation."""
+        if self.no_cache or self.max_age is None:
+            return False
+        return time.time() - self.stored_at < self.max_age
+
+    def validators(self) -> dict[str, str]:
+        """Return the headers for a conditional GET."""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def parse_cache_control(value: str) -> dict[str, Optional[str]]:
+    directives: dict[str, Optional[str]] = {}
+    for part in value.split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def freshness(headers: Mapping[str, str], now: float) -> Optional[float]:
+    """Return how long a response stays fresh, following RFC 9111."""
+    directives = parse_cache_control(headers.get("Cache-Control", ""))
+    for name in ("s-maxage", "max-age"):
+        value = directives.get(name)
+        if value is not None and value.isdigit():
+            age = headers.get("Age", "0")
+            return int(value) - (int(age) if age.isdigit() else 0)
+    expires = headers.get("Expires")
+    if expires is not None:
+        try:
+            return email.utils.parsedate_to_datetime(expires).timestamp() - now
+        except (TypeError, ValueError):
+            return 0
+    last_modified = headers.get("Last-Modified")
+    if last_modified is not None:
+        try:
+            modified = email.utils.parsedate_to_datetime(last_modified).timestamp()
+        except (TypeError, ValueError):
+            return None
+        return min((now - modified) / 10, MAX_HEURISTIC_S)
+    return None
+
+
+class PageCache:
+    """On-disk HTTP response cache with a size-bounded LRU eviction policy.
+
+    Each entry is stored as three files named after the hash of the URL: the
+    raw body, the response metadata and the parsed text and links. The
+    modification time of the metadata file records the last access.
+    """
+
+    def __init__(
+        self,
+        directory: Path = CACHE_DIR,
+        max_bytes: int = MAX_BYTES,
+        enabled: bool = True,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def _path(self, url: str, suffix: str) -> Path:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / f"{key}.{suffix}"
+
+    def lookup(self, url: str, parser: str) -> Optional[CachedPage]:
+        """Return the cached entry for a URL, if any.
+
+        The parsed result is only loaded if it was produced by `parser`.
+        """
+        if not self.enabled:
+            return None
+        meta_path = self._path(url, "meta.json")
+        try:
+            meta = json.loads(meta_path.read_text())
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        page = CachedPage(**meta)
+        if page.parser == parser:
+            try:
+                parsed = json.loads(self._path(url, "parsed.json").read_text())
+            except (OSError, ValueError):
+                pass
+            else:
+                page.text, page.links = parsed["text"], parsed["links"]
+        return page
+
+    def body(self, page: CachedPage) -> Optional[str]:
+        """Return the decoded raw body of a cached entry."""
+        try:
+            raw = self._path(page.url, "body").read_bytes()
+        except OSError:
+            return None
+        return raw.decode(page.encoding or "utf-8", errors="replace")
+
+    def store(
+        self,
+        url: str,
+        response: requests.Response,
+        parser: str,
+        text: str,
+        links: list[str],
+    ) -> None:
+        """Store a response along with its parsed result."""
+        if not self.enabled:
+            return
+        directives = parse_cache_control(response.headers.get("Cache-Control", ""))
+        if "no-store" in directives:
+            return
+        now = time.time()
+        page = CachedPage(
+            url=url,
+            final_url=response.url,
+            encoding=response.encoding,
+            stored_at=now,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            max_age=freshness(response.headers, now),
+            no_cache="no-cache" in directives,
+            parser=parser,
+        )
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._write(self._path(url, "body"), response.content)
+            self._write_parsed(page, text, links)
+            self._write_meta(page)
+            self.stats.stores += 1
+            self._evict()
+
+    def store_parsed(
+        self, page: CachedPage, parser: str, text: str, links: list[str]
+    ) -> None:
+        """Replace the parsed result of an entry, e.g. after a parser change."""
+        if not self.enabled:
+            return
+        page.parser = parser
+        with self._lock:
+            self._write_parsed(page, text, links)
+            self._write_meta(page)
+
+    def revalidated(self, page: CachedPage, headers: Mapping[str, str]) -> None:
+        """Refresh an entry after a `304 Not Modified` response.
+
+        The entry keeps its freshness lifetime unless the response restates it.
+        """
+        now = time.time()
+        page.stored_at = now
+        if "Cache-Control" in headers or "Expires" in headers:
+            page.max_age = freshness(headers, now)
+            directives = parse_cache_control(headers.get("Cache-Control", ""))
+            page.no_cache = "no-cache" in directives
+        page.etag = headers.get("ETag", page.etag)
+        page.last_modified = headers.get("Last-Modified", page.last_modified)
+        with self._lock:
+            self._write_meta(page)
+            self.stats.revalidated += 1
+
+    def hit(self) -> None:
+        """Count an entry reused without revalidation."""
+        with self._lock:
+            self.stats.hits += 1
+
+    def miss(self) -> None:
+        """Count a page that had to be downloaded."""
+        with self._lock:
+            self.stats.misses += 1
+
+    def _write_meta(self, page: CachedPage) -> None:
+        meta = asdict(page)
+        del meta["text"], meta["links"]
+        self._write(self._path(page.url, "meta.json"), json.dumps(meta).encode())
+
+    def _write_parsed(self, page: CachedPage, text: str, links: list[str]) -> None:
+        parsed = {"text": text, "links": links}
+        self._write(self._path(page.url, "parsed.json"), json.dumps(parsed).encode())
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until under the size limit.
+
+        Files without metadata (left behind by an interrupted write) go first.
+        """
+        sizes: dict[str, int] = {}
+        accessed: dict[str, float] = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    continue
+                key = entry.name.split(".", maxsplit=1)[0]
+                stat = entry.stat()
+                sizes[key] = sizes.get(key, 0) + stat.st_size
+                accessed.setdefault(key, 0.0)
+                if entry.name.endswith(".meta.json"):
+                    accessed[key] = stat.st_mtime
+        total = sum(sizes.values())
+        for key in sorted(accessed, key=accessed.__getitem__):
+            if total <= self.max_bytes:
+                break
+            for suffix in ("body", "parsed.json", "meta.json"):
+                (self.directory / f"{key}.{suffix}").unlink(missing_ok=True)
+            total -= sizes[key]
+            self.stats.evictions += 1
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        if enabled is not None:
+            self.enabled = enabled
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+
+PAGE_CACHE = PageCache()
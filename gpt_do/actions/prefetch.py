@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Hashable, Iterator, Optional, TypeVar
+
+from .registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# A load implied by the plan: its key and the function performing it.
+Speculation = tuple[Hashable, Callable[[], Any]]
+
+# Loads started per plan, at most.
+MAX_SPECULATIONS = 4
+# Steps a load is kept for before it is dropped as a wrong guess.
+KEEP_STEPS = 2
+WORKERS = 4
+
+_URL_RE = re.compile(r"https?://[^\s<>\"'`()\[\]]+")
+_TOKEN_RE = re.compile(r"[^\s\"'`()\[\]<>,;]+")
+# Trailing punctuation of a URL or path at the end of a sentence.
+_TRAILING = ".,:;!?"
+
+
+@lru_cache(maxsize=None)
+def _executor() -> ThreadPoolExecutor:
+    """The threads the loads of all sessions run on, started on first use."""
+    return ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="prefetch")
+
+
+def plan_targets(plan: list[str]) -> Iterator[str]:
+    """Yield the URLs and path-like words named in a plan, in order, once each."""
+    seen = set()
+    for line in plan:
+        for match in _URL_RE.finditer(line):
+            target = match.group().rstrip(_TRAILING)
+            if target not in seen:
+                seen.add(target)
+                yield target
+        for match in _TOKEN_RE.finditer(_URL_RE.sub(" ", line)):
+            target = match.group().rstrip(_TRAILING)
+            if ("/" in target or target.startswith("~")) and target not in seen:
+                seen.add(target)
+                yield target
+
+
+@dataclass
+class PrefetchStats:
+    # Loads started from the plan.
+    predicted: int = 0
+    # Loads whose result was served to an action.
+    hits: int = 0
+    # Loads whose result was out of date or failed when an action needed it.
+    stale: int = 0
+    # Loads dropped without being needed.
+    wasted: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.predicted if self.predicted else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits}/{self.predicted} prefetched loads used "
+            f"({self.hit_rate:.0%}), {self.stale} stale, {self.wasted} wasted"
+        )
+
+
+@dataclass
+class _Pending:
+    future: Future[Any]
+    step: int
+
+
+@dataclass
+class Prefetcher:
+    """Speculatively perform the loads implied by the plan of a session.
+
+    Read-only actions that need no confirmation declare, with
+    `Action.speculate`, the load a URL or path named in the plan implies, and
+    get its result with `take`. Once the actions of a step are performed, the
+    loads implied by its plan run on background threads while the next
+    completion is awaited. An action whose
+    load was started is served its result, once checked to still be valid,
+    instead of performing it. Loads not needed within a couple of steps are
+    dropped.
+    """
+
+    enabled: bool = False
+    stats: PrefetchStats = field(default_factory=PrefetchStats)
+    step: int = 0
+    _pending: dict[Hashable, _Pending] = field(default_factory=dict)
+    # Loads already performed, which plans keep naming until they move on.
+    _taken: set[Hashable] = field(default_factory=set)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def speculate(self, plan: list[str]) -> None:
+        """Start the loads implied by the URLs and paths named in a plan."""
+        if not self.enabled:
+            return
+        started = 0
+        for target in plan_targets(plan):
+            for name, action in REGISTRY.items():
+                # Prefetching must not bypass the confirmation of a load.
+                if not action.read_only or action.confirm:
+                    continue
+                speculation = action.speculate(target)
+                if speculation is not None and self._submit(*speculation):
+                    logger.debug(f"Prefetching {name} for {target!r}")
+                    started += 1
+                    if started == MAX_SPECULATIONS:
+                        return
+
+    def take(
+        self,
+        key: Hashable,
+        load: Callable[[], T],
+        valid: Optional[Callable[[T], bool]] = None,
+    ) -> T:
+        """Return the result of a prefetched load, or perform the load now.
+
+        Args:
+            key: Identifies the load, as returned by `Action.speculate`.
+            load: Performs the load if it was not prefetched.
+            valid: Whether a prefetched result is still up to date.
+        """
+        with self._lock:
+            pending = self._pending.pop(key, None)
+            self._taken.add(key)
+        if pending is not None:
+            try:
+                result: T = pending.future.result()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.debug(f"Prefetched load of {key} failed", exc_info=True)
+            else:
+                if valid is None or valid(result):
+                    with self._lock:
+                        self.stats.hits += 1
+                    logger.debug(f"Prefetch hit: {key}")
+                    return result
+            with self._lock:
+                self.stats.stale += 1
+        return load()
+
+    def advance(self, step: int) -> None:
+        """Drop the loads not needed within `KEEP_STEPS` steps."""
+        with self._lock:
+            self.step = step
+            expired = [
+                key
+                for key, pending in self._pending.items()
+                if step - pending.step > KEEP_STEPS
+            ]
+            for key in expired:
+                self._drop(key)
+
+    def close(self) -> None:
+        """Drop all loads, e.g. at the end of the session."""
+        with self._lock:
+            for key in list(self._pending):
+                self._drop(key)
+
+    def _submit(self, key: Hashable, load: Callable[[], Any]) -> bool:
+        with self._lock:
+            if key in self._pending or key in self._taken:
+                return False
+            # Traced under the step that predicted it.
+            future = _executor().submit(contextvars.copy_context().run, load)
+            self._pending[key] = _Pending(future=future, step=self.step)
+            self.stats.predicted += 1
+            return True
+
+    def _drop(self, key: Hashable) -> None:
+        self._pending.pop(key).future.cancel()
+        self.stats.wasted += 1
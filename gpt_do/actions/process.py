@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import codecs
+import logging
+import os
+import selectors
+import signal
+import subprocess as sp
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+READ_BYTES = 64 * 1024
+# Time given to a process group to exit after SIGTERM before SIGKILL.
+KILL_GRACE_S = 2.0
+# Interval at which a process is checked for having exited while its pipes
+# are still open, e.g. held by a background process it started.
+EXIT_POLL_S = 0.1
+# Time the pipes are still read after the process exited.
+DRAIN_GRACE_S = 0.5
+
+
+@dataclass
+class HeadTail:
+    """Keep the first and last `limit` bytes of a stream, and its total size.
+
+    Once the output overflows, it can also be spilled in full to a file.
+    """
+
+    limit: int
+    spill_path: Optional[Path] = None
+    head: bytearray = field(default_factory=bytearray)
+    tail: bytearray = field(default_factory=bytearray)
+    total: int = 0
+    _spill: Optional[IO[bytes]] = field(default=None, repr=False)
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        if self._spill is not None:
+            self._spill.write(data)
+        room = self.limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        if self._spill is None and self.spill_path is not None:
+            # Nothing has been dropped yet: the head is the whole output so far.
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self._spill = self.spill_path.open("wb")
+            self._spill.write(self.head + self.tail + data)
+        self.tail += data
+        if len(self.tail) > self.limit:
+            del self.tail[: len(self.tail) - self.limit]
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+
+    @property
+    def spilled(self) -> Optional[str]:
+        """The path of the full output, if it was spilled."""
+        return str(self.spill_path) if self._spill is not None else None
+
+    def text(self) -> str:
+        omitted = self.total - len(self.head) - len(self.tail)
+        if omitted <= 0:
+            return (self.head + self.tail).decode(errors="replace")
+        return (
+            self.head.decode(errors="replace")
+            + f"\n[... {omitted} bytes omitted ...]\n"
+            + self.tail.decode(errors="replace")
+        )
+
+
+@dataclass
+class RunResult:
+    stdout: HeadTail
+    stderr: HeadTail
+    return_code: Optional[int]
+    timed_out: bool
+    duration_s: float
+
+
+def kill_group(process: sp.Popen[bytes]) -> None:
+    """Terminate the process group of `process`, then kill it if it lingers."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            process.wait(timeout=KILL_GRACE_S)
+            return
+        except sp.TimeoutExpired:
+            continue
+
+
+class Echo:
+    """Copy output to the console as it arrives."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.consoles = {"stdout": sys.stdout, "stderr": sys.stderr}
+        # Chunks can split a character, so decode incrementally.
+        self.decoders = {
+            name: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for name in self.consoles
+        }
+
+    def __call__(self, name: str, data: bytes) -> None:
+        if self.enabled and data:
+            console = self.consoles[name]
+            console.write(self.decoders[name].decode(data))
+            console.flush()
+
+
+def pump(
+    selector: selectors.BaseSelector,
+    deadline: Optional[float],
+    on_data: Callable[[str, bytes], bool],
+    exited: Optional[Callable[[], bool]] = None,
+) -> bool:
+    """Read the registered pipes until all of them are done.
+
+    A pipe is done at end of file or when `on_data` returns False for it.
+    Once `exited` returns True, the pipes are only read for `DRAIN_GRACE_S`
+    more, as background processes can keep them open indefinitely.
+
+    Returns:
+        Whether the deadline expired first.
+    """
+    drain_until: Optional[float] = None
+    while selector.get_map():
+        now = time.monotonic()
+        if drain_until is None and exited is not None and exited():
+            drain_until = now + DRAIN_GRACE_S
+        if drain_until is not None:
+            if now >= drain_until:
+                logger.debug("Process exited with its pipes still open")
+                return False
+            timeout: Optional[float] = drain_until - now
+        else:
+            timeout = None if deadline is None else deadline - now
+            if timeout is not None and timeout <= 0:
+                return True
+            if exited is not None:
+                timeout = EXIT_POLL_S if timeout is None else min(timeout, EXIT_POLL_S)
+        for key, _ in selector.select(timeout=timeout):
+            data = os.read(key.fd, READ_BYTES)
+            if not data or not on_data(key.data, data):
+                selector.unregister(key.fileobj)
+    return False
+
+
+def run_streaming(
+    command: str,
+    timeout_s: Optional[float],
+    capture_bytes: int,
+    spill_prefix: Optional[Path] = None,
+    echo: bool = True,
+) -> RunResult:
+    """Run a shell command, streaming its output instead of buffering it all.
+
+    The command runs in its own process group, which is killed as a whole
+    when the timeout expires. Processes it leaves running in the background
+    are not waited for. Only the head and tail of each stream are kept
+    in memory; the full output is spilled next to `spill_prefix` if it
+    doesn't fit. With `echo`, output is also copied to the console as it
+    arrives.
+    """
+    started = time.monotonic()
+    deadline = None if timeout_s is None else started + timeout_s
+    buffers = capture_buffers(capture_bytes, spill_prefix)
+    echo_output = Echo(echo)
+
+    def on_data(name: str, data: bytes) -> bool:
+        buffers[name].write(data)
+        echo_output(name, data)
+        return True
+
+    process = sp.Popen(  # pylint: disable=consider-using-with
+        command,
+        shell=True,
+        stdin=sp.DEVNULL,
+        stdout=sp.PIPE,
+        stderr=sp.PIPE,
+        start_new_session=True,
+    )
+    assert process.stdout is not None and process.stderr is not None
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, "stdout")
+        selector.register(process.stderr, selectors.EVENT_READ, "stderr")
+        timed_out = pump(
+            selector, deadline, on_data, exited=lambda: process.poll() is not None
+        )
+    if timed_out:
+        logger.warning(f"Command timed out after {timeout_s}s, killing it")
+        kill_group(process)
+
+    process.stdout.close()
+    process.stderr.close()
+    for buffer in buffers.values():
+        buffer.close()
+    return_code = process.wait() if not timed_out else process.poll()
+    return RunResult(
+        stdout=buffers["stdout"],
+        stderr=buffers["stderr"],
+        return_code=return_code,
+        timed_out=timed_out,
+        duration_s=time.monotonic() - started,
+    )
+
+
+def capture_buffers(
+    capture_bytes: int, spill_prefix: Optional[Path]
+) -> dict[str, HeadTail]:
+    """Return the head/tail buffers of stdout and stderr."""
+    return {
+        name: HeadTail(
+            capture_bytes,
+            spill_prefix.with_suffix(f".{suffix}") if spill_prefix else None,
+        )
+        for name, suffix in (("stdout", "out"), ("stderr", "err"))
+    }
@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Mapping, Optional, TypeVar
+
+from ..tracing import history_size
+from .session_state import current_session
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Rough size of a prompt token in the serialized messages.
+BYTES_PER_TOKEN = 4
+# Tokens reserved for the completion of a request, on top of its prompt. The
+# reservation is corrected by the remaining tokens the API reports.
+COMPLETION_ALLOWANCE_TOKENS = 512
+# Interval at which a request waiting for a free slot checks again.
+SLOT_POLL_S = 0.05
+# Minimum interval between two reductions of the concurrency window, so one
+# burst of rate limited requests only halves it once.
+DECREASE_INTERVAL_S = 1.0
+# Fraction of the limit left below which the API is considered saturated.
+LOW_REMAINING = 0.05
+# Statuses retried besides connection errors, as by the client library.
+RETRY_STATUSES = (408, 409, 429)
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse a rate limit reset duration such as `1m30s` or `20ms` in seconds."""
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Return the delay requested by a `Retry-After` header in seconds."""
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            # An HTTP date, which the API does not send.
+            pass
+    return None
+
+
+class TokenBucket:
+    """A bucket refilled continuously with `per_minute` units per minute.
+
+    It holds up to a minute's worth of units and is unlimited until a rate
+    is known. Not thread safe, the limiter holds its lock.
+    """
+
+    def __init__(self, per_minute: Optional[float] = None) -> None:
+        self.per_minute = per_minute
+        self.level = per_minute or 0.0
+        self._updated = time.monotonic()
+
+    def set_rate(self, per_minute: Optional[float]) -> None:
+        self._refill()
+        if self.per_minute is None and per_minute is not None:
+            self.level = per_minute
+        self.per_minute = per_minute
+        if per_minute is not None:
+            self.level = min(self.level, per_minute)
+
+    def observe_remaining(self, remaining: float) -> None:
+        """Lower the level to what the API reports as remaining."""
+        self._refill()
+        self.level = min(self.level, remaining)
+
+    def delay(self, amount: float) -> float:
+        """Return the seconds until `amount` units are available."""
+        if self.per_minute is None:
+            return 0.0
+        self._refill()
+        # More than a minute's worth can never be available at once.
+        missing = min(amount, self.per_minute) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def take(self, amount: float) -> None:
+        if self.per_minute is not None:
+            self.level -= min(amount, self.per_minute)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.per_minute is not None:
+            refill = (now - self._updated) * self.per_minute / 60
+            self.level = min(self.per_minute, self.level + refill)
+        self._updated = now
+
+
+@dataclass
+class RateLimitStats:
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    throttled_s: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.requests} requests, {self.retries} retries "
+            f"({self.rate_limited} rate limited), {self.throttled_s:.1f}s throttled"
+        )
+
+
+class RateLimiter:
+    """Pace and retry the API requests of all sessions in the process.
+
+    Requests are admitted when both token buckets (requests and tokens per
+    minute) can cover them and a slot of the concurrency window is free.
+    The bucket rates are the configured limits, or the limits reported in
+    the `x-ratelimit-*` headers of the responses, whose remaining counts
+    also correct the bucket levels.
+
+    The concurrency window grows by one slot per window of successful
+    requests and is halved when a request is rate limited or the reported
+    remaining counts run low. A rate limited request pauses all sessions
+    until its `Retry-After`, other transient failures back off exponentially
+    with full jitter.
+
+    With the limiter enabled the clients are built with `client_options`,
+    which turns off the retries of the client library and observes the
+    headers of every response.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.max_retries = 6
+        self.base_backoff_s = 0.5
+        self.max_backoff_s = 30.0
+        self.max_concurrency = 16
+        self.stats = RateLimitStats()
+        self._configured: tuple[Optional[float], Optional[float]] = (None, None)
+        self._requests = TokenBucket()
+        self._tokens = TokenBucket()
+        self._window = float(self.max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if max_retries is not None:
+                self.max_retries = max_retries
+            if max_concurrency is not None:
+                self.max_concurrency = max_concurrency
+                self._window = float(max_concurrency)
+            self._configured = (requests_per_minute, tokens_per_minute)
+            self._requests.set_rate(requests_per_minute)
+            self._tokens.set_rate(tokens_per_minute)
+
+    def client_options(self, asynchronous: bool = False) -> dict[str, Any]:
+        """Return the client options for requests paced by the limiter."""
+        if not self.enabled:
+            return {}
+        from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+        http_client: Any
+        if asynchronous:
+
+            async def hook(response: Any) -> None:
+                self.observe(response.headers)
+
+            http_client = DefaultAsyncHttpxClient(event_hooks={"response": [hook]})
+        else:
+            http_client = DefaultHttpxClient(
+                event_hooks={
+                    "response": [lambda response: self.observe(response.headers)]
+                }
+            )
+        return {"max_retries": 0, "http_client": http_client}
+
+    def call(
+        self, request: Callable[[], T], messages: list[ChatCompletionMessageParam]
+    ) -> T:
+        """Send a request once admitted, retrying transient failures."""
+        if not self.enabled:
+            return request()
+        tokens = request_tokens(messages)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            while (delay := self._admit(tokens)) > 0:
+                time.sleep(delay)
+            self._throttled(time.monotonic() - started)
+            try:
+                result = request()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._release(success=False)
+                backoff = self._retry_delay(e, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                self._throttled(backoff)
+                attempt += 1
+                continue
+            self._release(success=True)
+            return result
+
+    async def acall(
+        self,
+        request: Callable[[], Awaitable[T]],
+        messages: list[ChatCompletionMessageParam],
+    ) -> T:
+        """Send a request on the event loop (see `call`)."""
+        if not self.enabled:
+            return await request()
+        tokens = request_tokens(messages)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            while (delay := self._admit(tokens)) > 0:
+                await asyncio.sleep(delay)
+            self._throttled(time.monotonic() - started)
+            try:
+                result = await request()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._release(success=False)
+                backoff = self._retry_delay(e, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                self._throttled(backoff)
+                attempt += 1
+                continue
+            self._release(success=True)
+            return result
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Update the limits and levels from the rate limit headers."""
+        limits = {}
+        for name, bucket, configured in (
+            ("requests", self._requests, self._configured[0]),
+            ("tokens", self._tokens, self._configured[1]),
+        ):
+            limit = _header_number(headers, f"x-ratelimit-limit-{name}")
+            remaining = _header_number(headers, f"x-ratelimit-remaining-{name}")
+            with self._lock:
+                if limit is not None:
+                    if configured is not None:
+                        limit = min(limit, configured)
+                    if limit != bucket.per_minute:
+                        bucket.set_rate(limit)
+                        limits[name] = limit
+                if remaining is not None:
+                    bucket.observe_remaining(remaining)
+                    if limit and remaining < limit * LOW_REMAINING:
+                        self._decrease()
+                if remaining == 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}", ""))
+                    if reset is not None:
+                        self._pause(reset)
+        if limits:
+            logger.debug(f"Rate limits per minute: {limits}")
+
+    def _admit(self, tokens: int) -> float:
+        """Admit a request and return 0, or the seconds to wait before retrying."""
+        with self._lock:
+            delay = max(
+                self._paused_until - time.monotonic(),
+                self._requests.delay(1),
+                self._tokens.delay(tokens),
+            )
+            if self._in_flight >= max(1, int(self._window)):
+                delay = max(delay, SLOT_POLL_S)
+            if delay > 0:
+                return delay
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+            self.stats.requests += 1
+            return 0.0
+
+    def _release(self, success: bool) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if success:
+                self._window = min(
+                    float(self.max_concurrency), self._window + 1 / self._window
+                )
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Return the delay before retrying a failed request, if it is retried."""
+        import openai
+
+        if isinstance(error, openai.APIStatusError):
+            status = error.response.status_code
+            if status not in RETRY_STATUSES and status < 500:
+                return None
+            # An exhausted quota does not come back by waiting.
+            if getattr(error, "code", None) == "insufficient_quota":
+                return None
+            requested = retry_after(error.response.headers)
+        elif isinstance(error, openai.APIConnectionError):
+            status, requested = None, None
+        else:
+            return None
+        if attempt >= self.max_retries:
+            logger.warning(f"Giving up on the request after {attempt} retries")
+            return None
+
+        backoff = min(self.max_backoff_s, self.base_backoff_s * 2**attempt)
+        if requested is not None:
+            # A little jitter keeps the paused requests from all retrying at once.
+            delay = requested * random.uniform(1.0, 1.2)
+        else:
+            delay = random.uniform(0, backoff)
+        with self._lock:
+            self.stats.retries += 1
+            if status == 429:
+                self.stats.rate_limited += 1
+                self._decrease()
+                self._pause(delay)
+        logger.info(
+            f"Request failed ({status or type(error).__name__}), "
+            f"retrying in {delay:.1f}s"
+        )
+        return delay
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_INTERVAL_S:
+            self._window = max(1.0, self._window / 2)
+            self._last_decrease = now
+            logger.debug(f"Concurrency window: {math.floor(self._window)}")
+
+    def _pause(self, delay_s: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + delay_s)
+
+    def _throttled(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.stats.throttled_s += seconds
+        current_session().usage.record_throttled(seconds)
+
+
+def request_tokens(messages: list[ChatCompletionMessageParam]) -> int:
+    """Estimate the tokens a request counts against the limit."""
+    prompt_bytes = history_size(messages)["history_bytes"]
+    return prompt_bytes // BYTES_PER_TOKEN + COMPLETION_ALLOWANCE_TOKENS
+
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+RATE_LIMITER = RateLimiter()
@@ -1,47 +1,336 @@
 from __future__ import annotations
 
+import codecs
 import logging
+import os
+import re
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Literal, Optional, Union
 
 from pydantic import BaseModel
 
 from .action import Action
+from .file_cache import CachedRead, unified_diff
+from .mapped_file import MappedFile, sniff_encoding
+from .registry import register
+from .session_state import current_session
+
+if TYPE_CHECKING:
+    from .prefetch import Speculation
 
 logger = logging.getLogger(__name__)
 
+# Encodings whose newlines are not a single `\n` byte.
+WIDE_ENCODINGS = ("utf-16", "utf-32")
+# Byte order marks of the wide encodings, with the codec reading past them
+# and the size of a code unit. UTF-32 first, as its LE mark starts with UTF-16's.
+WIDE_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le", 4),
+    (codecs.BOM_UTF32_BE, "utf-32-be", 4),
+    (codecs.BOM_UTF16_LE, "utf-16-le", 2),
+    (codecs.BOM_UTF16_BE, "utf-16-be", 2),
+)
+
+# A line and its `\n`, or the last line without one, as counted by MappedFile.
+LINE_RE = re.compile(r"[^\n]*\n|[^\n]+$")
+
+
+@dataclass
+class Decoded:
+    """The text read from a file, as of its modification time."""
 
+    mtime_ns: int
+    size: int
+    text: str
+    encoding: str
+    truncated: bool
+    line_count: Optional[int]
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """Whether the file is unchanged since it was read."""
+        return (self.mtime_ns, self.size) == (stat.st_mtime_ns, stat.st_size)
+
+
+@register("READ_FILE")
 class ReadFile(Action["ReadFile.Args", "ReadFile.Output"]):
     """Read a text file into a string given a path.
 
+    Large files are not returned whole: only the sections most relevant
+    to the objective are, along with a document handle to retrieve more.
+    Use a range to read part of a file, e.g. the last lines of a log.
+    Reads are capped in size; check `truncated` and read further ranges
+    if needed. Reading a file again returns only what changed since the
+    earlier read, or a note if nothing did.
+
     Args:
         path: The path to the file.
+        objective: What you are looking for in the file.
+        unit: Whether the range is in lines (default) or bytes.
+        start: The first line to read (1-based), or the first byte offset.
+            Negative values count from the end, e.g. -20 for the last 20 lines.
+            Leave empty to read from the start.
+        end: The last line to read (inclusive), or the byte offset to stop at.
+            Negative values count from the end.
+            Leave empty to read to the end.
 
     Output:
-        contents: The contents of the file.
+        contents: The contents of the file (or of the range).
+        document: A handle to retrieve more of a large file, if it was truncated.
+        encoding: The detected text encoding.
+        size_bytes: The total size of the file.
+        line_count: The total number of lines in the file, if known (it is
+            not for UTF-16/32 files over the size cap).
+        truncated: Whether the contents were cut off by the size cap.
         error: An error message if the file could not be read.
     """
 
     confirm = False
+    read_only = True
+    model_tier = "fast"
+
+    # Maximum number of bytes decoded per read.
+    SIZE_CAP = 1024 * 1024
 
     class Args(BaseModel):
         path: str
+        objective: Optional[str]
+        unit: Optional[Literal["lines", "bytes"]]
+        start: Optional[int]
+        end: Optional[int]
 
     class Output(BaseModel):
         contents: Optional[str]
+        document: Optional[str]
+        encoding: Optional[str]
+        size_bytes: Optional[int]
+        line_count: Optional[int]
+        truncated: bool
         error: Optional[str]
 
+    @classmethod
+    def error(cls, message: str, size_bytes: Optional[int] = None) -> Output:
+        logger.error(message)
+        return cls.Output(
+            contents=None,
+            document=None,
+            encoding=None,
+            size_bytes=size_bytes,
+            line_count=None,
+            truncated=False,
+            error=message,
+        )
+
+    @classmethod
+    def unchanged(cls, cached: CachedRead, size_bytes: int) -> Output:
+        contents = f"[unchanged since step {cached.step}; see the output there]"
+        if cached.document is not None:
+            contents += f" Search document {cached.document!r} for other sections."
+        return cls.Output(
+            contents=contents,
+            document=cached.document,
+            encoding=None,
+            size_bytes=size_bytes,
+            line_count=None,
+            truncated=False,
+            error=None,
+        )
+
     @classmethod
     def perform(cls, args: Args) -> Output:
         """Execute the action."""
 
         path = Path(args.path)
         if not path.exists():
-            logger.error(f"Path doesn't exist: {path!r}")
-            return cls.Output(error=f"Path doesn't exist: {path!r}", contents=None)
+            return cls.error(f"Path doesn't exist: {path!r}")
         if not path.is_file():
-            logger.error(f"Path is not a file: {path!r}")
-            return cls.Output(error=f"Path is not a file: {path!r}", contents=None)
+            return cls.error(f"Path is not a file: {path!r}")
+
+        stat = path.stat()
+        key = cls._key(path, args)
+        session = current_session()
+        cached = session.file_cache.lookup(
+            key,
+            stat,
+            valid=lambda cached: cached.document is None
+            or session.documents.get(cached.document) is not None,
+        )
+        if cached is not None:
+            return cls.unchanged(cached, stat.st_size)
+
+        try:
+            decoded = session.prefetcher.take(
+                ("READ_FILE", key),
+                partial(cls._decode, path, args),
+                valid=lambda decoded: isinstance(decoded, int) or decoded.matches(stat),
+            )
+        except ValueError as e:
+            return cls.error(f"{e}: {path!r}", size_bytes=stat.st_size)
+        if isinstance(decoded, int):
+            return cls.error(
+                f"Not a text file: {path!r} ({decoded} bytes)", size_bytes=decoded
+            )
+        text = decoded.text
+
+        contents, document = session.documents.retrieve(str(path), text, args.objective)
+        previous = session.file_cache.update(key, stat, text, document)
+        if previous is not None:
+            diff = unified_diff(str(path), previous, text)
+            if len(diff) < len(contents):
+                contents = f"[changed since step {previous.step}]\n{diff}"
+        return cls.Output(
+            contents=contents,
+            document=document,
+            encoding=decoded.encoding,
+            size_bytes=decoded.size,
+            line_count=decoded.line_count,
+            truncated=decoded.truncated,
+            error=None,
+        )
+
+    @classmethod
+    def speculate(cls, target: str) -> Optional[Speculation]:
+        """Read a file named in the plan whole, as it is usually read."""
+        path = Path(target).expanduser()
+        try:
+            if not path.is_file() or path.stat().st_size > cls.SIZE_CAP:
+                return None
+        except OSError:
+            return None
+        args = cls.Args(path=str(path), objective=None, unit=None, start=None, end=None)
+        return ("READ_FILE", cls._key(path, args)), partial(cls._decode, path, args)
+
+    @staticmethod
+    def _key(path: Path, args: Args) -> tuple[Path, str, Optional[int], Optional[int]]:
+        return path.resolve(), args.unit or "lines", args.start, args.end
+
+    @classmethod
+    def _decode(cls, path: Path, args: Args) -> Union[Decoded, int]:
+        """Decode the requested range, or return the size of a binary file."""
+        stat = path.stat()
+        with MappedFile(path) as f:
+            encoding = sniff_encoding(f.head())
+            if encoding is None:
+                return f.size
+            if encoding in WIDE_ENCODINGS:
+                text, encoding, truncated, line_count = cls._read_wide(f, args)
+            else:
+                begin, stop = cls._byte_range(f, args)
+                truncated = stop - begin > cls.SIZE_CAP
+                if truncated:
+                    capped = begin + cls.SIZE_CAP
+                    boundary = f.line_boundary(capped)
+                    stop = boundary if boundary > begin else capped
+                text = f.read(begin, stop).decode(encoding, errors="replace")
+                line_count = f.line_count()
+            return Decoded(
+                mtime_ns=stat.st_mtime_ns,
+                size=f.size,
+                text=text,
+                encoding=encoding,
+                truncated=truncated,
+                line_count=line_count,
+            )
+
+    @staticmethod
+    def _byte_range(f: MappedFile, args: Args) -> tuple[int, int]:
+        """Translate the requested range to byte offsets."""
+        if args.unit == "bytes":
+            byte_slice = slice(args.start, args.end).indices(f.size)
+            return byte_slice[0], max(byte_slice[0], byte_slice[1])
+
+        begin = 0
+        if args.start is not None and args.start > 0:
+            begin = f.line_offset(args.start - 1)
+        elif args.start is not None and args.start < 0:
+            begin = f.tail_offset(-args.start)
+        stop = f.size
+        if args.end is not None and args.end > 0:
+            stop = f.line_offset(args.end)
+        elif args.end is not None and args.end < 0:
+            # Inclusive like a positive end: -1 is the last line.
+            stop = f.tail_offset(-args.end - 1)
+        return begin, max(begin, stop)
+
+    @classmethod
+    def _read_wide(
+        cls, f: MappedFile, args: Args
+    ) -> tuple[str, str, bool, Optional[int]]:
+        """Read a UTF-16/32 file, whose lines can only be found after decoding.
+
+        Byte ranges are aligned to code units. The line count is only known
+        if the whole file is within the size cap. Over it, line ranges are
+        read from the first or the last `SIZE_CAP` bytes.
+
+        Raises:
+            ValueError: If a line range of a file over the size cap lies
+                outside of these.
+
+        Returns:
+            The text, the encoding, whether it was truncated and the line count.
+        """
+        head = f.head(4)
+        encoding, bom, unit = next(
+            (encoding, len(bom), unit)
+            for bom, encoding, unit in WIDE_BOMS
+            if head.startswith(bom)
+        )
+        line_count = None
+        if f.size <= cls.SIZE_CAP:
+            whole = f.read(bom, f.size).decode(encoding, errors="replace")
+            line_count = len(LINE_RE.findall(whole))
+
+        if args.unit == "bytes":
+            begin, stop, _ = slice(args.start, args.end).indices(f.size)
+            begin = max(begin, bom)
+            stop = max(begin, stop)
+            begin -= (begin - bom) % unit
+            stop -= (stop - bom) % unit
+            truncated = stop - begin > cls.SIZE_CAP
+            if truncated:
+                stop = begin + cls.SIZE_CAP - cls.SIZE_CAP % unit
+            text = f.read(begin, stop).decode(encoding, errors="replace")
+            return text, encoding, truncated, line_count
+
+        start = args.start - 1 if args.start is not None and args.start > 0 else None
+        if args.start is not None and args.start < 0:
+            start = args.start
+        end = args.end if args.end is not None and args.end > 0 else None
+        if args.end is not None and args.end < -1:
+            end = args.end + 1
+        from_end = args.start is not None and args.start < 0
+        if line_count is not None:
+            lines = LINE_RE.findall(whole)
+            return "".join(lines[start:end]), encoding, False, line_count
+
+        # Only the first or the last `SIZE_CAP` bytes can be decoded, so a
+        # range must lie within one of them.
+        if args.end and (args.end < 0) != from_end:
+            raise ValueError(
+                "Line ranges counting from both ends are not supported for "
+                "UTF-16/32 files over the size cap; count both from the start "
+                "or both from the end, or use a byte range"
+            )
+        if from_end:
+            begin = max(bom, f.size - cls.SIZE_CAP)
+            begin += -(begin - bom) % unit
+            text = f.read(begin, f.size).decode(encoding, errors="replace")
+            lines = LINE_RE.findall(text)
+            # The first line of the window may have started before it.
+            complete = lines[1:] if begin > bom else lines
+            assert args.start is not None
+            truncated = -args.start > len(complete)
+            return "".join(complete[start:end]), encoding, truncated, None
 
-        text = path.read_text()
-        return cls.Output(contents=text, error=None)
+        stop = bom + cls.SIZE_CAP - cls.SIZE_CAP % unit
+        lines = LINE_RE.findall(f.read(bom, stop).decode(encoding, errors="replace"))
+        # The last line of the window may go on after it.
+        if start is not None and start >= len(lines) - 1:
+            raise ValueError(
+                f"Line {args.start} is beyond the first {cls.SIZE_CAP} bytes of a "
+                "UTF-16/32 file over the size cap; count from the end or use a "
+                "byte range"
+            )
+        truncated = end is None or end >= len(lines)
+        return "".join(lines[start:end]), encoding, truncated, None
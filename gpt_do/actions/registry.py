@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import logging
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING, Callable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from .action import GenericAction
+
+logger = logging.getLogger(__name__)
+
+# Entry point group of out-of-tree actions.
+ENTRY_POINT_GROUP = "gpt_do.actions"
+
+ActionT = TypeVar("ActionT", bound="GenericAction")
+
+
+class ActionRegistry:
+    """The actions the model can select, by name, in registration order.
+
+    Actions register themselves with the `register` decorator when their
+    module is imported. Out-of-tree actions are loaded from the
+    `gpt_do.actions` entry point group: an entry point either names an action
+    class, registered under the entry point name, or a module whose actions
+    register themselves with `gpt_do.actions.registry.register`.
+    """
+
+    def __init__(self) -> None:
+        self._actions: dict[str, GenericAction] = {}
+        self._names: dict[GenericAction, str] = {}
+
+    def register(self, name: str) -> Callable[[ActionT], ActionT]:
+        """Return a class decorator registering an action under a name."""
+
+        def decorator(action: ActionT) -> ActionT:
+            self.add(name, action)
+            return action
+
+        return decorator
+
+    def add(self, name: str, action: GenericAction) -> None:
+        existing = self._actions.get(name)
+        if existing is not None and existing is not action:
+            raise ValueError(
+                f"Action {name} is already registered to {existing.__name__}"
+            )
+        self._actions[name] = action
+        self._names[action] = name
+
+    def get(self, name: str) -> GenericAction:
+        """Return the action registered under a name."""
+        try:
+            return self._actions[name]
+        except KeyError:
+            raise NotImplementedError(f"Action not implemented: {name}") from None
+
+    def name_of(self, action: GenericAction) -> str:
+        """Return the name an action is registered under."""
+        try:
+            return self._names[action]
+        except KeyError:
+            raise NotImplementedError(f"Action not registered: {action}") from None
+
+    def items(self) -> Iterator[tuple[str, GenericAction]]:
+        return iter(self._actions.items())
+
+    def load_plugins(self, group: str = ENTRY_POINT_GROUP) -> None:
+        """Register the actions of the installed plugins.
+
+        A plugin that fails to load is logged and skipped.
+        """
+        for entry_point in entry_points(group=group):
+            try:
+                loaded = entry_point.load()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception(f"Failed to load action plugin {entry_point.name}")
+                continue
+            if isinstance(loaded, type):
+                self.add(entry_point.name, loaded)
+            logger.debug(f"Loaded action plugin {entry_point.name}")
+
+
+REGISTRY = ActionRegistry()
+register = REGISTRY.register
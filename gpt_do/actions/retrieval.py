@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+
+logger = logging.getLogger(__name__)
+
+# Documents up to this size are returned whole.
+MAX_WHOLE_CHARS = 12_000
+# Maximum size of a chunk; longer lines are split.
+CHUNK_CHARS = 1_500
+TOP_K = 5
+# Documents kept per store, and their total size, before the least recently
+# used ones are dropped.
+MAX_DOCUMENTS = 32
+MAX_STORE_CHARS = 16 * 1024 * 1024
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def split_line(line: str, max_chars: int) -> list[str]:
+    """Split a line longer than `max_chars`, preferably at whitespace."""
+    pieces = []
+    while len(line) > max_chars:
+        cut = line.rfind(" ", max_chars // 2, max_chars)
+        cut = cut + 1 if cut != -1 else max_chars
+        pieces.append(line[:cut])
+        line = line[cut:]
+    pieces.append(line)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> list[str]:
+    """Split text into chunks of whole lines, starting new ones at headings.
+
+    Lines longer than a chunk, e.g. of minified JSON or HTML, are split.
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    lines = (
+        piece for line in text.splitlines() for piece in split_line(line, max_chars)
+    )
+    for line in lines:
+        heading = line.startswith("#")
+        if current and (size + len(line) > max_chars or (heading and size > 0)):
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class Bm25Index:
+    """BM25 index over the chunks of a document.
+
+    Postings are kept as NumPy arrays per term so a query is scored with a
+    few vectorized operations per query term. NumPy is imported with the
+    first index, as small documents are returned whole without one.
+    """
+
+    def __init__(self, chunks: list[str]) -> None:
+        import numpy as np
+
+        self.chunks = chunks
+        postings: dict[str, dict[int, int]] = {}
+        lengths = np.zeros(len(chunks), dtype=np.float64)
+        for i, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            lengths[i] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[i] = counts.get(i, 0) + 1
+        self.postings: dict[str, tuple[npt.NDArray[np.intp], npt.NDArray[np.float64]]]
+        self.postings = {
+            term: (
+                np.fromiter(counts.keys(), dtype=np.intp, count=len(counts)),
+                np.fromiter(counts.values(), dtype=np.float64, count=len(counts)),
+            )
+            for term, counts in postings.items()
+        }
+        average = lengths.mean() if len(chunks) else 0.0
+        # Per-chunk length normalization of the BM25 term-frequency saturation.
+        self.norms = K1 * (1 - B + B * lengths / (average or 1.0))
+
+    def scores(self, query: str) -> npt.NDArray[np.float64]:
+        import numpy as np
+
+        n = len(self.chunks)
+        scores = np.zeros(n, dtype=np.float64)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            indices, counts = self.postings[term]
+            idf = math.log(1 + (n - len(indices) + 0.5) / (len(indices) + 0.5))
+            scores[indices] += idf * counts * (K1 + 1) / (counts + self.norms[indices])
+        return scores
+
+
+@dataclass
+class Document:
+    handle: str
+    source: str
+    index: Bm25Index
+    returned: set[int] = field(default_factory=set)
+
+    @property
+    def size(self) -> int:
+        return sum(len(chunk) for chunk in self.index.chunks)
+
+    def select(self, query: Optional[str], top_k: int = TOP_K) -> list[int]:
+        """Return the ids of the next chunks to show, never repeating one.
+
+        With a query the best matching chunks are returned, in document order.
+        Without one, or if nothing matches, the next chunks in document order
+        are returned.
+        """
+        import numpy as np
+
+        remaining = np.array(
+            [i for i in range(len(self.index.chunks)) if i not in self.returned],
+            dtype=np.intp,
+        )
+        if query and len(remaining):
+            scores = self.index.scores(query)[remaining]
+            if len(remaining) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+            else:
+                best = np.arange(len(remaining))
+            best = best[scores[best] > 0]
+            ids = sorted(int(i) for i in remaining[best])
+        else:
+            ids = []
+        if not ids:
+            ids = [int(i) for i in remaining[:top_k]]
+        self.returned.update(ids)
+        return ids
+
+    def render(self, ids: list[int]) -> str:
+        total = len(self.index.chunks)
+        parts = [f"[chunk {i + 1}/{total}]\n{self.index.chunks[i]}" for i in ids]
+        if not parts:
+            parts = ["[no matching chunks left]"]
+        left = total - len(self.returned)
+        parts.append(
+            f"[{left} more chunks available from document {self.handle!r}]"
+            if left
+            else "[all chunks returned]"
+        )
+        return "\n\n".join(parts)
+
+
+class DocumentStore:
+    """Registry of the large documents indexed in a session.
+
+    Holds up to `max_documents` documents and `max_chars` characters of
+    chunks, dropping the least recently used documents beyond that.
+    """
+
+    def __init__(
+        self, max_documents: int = MAX_DOCUMENTS, max_chars: int = MAX_STORE_CHARS
+    ) -> None:
+        self.max_documents = max_documents
+        self.max_chars = max_chars
+        self.documents: OrderedDict[str, Document] = OrderedDict()
+        self._added = 0
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def add(self, source: str, text: str) -> Document:
+        chunks = chunk_text(text)
+        index = Bm25Index(chunks)
+        with self._lock:
+            self._added += 1
+            handle = f"doc-{self._added}"
+            document = Document(handle, source, index)
+            self.documents[handle] = document
+            self._chars += document.size
+            self._evict()
+        logger.debug(f"Indexed {source} as {handle} ({len(chunks)} chunks)")
+        return document
+
+    def retrieve(
+        self, source: str, text: str, objective: Optional[str]
+    ) -> tuple[str, Optional[str]]:
+        """Return the text to show for a loaded document and its handle, if any.
+
+        Small documents are returned whole. Large ones are indexed and only the
+        chunks most relevant to the objective are returned, with a handle for
+        retrieving more.
+        """
+        if len(text) <= MAX_WHOLE_CHARS:
+            return text, None
+        document = self.add(source, text)
+        return document.render(document.select(objective)), document.handle
+
+    def get(self, handle: str) -> Optional[Document]:
+        with self._lock:
+            document = self.documents.get(handle)
+            if document is not None:
+                self.documents.move_to_end(handle)
+            return document
+
+    def _evict(self) -> None:
+        # The newest document is kept even if it is larger than the store.
+        while len(self.documents) > 1 and (
+            len(self.documents) > self.max_documents or self._chars > self.max_chars
+        ):
+            handle, document = self.documents.popitem(last=False)
+            self._chars -= document.size
+            logger.debug(f"Dropped document {handle} ({document.source})")
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Mapping, Optional
+
+from .. import FAST_MODEL, MODEL
+
+if TYPE_CHECKING:
+    from openai.types import CompletionUsage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    escalations: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Time until the completions were usable, including retries.
+    latency_s: float = 0.0
+
+    def __str__(self) -> str:
+        mean_s = self.latency_s / self.calls if self.calls else 0.0
+        return (
+            f"{self.calls} calls ({mean_s:.2f}s mean), "
+            f"{self.prompt_tokens} prompt + {self.completion_tokens} completion tokens"
+            + (f", {self.escalations} escalated" if self.escalations else "")
+        )
+
+
+class ModelRouter:
+    """Pick the model of each completion by what it is for.
+
+    A route is the registered name of an action (for filling in its
+    arguments), `STEP` (selecting actions and their arguments in fused
+    mode), `CHOOSE` (selecting an action in two-phase mode) or `SUMMARY`
+    (summarizing compacted history). It maps to a tier, `fast` or `strong`,
+    or directly to a model. Unrouted completions use the tier of their
+    action, `Action.model_tier`.
+
+    With escalation, a completion of the fast model that is refused or does
+    not validate is requested again from the strong model. So is a step of
+    the fast model selecting an action whose arguments need the strong
+    model in fused mode; in two-phase mode, such arguments are routed to the
+    strong model anyway.
+    """
+
+    def __init__(self) -> None:
+        self.models = {"fast": FAST_MODEL, "strong": MODEL}
+        self.routes: dict[str, str] = {}
+        self.escalate = True
+        self.stats: dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def configure(
+        self,
+        fast_model: Optional[str] = None,
+        strong_model: Optional[str] = None,
+        routes: Optional[Mapping[str, str]] = None,
+        escalate: Optional[bool] = None,
+    ) -> None:
+        if fast_model is not None:
+            self.models["fast"] = fast_model
+        if strong_model is not None:
+            self.models["strong"] = strong_model
+        if routes is not None:
+            self.routes = dict(routes)
+        if escalate is not None:
+            self.escalate = escalate
+
+    def models_for(self, route: str, tier: str = "strong") -> list[str]:
+        """Return the models to try for a route, in order."""
+        target = self.routes.get(route, tier)
+        model = self.models.get(target, target)
+        strong = self.models["strong"]
+        if self.escalate and target == "fast" and model != strong:
+            return [model, strong]
+        return [model]
+
+    def needs_strong(self, route: str, tier: str = "strong") -> bool:
+        """Return whether the completions of a route go to the strong model."""
+        return self.models_for(route, tier)[0] == self.models["strong"]
+
+    def record_call(self, model: str, latency_s: float, escalated: bool) -> None:
+        """Record a completion of a model that was used."""
+        with self._lock:
+            stats = self.stats.setdefault(model, ModelStats())
+            stats.calls += 1
+            stats.latency_s += latency_s
+            stats.escalations += escalated
+
+    def record_usage(self, model: str, usage: CompletionUsage) -> None:
+        """Record the tokens of a completion of a model."""
+        with self._lock:
+            stats = self.stats.setdefault(model, ModelStats())
+            stats.prompt_tokens += usage.prompt_tokens
+            stats.completion_tokens += usage.completion_tokens
+
+
+def parse_routes(routes: tuple[str, ...]) -> dict[str, str]:
+    """Parse `ROUTE=TIER` or `ROUTE=MODEL` options."""
+    parsed = {}
+    for route in routes:
+        name, sep, target = route.partition("=")
+        if not sep or not name or not target:
+            raise ValueError(f"Expected ROUTE=TIER or ROUTE=MODEL, got {route!r}")
+        parsed[name.strip().upper()] = target.strip()
+    return parsed
+
+
+MODEL_ROUTER = ModelRouter()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from openai.types.shared_params import ResponseFormatJSONSchema
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+@dataclass(frozen=True)
+class ResponseSchema(Generic[ModelT]):
+    """The structured output format of a model, computed once per model.
+
+    Passing the format as a dict instead of the model class keeps the client
+    from generating the strict JSON schema again on every request, which
+    takes milliseconds for the larger unions. Responses are validated with
+    the model directly.
+    """
+
+    model: type[ModelT]
+    response_format: ResponseFormatJSONSchema
+    # Hash of the schema, which identifies the format in cache keys.
+    digest: str
+
+    def parse(self, content: str) -> ModelT:
+        return self.model.model_validate_json(content)
+
+
+_SCHEMAS: dict[type[BaseModel], ResponseSchema[Any]] = {}
+
+
+def response_schema(model: type[ModelT]) -> ResponseSchema[ModelT]:
+    """Return the memoized structured output format of a model."""
+    schema = _SCHEMAS.get(model)
+    if schema is None:
+        schema = _SCHEMAS[model] = _response_schema(model)
+    return schema
+
+
+def _response_schema(model: type[ModelT]) -> ResponseSchema[ModelT]:
+    # The same conversion the client applies to models passed to `parse`.
+    from openai.lib._pydantic import to_strict_json_schema
+
+    schema = to_strict_json_schema(model)
+    encoded = json.dumps(schema, sort_keys=True).encode()
+    response_format: ResponseFormatJSONSchema = {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": schema, "strict": True},
+    }
+    return ResponseSchema(
+        model=model,
+        response_format=response_format,
+        digest=hashlib.sha256(encoded).hexdigest(),
+    )
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from pydantic import BaseModel
+
+from .action import Action
+from .registry import register
+from .session_state import current_session
+
+logger = logging.getLogger(__name__)
+
+
+@register("SEARCH_DOCUMENT")
+class SearchDocument(Action["SearchDocument.Args", "SearchDocument.Output"]):
+    """Retrieve more sections of a large web page or file loaded earlier.
+
+    Large documents are split into numbered chunks and only the most relevant
+    ones are returned when loaded. Chunks that were already returned are
+    never returned again.
+
+    Args:
+        document: The document handle returned when the page or file was loaded.
+        query: What to look for in the document.
+            Leave empty to get the next chunks in order.
+
+    Output:
+        text: The matching chunks of the document.
+        error: An error message if the document is unknown or was dropped
+            (load the page or file again then).
+    """
+
+    confirm = False
+    read_only = True
+    model_tier = "fast"
+
+    class Args(BaseModel):
+        document: str
+        query: Optional[str]
+
+    class Output(BaseModel):
+        text: Optional[str]
+        error: Optional[str]
+
+    @classmethod
+    def perform(cls, args: Args) -> Output:
+        """Execute the action."""
+        document = current_session().documents.get(args.document)
+        if document is None:
+            return cls.Output(
+                text=None, error=f"Unknown or expired document: {args.document!r}"
+            )
+        text = document.render(document.select(args.query))
+        return cls.Output(text=text, error=None)
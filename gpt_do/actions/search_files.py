@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Literal, Optional
+
+from pydantic import BaseModel
+
+from .action import Action
+from .file_index import FILE_INDEX
+from .registry import register
+from .session_state import current_session
+
+logger = logging.getLogger(__name__)
+
+
+@register("SEARCH_FILES")
+class SearchFiles(Action["SearchFiles.Args", "SearchFiles.Output"]):
+    """Find files by name or contents under a directory.
+
+    Searches a persistent index of the files, updated from their modification
+    times, so it is fast even on large trees. Ignored directories (as in
+    `.gitignore`) and hidden files are not searched.
+
+    Args:
+        path: The directory to search in.
+        query: The text to look for (case-insensitive, not a regex).
+        kind: Whether to match file names, contents or both (default).
+
+    Output:
+        files: The files whose path (relative to the directory) contains the query.
+        matches: The matching lines as "path:line: text", a few per file.
+        error: An error message.
+    """
+
+    confirm = False
+    read_only = True
+    model_tier = "fast"
+
+    MAX_FILES = 50
+    MAX_LINES_PER_FILE = 5
+
+    class Args(BaseModel):
+        path: str
+        query: str
+        kind: Optional[Literal["names", "contents", "both"]]
+
+    class Output(BaseModel):
+        files: list[str]
+        matches: list[str]
+        error: Optional[str]
+
+    @classmethod
+    def perform(cls, args: Args) -> Output:
+        """Execute the action."""
+
+        path = Path(args.path)
+        if not path.is_dir():
+            return cls.Output(
+                files=[], matches=[], error=f"Path is not a directory: {path}"
+            )
+        if not args.query:
+            return cls.Output(files=[], matches=[], error="Empty query")
+
+        root = os.path.abspath(path)
+        # Refreshed once per step: the actions of a step run concurrently, so
+        # its searches can't rely on the changes of the others anyway.
+        stats = FILE_INDEX.refresh(root, since=current_session().step_started)
+        logger.debug(f"File index: {stats}")
+        kind = args.kind or "both"
+        files, lines = FILE_INDEX.search(
+            root,
+            args.query,
+            names=kind != "contents",
+            contents=kind != "names",
+            max_files=cls.MAX_FILES,
+            max_lines=cls.MAX_LINES_PER_FILE,
+        )
+        return cls.Output(
+            files=files,
+            matches=[f"{match.path}:{match.line}: {match.text}" for match in lines],
+            error=None,
+        )
@@ -6,23 +6,18 @@ from typing import Optional
 import requests
 from pydantic import BaseModel
 
+from . import web
 from .action import Action
+from .registry import register
 
 logger = logging.getLogger(__name__)
 
-TIMEOUT_S = 10
-
 HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/85.0.4183.102 Safari/537.36"
-    ),
     "Accept": "application/json",
-    "Accept-Language": "en-US,en;q=0.5",
 }
 
 
+@register("SEARCH_WIKIPEDIA")
 class SearchWikipedia(Action["SearchWikipedia.Args", "SearchWikipedia.Output"]):
     """Search Wikipedia and retrieve the introductory extract of an article.
 
@@ -35,6 +30,8 @@ class SearchWikipedia(Action["SearchWikipedia.Args", "SearchWikipedia.Output"]):
     """
 
     confirm = True
+    read_only = True
+    model_tier = "fast"
 
     class Args(BaseModel):
         query: str
@@ -58,10 +55,9 @@ class SearchWikipedia(Action["SearchWikipedia.Args", "SearchWikipedia.Output"]):
         }
 
         try:
-            response = requests.get(
+            response = web.get(
                 url,
                 params=params,
-                timeout=TIMEOUT_S,
                 headers=HEADERS,
             )
             response.raise_for_status()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, Optional, Protocol
+
+from rich import print as rprint
+
+from .dispatch import EarlyDispatch
+from .file_cache import FileCache
+from .prefetch import Prefetcher
+from .retrieval import DocumentStore
+from .walk import WalkStore
+
+if TYPE_CHECKING:
+    from openai.types import CompletionUsage
+    from openai.types.chat import ChatCompletionMessageParam
+
+
+class Prompter(Protocol):
+    """Answers the prompts of a session on behalf of the user."""
+
+    def confirm(self, action: str) -> bool:
+        """Whether to perform an action that needs confirmation."""
+
+    def ask(self, question: str) -> str:
+        """Return the answer to a question from the agent."""
+
+    def pause(self, message: str) -> None:
+        """Wait for the user to be done, e.g. with an opened file."""
+
+
+class ConsolePrompter:
+    """Prompts the user on the console."""
+
+    def confirm(self, action: str) -> bool:
+        # TODO: allow sending a message back instead of killing it
+        user_response = input(f"\nProceed with {action}? [y/N] ")
+        print()
+        return user_response.lower() == "y"
+
+    def ask(self, question: str) -> str:
+        rprint(f"Question: {question}\n")
+        answer = input("Answer: ")
+        print()
+        return answer
+
+    def pause(self, message: str) -> None:
+        input(message)
+        print()
+
+
+@dataclass
+class TokenUsage:
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    # Seconds spent waiting for the rate limiter.
+    throttled_s: float = 0.0
+    # Completions per model.
+    models: dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, usage: CompletionUsage, model: Optional[str] = None) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            if model is not None:
+                self.models[model] = self.models.get(model, 0) + 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+            if usage.prompt_tokens_details is not None:
+                self.cached_tokens += usage.prompt_tokens_details.cached_tokens or 0
+
+    def record_throttled(self, seconds: float) -> None:
+        with self._lock:
+            self.throttled_s += seconds
+
+
+@dataclass
+class SessionState:
+    """The state of one session, shared by everything done on its behalf.
+
+    The current state is held in a context variable, so sessions running
+    concurrently on one event loop each see their own. Threads started for
+    a session must run in a copy of its context.
+    """
+
+    prompter: Prompter = field(default_factory=ConsolePrompter)
+    file_cache: FileCache = field(default_factory=FileCache)
+    # Large documents and unfinished directory walks, by handle.
+    documents: DocumentStore = field(default_factory=DocumentStore)
+    walks: WalkStore = field(default_factory=WalkStore)
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    history: list[ChatCompletionMessageParam] = field(default_factory=list)
+    # The latest plan of the agent, which the prefetcher acts on.
+    plan: list[str] = field(default_factory=list)
+    prefetcher: Prefetcher = field(default_factory=Prefetcher)
+    # When the current step started, by `time.monotonic`.
+    step_started: Optional[float] = None
+    # Actions of the streaming step already started.
+    dispatch: EarlyDispatch = field(default_factory=EarlyDispatch)
+
+    @property
+    def steps(self) -> int:
+        return self.file_cache.step
+
+
+_CURRENT: contextvars.ContextVar[SessionState] = contextvars.ContextVar(
+    "session_state", default=SessionState()
+)
+
+
+def current_session() -> SessionState:
+    """Return the state of the session running in the current context."""
+    return _CURRENT.get()
+
+
+@contextlib.contextmanager
+def session_scope(state: SessionState) -> Iterator[SessionState]:
+    """Make `state` the current session state within the block."""
+    token = _CURRENT.set(state)
+    try:
+        yield state
+    finally:
+        _CURRENT.reset(token)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import logging
+import selectors
+import subprocess as sp
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from .process import Echo, RunResult, capture_buffers, kill_group, pump
+
+logger = logging.getLogger(__name__)
+
+SHELL = ("bash", "--noprofile", "--norc")
+
+
+def ansi_c_quote(text: str) -> str:
+    """Quote text as a Bash `$'...'` string, which may span several lines."""
+    return "$'" + text.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class Framer:
+    """Split the output of one command from a shared shell stream.
+
+    Each command is followed by a line holding a marker and its return code.
+    Bytes that could be the start of the marker are held back until it is
+    known whether they are.
+    """
+
+    def __init__(self, marker: bytes) -> None:
+        self.marker = marker
+        self.pending = bytearray()
+        self.done = False
+        self.return_code: Optional[int] = None
+
+    def feed(self, data: bytes) -> bytes:
+        """Add data read from the stream and return the command output in it."""
+        self.pending += data
+        index = self.pending.find(self.marker)
+        if index == -1:
+            keep = len(self.marker) - 1
+            output = bytes(self.pending[:-keep])
+            del self.pending[:-keep]
+            return output
+        end = self.pending.find(b"\n", index + len(self.marker))
+        if end == -1:
+            # Wait for the rest of the marker line.
+            output = bytes(self.pending[:index])
+            del self.pending[:index]
+            return output
+        output = bytes(self.pending[:index])
+        status = self.pending[index + len(self.marker) : end].strip()
+        self.return_code = int(status) if status.lstrip(b"-").isdigit() else None
+        self.done = True
+        return output
+
+
+class ShellSession:
+    """A long-lived Bash process that runs commands one after the other.
+
+    The working directory, variables and activated virtualenvs carry over
+    between commands and no shell is started per command. Output is framed
+    by a random marker printed after each command. The shell is restarted
+    if it exits, and killed (losing its state) if a command times out.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._process: Optional[sp.Popen[bytes]] = None
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None) -> None:
+        if enabled is not None:
+            self.enabled = enabled
+
+    def _start(self) -> sp.Popen[bytes]:
+        process = sp.Popen(  # pylint: disable=consider-using-with
+            SHELL,
+            stdin=sp.PIPE,
+            stdout=sp.PIPE,
+            stderr=sp.PIPE,
+            start_new_session=True,
+        )
+        logger.debug(f"Started shell session (pid {process.pid})")
+        return process
+
+    def _stop(self) -> None:
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            kill_group(self._process)
+        for pipe in (self._process.stdin, self._process.stdout, self._process.stderr):
+            if pipe is not None:
+                pipe.close()
+        self._process.wait()
+        self._process = None
+
+    def close(self) -> None:
+        """Stop the shell; the next command starts a new one."""
+        with self._lock:
+            self._stop()
+
+    def run(
+        self,
+        command: str,
+        timeout_s: Optional[float],
+        capture_bytes: int,
+        spill_prefix: Optional[Path] = None,
+        echo: bool = True,
+    ) -> RunResult:
+        """Run a command in the shell (see `process.run_streaming`)."""
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                if self._process is not None:
+                    logger.warning("Shell session exited, restarting it")
+                    self._stop()
+                self._process = self._start()
+            process = self._process
+            assert process.stdin and process.stdout and process.stderr
+
+            started = time.monotonic()
+            deadline = None if timeout_s is None else started + timeout_s
+            buffers = capture_buffers(capture_bytes, spill_prefix)
+            echo_output = Echo(echo)
+            token = f"__gpt_do_{uuid.uuid4().hex}__"
+            framers = {
+                name: Framer(f"\n{token} ".encode()) for name in ("stdout", "stderr")
+            }
+
+            def on_data(name: str, data: bytes) -> bool:
+                output = framers[name].feed(data)
+                buffers[name].write(output)
+                echo_output(name, output)
+                return not framers[name].done
+
+            # The command is read by `eval` so that a syntax error can't break
+            # the framing, and its stdin is closed so it can't eat the next one.
+            script = (
+                f"eval {ansi_c_quote(command)} < /dev/null\n"
+                "__gpt_do_status=$?\n"
+                f"printf '\\n%s %d\\n' {token} $__gpt_do_status >&2\n"
+                f"printf '\\n%s %d\\n' {token} $__gpt_do_status\n"
+            )
+            try:
+                process.stdin.write(script.encode())
+                process.stdin.flush()
+            except BrokenPipeError:
+                pass
+            with selectors.DefaultSelector() as selector:
+                selector.register(process.stdout, selectors.EVENT_READ, "stdout")
+                selector.register(process.stderr, selectors.EVENT_READ, "stderr")
+                # Only stops early if the command ends the shell.
+                timed_out = pump(
+                    selector,
+                    deadline,
+                    on_data,
+                    exited=lambda: process.poll() is not None,
+                )
+
+            return_code = framers["stdout"].return_code
+            if timed_out:
+                logger.warning(
+                    f"Command timed out after {timeout_s}s, killing the shell session"
+                )
+                self._stop()
+            elif not framers["stdout"].done:
+                # The command ended the shell, e.g. with `exit`.
+                return_code = process.wait()
+                logger.warning(f"Shell session exited with {return_code}")
+                self._stop()
+            for buffer in buffers.values():
+                buffer.close()
+            return RunResult(
+                stdout=buffers["stdout"],
+                stderr=buffers["stderr"],
+                return_code=return_code,
+                timed_out=timed_out,
+                duration_s=time.monotonic() - started,
+            )
+
+
+SHELL_SESSION = ShellSession()
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Literal, Optional, Union
+
+from pydantic import (
+    BaseModel,
+    Field,
+    SerializeAsAny,
+    TypeAdapter,
+    ValidationError,
+    create_model,
+)
+
+from .action import Action, GenericAction
+from .choose import ActionEnum
+from .routing import MODEL_ROUTER
+from .session_state import current_session
+
+logger = logging.getLogger(__name__)
+
+
+def _step_model(member: ActionEnum) -> type[BaseModel]:
+    """Build the tagged `{action, args}` model for a single action."""
+    action = member.to_action()
+    return create_model(
+        f"{action.__name__}Step",
+        action=(Literal[member.name], ...),  # type: ignore[arg-type]
+        args=(action.Args, Field(description=action.description())),
+    )
+
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
+    ActionStep = BaseModel
+else:
+    ActionStep = Union[tuple(_step_model(member) for member in ActionEnum)]
+
+_ACTION_STEP: TypeAdapter[ActionStep] = TypeAdapter(ActionStep)
+
+
+def _dispatch_key(action: str, args: BaseModel) -> tuple[str, str]:
+    """Identify a selected action by its name and arguments."""
+    return action, args.model_dump_json()
+
+
+class Step(Action["Step.Args", "Step.Output"]):
+    """Reason about the user's request, then select the next actions to perform
+    and provide their arguments.
+
+    Your reasoning is private and will only be visible to you.
+    If the user requested a message, you must display it to the user
+    using the appropriate action.
+
+    Actions will be confirmed by the user as appropriate before proceeding.
+
+    You may select several actions at once when they are independent of each
+    other, e.g. reading several files or listing several directories.
+    Read-only actions in a batch are performed concurrently.
+    Only batch actions that do not depend on each other's output,
+    and always select COMPLETE on its own.
+
+    Args:
+        reasoning: Your reasoning about the user's request.
+        current_plan: A list of steps to complete the user's request.
+        steps: The actions to perform and the arguments for each of them.
+
+    Output:
+        steps: The actions to perform and the arguments for each of them.
+    """
+
+    confirm = False
+    model_tier = "fast"
+    preview_fields = (
+        "reasoning",
+        "steps.0.args.message",
+        "steps.0.args.question",
+    )
+
+    class Args(BaseModel):
+        reasoning: str
+        current_plan: list[str]
+        # An empty step would leave the history as it was, so the model
+        # could select it again and again.
+        steps: list[ActionStep] = Field(min_length=1)
+
+    class Planned(BaseModel):
+        action: ActionEnum
+        args: SerializeAsAny[BaseModel]
+
+    class Output(BaseModel):
+        steps: list[Step.Planned]
+
+    @classmethod
+    def dispatch_partial(cls, partial_args: Any) -> None:
+        """Start the parallel-safe actions of the steps streamed so far."""
+        steps = partial_args.get("steps") if isinstance(partial_args, dict) else None
+        if not isinstance(steps, list):
+            return
+        # A step is complete once the next one has started.
+        for raw in steps[:-1]:
+            try:
+                step = _ACTION_STEP.validate_python(raw)
+            except ValidationError:
+                continue
+            action = ActionEnum[step.action].to_action()  # type: ignore[attr-defined]
+            if action.parallel_safe():
+                current_session().dispatch.start(
+                    _dispatch_key(step.action, step.args),  # type: ignore[attr-defined]
+                    partial(action.confirm_and_perform, step.args),  # type: ignore[attr-defined]
+                )
+
+    @classmethod
+    def escalation_reason(cls, args: Args) -> Optional[str]:
+        """Escalate steps selecting actions routed to the strong model."""
+        strong = []
+        for step in args.steps:
+            action = ActionEnum[step.action].to_action()  # type: ignore[attr-defined]
+            if MODEL_ROUTER.needs_strong(action.route(), action.model_tier):
+                strong.append(step.action)  # type: ignore[attr-defined]
+        if strong:
+            return f"selected actions routed to the strong model: {', '.join(strong)}"
+        return None
+
+    @classmethod
+    def perform(cls, args: Args) -> Output:
+        """Execute the action."""
+        logger.info(f"[bold]Reasoning[/]: {args.reasoning}")
+        pretty_plan = "\n".join(f"- {x}" for x in args.current_plan)
+        logger.info(f"[bold]Current plan[/]:\n{pretty_plan}")
+        current_session().plan = args.current_plan
+        return cls.Output(
+            steps=[
+                cls.Planned(
+                    action=ActionEnum[step.action],  # type: ignore[attr-defined]
+                    args=step.args,  # type: ignore[attr-defined]
+                )
+                for step in args.steps
+            ]
+        )
+
+
+def execute_steps(
+    steps: list[Step.Planned],
+    context: list[ChatCompletionMessageParam],
+    max_workers: int = 4,
+) -> list[BaseModel]:
+    """Perform a batch of planned steps and add their outputs to the context.
+
+    Parallel-safe actions are submitted to a thread pool, unless they were
+    already started while the step was streaming, the others are confirmed
+    and performed one after the other on the calling thread. Outputs are
+    added to the context in the planned order.
+    """
+    if len(steps) == 1:
+        step = steps[0]
+        return [step.action.to_action().execute(step.args, context)]
+
+    actions = [step.action.to_action() for step in steps]
+    outputs: list[Optional[BaseModel]] = [None] * len(steps)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures: dict[int, Future[BaseModel]] = {}
+        for i, (action, step) in enumerate(zip(actions, steps)):
+            if not action.parallel_safe():
+                continue
+            dispatched = _take_dispatched(step)
+            # Copy the context so the actions are traced under the current step.
+            futures[i] = dispatched or pool.submit(
+                contextvars.copy_context().run, action.confirm_and_perform, step.args
+            )
+        logger.debug(f"Performing {len(futures)}/{len(steps)} actions concurrently")
+        for i, (action, step) in enumerate(zip(actions, steps)):
+            if i not in futures:
+                outputs[i] = action.confirm_and_perform(step.args)
+        for i, future in futures.items():
+            outputs[i] = future.result()
+
+    return _add_outputs(actions, outputs, context)
+
+
+async def aexecute_steps(
+    steps: list[Step.Planned],
+    context: list[ChatCompletionMessageParam],
+    max_workers: int = 4,
+) -> list[BaseModel]:
+    """Perform a batch of planned steps on the event loop (see `execute_steps`).
+
+    At most `max_workers` parallel-safe actions are performed at a time,
+    besides those already started while the step was streaming.
+    """
+    if len(steps) == 1:
+        step = steps[0]
+        return [await step.action.to_action().aexecute(step.args, context)]
+
+    actions = [step.action.to_action() for step in steps]
+    outputs: list[Optional[BaseModel]] = [None] * len(steps)
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def perform(action: GenericAction, step: Step.Planned) -> BaseModel:
+        dispatched = _take_dispatched(step)
+        output: BaseModel
+        if dispatched is not None:
+            output = await asyncio.wrap_future(dispatched)
+            return output
+        async with semaphore:
+            output = await action.aconfirm_and_perform(step.args)
+            return output
+
+    tasks: dict[int, asyncio.Task[BaseModel]] = {
+        i: asyncio.create_task(perform(action, step))
+        for i, (action, step) in enumerate(zip(actions, steps))
+        if action.parallel_safe()
+    }
+    logger.debug(f"Performing {len(tasks)}/{len(steps)} actions concurrently")
+    for i, (action, step) in enumerate(zip(actions, steps)):
+        if i not in tasks:
+            outputs[i] = await action.aconfirm_and_perform(step.args)
+    for i, task in tasks.items():
+        outputs[i] = await task
+    return _add_outputs(actions, outputs, context)
+
+
+def _take_dispatched(step: Step.Planned) -> Optional[Future[BaseModel]]:
+    """Return the action of a step started while it was streaming, if any."""
+    return current_session().dispatch.take(_dispatch_key(step.action.name, step.args))
+
+
+def _add_outputs(
+    actions: list[GenericAction],
+    outputs: list[Optional[BaseModel]],
+    context: list[ChatCompletionMessageParam],
+) -> list[BaseModel]:
+    """Add the outputs of a batch to the context in the planned order."""
+    results: list[BaseModel] = []
+    for action, output in zip(actions, outputs):
+        assert output is not None
+        context.append(action.output_message(output, label=True))
+        results.append(output)
+    return results
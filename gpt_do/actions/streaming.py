@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+from jiter import from_json
+from pydantic import BaseModel
+from rich.console import Group, RenderableType
+from rich.live import Live
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types.chat import ChatCompletion, ChatCompletionMessageParam
+
+    from .schema import ResponseSchema
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def lookup(partial: Any, path: str) -> Optional[str]:
+    """Return the string at a dotted path of a partially parsed object.
+
+    Numeric path segments index into lists.
+    """
+    value = partial
+    for key in path.split("."):
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            return None
+    return value if isinstance(value, str) else None
+
+
+def render_preview(partial: Any, preview_fields: tuple[str, ...]) -> RenderableType:
+    """Render the previewed fields of a partially parsed object."""
+    from rich.markdown import Markdown
+
+    parts: list[RenderableType] = []
+    for path in preview_fields:
+        text = lookup(partial, path)
+        if text:
+            label = path.rsplit(".", maxsplit=1)[-1].replace("_", " ").capitalize()
+            parts.append(Markdown(f"**{label}**: {text}"))
+    return Group(*parts)
+
+
+def stream_parse(
+    client: OpenAI,
+    model: str,
+    messages: list[ChatCompletionMessageParam],
+    schema: ResponseSchema[ModelT],
+    preview_fields: tuple[str, ...] = (),
+    on_completion: Optional[Callable[[ChatCompletion], None]] = None,
+    on_partial: Optional[Callable[[Any], None]] = None,
+) -> tuple[ModelT, str]:
+    """Stream a structured completion, previewing it as the tokens arrive.
+
+    The previewed fields are rendered live (and cleared once complete), and
+    the partially parsed response is handed to `on_partial` as it grows, so
+    what it already settles can be started. The response is parsed once the
+    stream has finished, so the request holds its rate limiter slot until
+    then, and the finished completion (with its usage) is handed to
+    `on_completion`.
+
+    Returns:
+        The parsed response and its raw JSON content.
+    """
+    with Live(transient=True, refresh_per_second=12) as live:
+        with client.beta.chat.completions.stream(
+            model=model,
+            messages=messages,
+            response_format=schema.response_format,
+            stream_options={"include_usage": True},
+        ) as stream:
+            for event in stream:
+                if event.type == "content.delta":
+                    handle_delta(event.snapshot, preview_fields, live, on_partial)
+            completion = stream.get_final_completion()
+    if on_completion is not None:
+        on_completion(completion)
+    return parse_final(schema.model, completion)
+
+
+async def astream_parse(
+    client: AsyncOpenAI,
+    model: str,
+    messages: list[ChatCompletionMessageParam],
+    schema: ResponseSchema[ModelT],
+    preview_fields: tuple[str, ...] = (),
+    on_completion: Optional[Callable[[ChatCompletion], None]] = None,
+    on_partial: Optional[Callable[[Any], None]] = None,
+) -> tuple[ModelT, str]:
+    """Stream a structured completion on the event loop (see `stream_parse`)."""
+    with Live(transient=True, refresh_per_second=12) as live:
+        async with client.beta.chat.completions.stream(
+            model=model,
+            messages=messages,
+            response_format=schema.response_format,
+            stream_options={"include_usage": True},
+        ) as stream:
+            async for event in stream:
+                if event.type == "content.delta":
+                    handle_delta(event.snapshot, preview_fields, live, on_partial)
+            completion = await stream.get_final_completion()
+    if on_completion is not None:
+        on_completion(completion)
+    return parse_final(schema.model, completion)
+
+
+def handle_delta(
+    snapshot: str,
+    preview_fields: tuple[str, ...],
+    live: Live,
+    on_partial: Optional[Callable[[Any], None]],
+) -> None:
+    """Preview the snapshot of a streaming completion and hand it on."""
+    if not snapshot or not (preview_fields or on_partial):
+        return
+    partial = from_json(snapshot.encode(), partial_mode="trailing-strings")
+    if preview_fields:
+        live.update(render_preview(partial, preview_fields))
+    if on_partial is not None:
+        on_partial(partial)
+
+
+def parse_final(
+    response_format: type[ModelT], completion: ChatCompletion
+) -> tuple[ModelT, str]:
+    """Parse a finished completion."""
+    response = completion.choices[0].message
+    if response.refusal:
+        raise ValueError(f"Refusal: {response.refusal}")
+    assert response.content is not None
+    return response_format.model_validate_json(response.content), response.content
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Collection, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pruned even without a `.gitignore`: never worth walking into.
+DEFAULT_IGNORES = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    "node_modules/",
+    ".venv/",
+    "venv/",
+    "__pycache__/",
+    ".mypy_cache/",
+    ".pytest_cache/",
+    ".tox/",
+    ".nox/",
+)
+
+
+def glob_regex(pattern: str) -> str:
+    """Translate a glob with `**` support to a regex over `/`-separated paths."""
+    parts: list[str] = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1 : end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+@dataclass(frozen=True)
+class IgnorePattern:
+    """One line of a `.gitignore` file."""
+
+    regex: re.Pattern[str]
+    negated: bool
+    dir_only: bool
+    # Directory of the `.gitignore`, relative to the walk root.
+    base: str
+
+    @classmethod
+    def parse(cls, line: str, base: str = "") -> Optional[IgnorePattern]:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        if line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        # A slash other than a trailing one anchors the pattern to `base`.
+        anchored = "/" in line
+        regex = glob_regex(line.lstrip("/"))
+        if not anchored:
+            regex = f"(?:.*/)?{regex}"
+        return cls(re.compile(regex), negated, dir_only, base)
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(f"{self.base}/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1 :]
+        return re.fullmatch(self.regex, rel_path) is not None
+
+
+@dataclass(frozen=True)
+class IgnoreRules:
+    """The `.gitignore` patterns in effect in a directory."""
+
+    patterns: tuple[IgnorePattern, ...] = ()
+
+    @classmethod
+    def defaults(cls) -> IgnoreRules:
+        parsed = (IgnorePattern.parse(line) for line in DEFAULT_IGNORES)
+        return cls(tuple(pattern for pattern in parsed if pattern is not None))
+
+    def extended(self, directory: str, rel_dir: str) -> IgnoreRules:
+        """Add the patterns of the `.gitignore` in `directory`, if any."""
+        try:
+            with open(os.path.join(directory, ".gitignore"), encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return self
+        parsed = (IgnorePattern.parse(line, rel_dir) for line in lines)
+        added = tuple(pattern for pattern in parsed if pattern is not None)
+        return IgnoreRules(self.patterns + added) if added else self
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """Whether a path is ignored; the last matching pattern wins."""
+        for pattern in reversed(self.patterns):
+            if pattern.matches(rel_path, is_dir):
+                return not pattern.negated
+        return False
+
+
+@dataclass
+class Entry:
+    """A listed path; directories come with the counts of their items."""
+
+    path: str
+    is_dir: bool
+    files: int = 0
+    dirs: int = 0
+    ignored: bool = False
+
+
+@dataclass
+class _Scan:
+    files: list[os.DirEntry[str]]
+    dirs: list[os.DirEntry[str]]
+    ignored: list[os.DirEntry[str]]
+    rules: IgnoreRules
+
+
+class Walker:
+    """Depth-first directory walk built on `os.scandir`.
+
+    The file type cached on each `DirEntry` avoids a `stat` per entry.
+    Ignored and excluded directories are pruned without being read, and the
+    walk can be consumed in pages.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_depth: Optional[int] = None,
+        globs: Optional[list[str]] = None,
+        include_hidden: bool = False,
+        include_ignored: bool = False,
+        exclude: Collection[str] = (),
+    ) -> None:
+        self.root = root
+        self.max_depth = max_depth
+        self.globs = [
+            re.compile(
+                glob_regex(glob) if "/" in glob else f"(?:.*/)?{glob_regex(glob)}"
+            )
+            for glob in globs or ()
+        ]
+        self.include_hidden = include_hidden
+        self.include_ignored = include_ignored
+        self.exclude = set(exclude)
+        self._entries = self._walk()
+        self._peeked: list[Entry] = []
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _selected(self, rel_path: str) -> bool:
+        return not self.globs or any(glob.fullmatch(rel_path) for glob in self.globs)
+
+    def _scan(self, directory: str, rules: IgnoreRules) -> _Scan:
+        if not self.include_ignored:
+            rel_dir = self._rel(directory)
+            rules = rules.extended(directory, "" if rel_dir == "." else rel_dir)
+        scan = _Scan([], [], [], rules)
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Can't list {directory}: {e}")
+            return scan
+        for entry in entries:
+            if not self.include_hidden and entry.name.startswith("."):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            rel_path = self._rel(entry.path)
+            if is_dir and entry.path in self.exclude:
+                scan.ignored.append(entry)
+            elif not self.include_ignored and rules.ignored(rel_path, is_dir):
+                if is_dir:
+                    scan.ignored.append(entry)
+            elif is_dir:
+                scan.dirs.append(entry)
+            elif self._selected(rel_path):
+                scan.files.append(entry)
+        return scan
+
+    def _walk(self) -> Iterator[Entry]:
+        rules = IgnoreRules() if self.include_ignored else IgnoreRules.defaults()
+        stack = [(self._scan(self.root, rules), 1)]
+        while stack:
+            scan, depth = stack.pop()
+            for entry in scan.files:
+                yield Entry(entry.path, is_dir=False)
+            for entry in scan.ignored:
+                yield Entry(entry.path, is_dir=True, ignored=True)
+            children = []
+            for entry in scan.dirs:
+                child = self._scan(entry.path, scan.rules)
+                yield Entry(
+                    entry.path,
+                    is_dir=True,
+                    files=len(child.files),
+                    dirs=len(child.dirs),
+                )
+                descend = self.max_depth is None or depth < self.max_depth
+                # Symlinked directories are listed but not followed.
+                if descend and not entry.is_symlink():
+                    children.append((child, depth + 1))
+            stack.extend(reversed(children))
+
+    def __iter__(self) -> Iterator[Entry]:
+        """Iterate over the remaining entries."""
+        return itertools.chain(self._peeked, self._entries)
+
+    def take(self, n: int) -> tuple[list[Entry], bool]:
+        """Return the next `n` entries and whether the walk has more."""
+        page = self._peeked + list(itertools.islice(self._entries, n + 1))
+        self._peeked = page[n:]
+        return page[:n], bool(self._peeked)
+
+
+@dataclass
+class WalkStore:
+    """Registry of the unfinished walks of a session, resumed with a cursor."""
+
+    walks: dict[str, Walker] = field(default_factory=dict)
+    _count: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, walker: Walker) -> str:
+        with self._lock:
+            self._count += 1
+            cursor = f"walk-{self._count}"
+            self.walks[cursor] = walker
+        return cursor
+
+    def pop(self, cursor: str) -> Optional[Walker]:
+        with self._lock:
+            return self.walks.pop(cursor, None)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/85.0.4183.102 Safari/537.36"
+)
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept-Language": "en-US,en;q=0.5",
+    "Connection": "keep-alive",
+}
+
+
+@dataclass
+class HttpConfig:
+    """Settings for the HTTP session shared by the network-bound actions."""
+
+    # Number of hosts to keep connection pools for.
+    pool_connections: int = 10
+    # Number of connections kept alive per host.
+    pool_maxsize: int = 10
+    timeout_s: float = 10
+    retries: int = 3
+    backoff_factor: float = 0.5
+    retry_statuses: tuple[int, ...] = field(default=(429, 500, 502, 503, 504))
+
+
+class SharedSession:
+    """A lazily created `requests.Session` that is rebuilt when reconfigured.
+
+    `requests` itself is only imported with the first session.
+    """
+
+    def __init__(self, config: Optional[HttpConfig] = None) -> None:
+        self.config = config or HttpConfig()
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs: Any) -> None:
+        """Update the HTTP settings; the session is rebuilt on next use."""
+        with self._lock:
+            self.config = HttpConfig(**{**self.config.__dict__, **kwargs})
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def session(self) -> requests.Session:
+        """Return the session, creating it on first use."""
+        with self._lock:
+            if self._session is None:
+                self._session = self._new_session()
+            return self._session
+
+    def _new_session(self) -> requests.Session:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        config = self.config
+        retry = Retry(
+            total=config.retries,
+            backoff_factor=config.backoff_factor,
+            status_forcelist=config.retry_statuses,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=config.pool_connections,
+            pool_maxsize=config.pool_maxsize,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        logger.debug(f"Created HTTP session: {config}")
+        return session
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """GET through the session with the configured timeout."""
+        kwargs.setdefault("timeout", self.config.timeout_s)
+        return self.session().get(url, **kwargs)
+
+
+SHARED_SESSION = SharedSession()
+
+
+def configure(**kwargs: Any) -> None:
+    """Update the settings of the shared session."""
+    SHARED_SESSION.configure(**kwargs)
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    """GET through the shared session."""
+    return SHARED_SESSION.get(url, **kwargs)
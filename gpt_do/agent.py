@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
+
+from . import StepLimitReached
+from .actions import (
+    Action,
+    ActionEnum,
+    Choose,
+    Complete,
+    Step,
+    aexecute_steps,
+    execute_steps,
+)
+from .actions.session_state import SessionState, session_scope
+from .actions.shell_session import SHELL_SESSION
+from .context import ContextManager
+from .prompt import system_prompt
+from .tracing import TRACER
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types.chat import ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentConfig:
+    """Options controlling how a session is driven."""
+
+    step_mode: str = "fused"
+    prompt_layout: str = "cacheable"
+    stream: bool = False
+    max_workers: int = 4
+    context_budget: int = 32_000
+    keep_recent: int = 8
+    compaction: str = "summarize"
+    # Steps after which the session is given up on, if any.
+    max_steps: Optional[int] = None
+    # Whether to prefetch the read-only loads named in the plan.
+    prefetch: bool = False
+
+    @property
+    def cacheable(self) -> bool:
+        return self.prompt_layout == "cacheable"
+
+    def context_manager(self) -> ContextManager:
+        return ContextManager(
+            budget=self.context_budget,
+            keep_recent=self.keep_recent,
+            summarize=self.compaction == "summarize",
+        )
+
+
+def new_history(
+    config: AgentConfig, user_request: str
+) -> list[ChatCompletionMessageParam]:
+    """Return the initial history for a user request."""
+    SHELL_SESSION.close()
+    return [
+        {
+            "role": "system",
+            "content": system_prompt(ActionEnum.list(), config.cacheable),
+        },
+        {"role": "user", "content": user_request},
+    ]
+
+
+def start_step(config: AgentConfig, state: SessionState) -> int:
+    """Start the next step of a session and return its number."""
+    if config.max_steps is not None and state.steps >= config.max_steps:
+        raise StepLimitReached(f"Not completed after {config.max_steps} steps")
+    step = state.file_cache.advance()
+    state.step_started = time.monotonic()
+    state.prefetcher.advance(step)
+    state.dispatch.clear()
+    return step
+
+
+def log_actions(actions: list[type[Action[Any, Any]]]) -> None:
+    for action in actions:
+        logger.info(f"[bold]Action[/]: {action.__name__} - {action.summary()}")
+
+
+def run_session(
+    client: OpenAI,
+    user_request: str,
+    config: AgentConfig,
+    state: Optional[SessionState] = None,
+) -> list[ChatCompletionMessageParam]:
+    """Drive a session until the agent completes the request.
+
+    The session runs with `state` (a fresh one by default) as the current
+    session state, whose history is kept up to date.
+
+    Returns:
+        The final history.
+    """
+    state = state if state is not None else SessionState()
+    state.prefetcher.enabled = config.prefetch
+    with session_scope(state):
+        state.history = new_history(config, user_request)
+        try:
+            return _run_session(client, config, state)
+        finally:
+            state.prefetcher.close()
+            state.dispatch.clear()
+
+
+def _run_session(
+    client: OpenAI, config: AgentConfig, state: SessionState
+) -> list[ChatCompletionMessageParam]:
+    context_manager = config.context_manager()
+    history = state.history
+    cacheable, stream = config.cacheable, config.stream
+
+    while True:
+        step_number = start_step(config, state)
+        with TRACER.span("step", history=history, step=step_number):
+            actions: list[type[Action[Any, Any]]]
+            if config.step_mode == "fused":
+                # select actions and arguments
+                step_output: Step.Output = Step.run(client, history, cacheable, stream)
+                # perform actions
+                actions = [step.action.to_action() for step in step_output.steps]
+                log_actions(actions)
+                execute_steps(
+                    step_output.steps, history, max_workers=config.max_workers
+                )
+            else:
+                # select action
+                select_output: Choose.Output = Choose.run(
+                    client, history, cacheable, stream
+                )
+                # perform action
+                action = select_output.action.to_action()
+                actions = [action]
+                log_actions(actions)
+                action.run(client, history, cacheable, stream)
+            # check if done
+            if Complete in actions:
+                # TODO: allow denying the completion
+                return history
+            # load what the plan names while the next step is selected
+            state.prefetcher.speculate(state.plan)
+        if context_manager.compact(client, history):
+            # Earlier file reads may be gone, so they can't be referred back to.
+            state.file_cache.clear()
+
+
+async def arun_session(
+    client: AsyncOpenAI,
+    user_request: str,
+    config: AgentConfig,
+    state: Optional[SessionState] = None,
+) -> list[ChatCompletionMessageParam]:
+    """Drive a session on the event loop (see `run_session`).
+
+    Many sessions can share one event loop, each in its own task and with its
+    own state. Only one of them can stream with a live preview at a time.
+    """
+    state = state if state is not None else SessionState()
+    state.prefetcher.enabled = config.prefetch
+    with session_scope(state):
+        state.history = new_history(config, user_request)
+        try:
+            return await _arun_session(client, config, state)
+        finally:
+            state.prefetcher.close()
+            state.dispatch.clear()
+
+
+async def _arun_session(
+    client: AsyncOpenAI, config: AgentConfig, state: SessionState
+) -> list[ChatCompletionMessageParam]:
+    context_manager = config.context_manager()
+    history = state.history
+    cacheable, stream = config.cacheable, config.stream
+
+    while True:
+        step_number = start_step(config, state)
+        with TRACER.span("step", history=history, step=step_number):
+            actions: list[type[Action[Any, Any]]]
+            if config.step_mode == "fused":
+                step_output: Step.Output = await Step.arun(
+                    client, history, cacheable, stream
+                )
+                actions = [step.action.to_action() for step in step_output.steps]
+                log_actions(actions)
+                await aexecute_steps(
+                    step_output.steps, history, max_workers=config.max_workers
+                )
+            else:
+                select_output: Choose.Output = await Choose.arun(
+                    client, history, cacheable, stream
+                )
+                action = select_output.action.to_action()
+                actions = [action]
+                log_actions(actions)
+                await action.arun(client, history, cacheable, stream)
+            if Complete in actions:
+                return history
+            state.prefetcher.speculate(state.plan)
+        if await context_manager.acompact(client, history):
+            state.file_cache.clear()
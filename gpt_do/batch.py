@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal, Optional, TextIO
+
+from pydantic import BaseModel, ValidationError
+
+from . import GptDont, StepLimitReached
+from .actions.session_state import SessionState
+from .agent import AgentConfig, arun_session
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+Outcome = Literal["completed", "denied", "step_limit", "error"]
+
+
+class BatchPolicy(BaseModel):
+    """How the prompts of an unattended session are answered.
+
+    Args:
+        approve: Names of the actions performed without confirmation,
+            e.g. `EXECUTE_BASH_COMMAND`, or `*` for all of them.
+            Other actions that need confirmation are denied.
+        answers: Answers to the questions of the agent, in order.
+        default_answer: Answer to the questions once `answers` run out.
+        max_steps: Steps after which the session is given up on.
+    """
+
+    approve: list[str] = []
+    answers: list[str] = []
+    default_answer: str = "I am not available, do your best without me."
+    max_steps: int = 50
+
+
+class PolicyPrompter:
+    """Answers the prompts of a session according to a batch policy."""
+
+    def __init__(self, policy: BatchPolicy) -> None:
+        self.policy = policy
+        self._answers = iter(policy.answers)
+
+    def confirm(self, action: str) -> bool:
+        approved = "*" in self.policy.approve or action in self.policy.approve
+        logger.debug(f"Policy {'approved' if approved else 'denied'} {action}")
+        return approved
+
+    def ask(self, question: str) -> str:
+        answer = next(self._answers, self.policy.default_answer)
+        logger.debug(f"Policy answered {question!r} with {answer!r}")
+        return answer
+
+    def pause(self, message: str) -> None:
+        pass
+
+
+class BatchRequest(BaseModel):
+    """A line of a batch file.
+
+    Args:
+        id: Identifies the request in the results. Defaults to its line number.
+        request: The user request.
+        policy: How the prompts of the session are answered.
+    """
+
+    id: Optional[str] = None
+    request: str
+    policy: BatchPolicy = BatchPolicy()
+
+
+class BatchResult(BaseModel):
+    """A line of the results of a batch.
+
+    Args:
+        id: The id of the request.
+        request: The user request.
+        outcome: Whether the session completed, an action was denied, it ran
+            out of steps or it failed.
+        error: The reason the session did not complete, if it did not.
+        steps: Number of steps taken.
+        llm_calls: Number of completions requested.
+        prompt_tokens: Prompt tokens used.
+        completion_tokens: Completion tokens used.
+        cached_tokens: Prompt tokens served from the provider's prefix cache.
+        throttled_s: Seconds spent waiting for the rate limiter.
+        models: Number of completions per model.
+        prefetched: Number of loads prefetched from the plan.
+        prefetch_hits: Number of prefetched loads served to an action.
+        wall_s: Wall time of the session in seconds.
+        transcript: The final history of the session.
+    """
+
+    id: str
+    request: str
+    outcome: Outcome
+    error: Optional[str] = None
+    steps: int
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    throttled_s: float = 0.0
+    models: dict[str, int] = {}
+    prefetched: int = 0
+    prefetch_hits: int = 0
+    wall_s: float
+    transcript: list[dict[str, Any]]
+
+
+def load_requests(path: Path) -> list[BatchRequest]:
+    """Read a batch file, giving requests without an id their line number."""
+    requests = []
+    seen: set[str] = set()
+    with path.open() as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            request = BatchRequest.model_validate_json(line)
+            if request.id is None:
+                request.id = f"line-{line_number}"
+            if request.id in seen:
+                raise ValueError(f"Duplicate request id {request.id!r} in {path}")
+            seen.add(request.id)
+            requests.append(request)
+    return requests
+
+
+def finished_ids(path: Path) -> set[str]:
+    """Return the ids of the requests with a final result.
+
+    Failed sessions are run again. A later result of a request replaces an
+    earlier one, and a line cut short by an interrupted batch is ignored.
+    """
+    if not path.exists():
+        return set()
+    outcomes: dict[str, Outcome] = {}
+    with path.open() as f:
+        for line in f:
+            try:
+                result = BatchResult.model_validate_json(line)
+            except ValidationError:
+                logger.warning(f"Ignoring malformed result line in {path}")
+                continue
+            outcomes[result.id] = result.outcome
+    return {id_ for id_, outcome in outcomes.items() if outcome != "error"}
+
+
+async def run_request(
+    client: AsyncOpenAI, request: BatchRequest, config: AgentConfig
+) -> BatchResult:
+    """Drive the session of a batch request and return its result."""
+    assert request.id is not None
+    state = SessionState(prompter=PolicyPrompter(request.policy))
+    config = dataclasses.replace(config, max_steps=request.policy.max_steps)
+    outcome: Outcome = "completed"
+    error = None
+    start = time.perf_counter()
+    try:
+        await arun_session(client, request.request, config, state)
+    except StepLimitReached as e:
+        outcome, error = "step_limit", str(e)
+    except GptDont as e:
+        outcome, error = "denied", str(e)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.exception(f"Batch request {request.id} failed")
+        outcome, error = "error", f"{type(e).__name__}: {e}"
+    usage = state.usage
+    return BatchResult(
+        id=request.id,
+        request=request.request,
+        outcome=outcome,
+        error=error,
+        steps=state.steps,
+        llm_calls=usage.llm_calls,
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        cached_tokens=usage.cached_tokens,
+        throttled_s=usage.throttled_s,
+        models=dict(usage.models),
+        prefetched=state.prefetcher.stats.predicted,
+        prefetch_hits=state.prefetcher.stats.hits,
+        wall_s=time.perf_counter() - start,
+        transcript=[dict(message) for message in state.history],
+    )
+
+
+async def run_batch(
+    client: AsyncOpenAI,
+    requests_path: Path,
+    results_path: Path,
+    config: AgentConfig,
+    workers: int = 4,
+) -> list[BatchResult]:
+    """Run the requests of a batch file, `workers` sessions at a time.
+
+    The sessions share the event loop and the client. Each result is appended
+    to the results file as soon as its session ends, and requests with a
+    final result there are skipped, so an interrupted batch can be resumed by
+    running it again. Streaming is turned off, as there is no one to watch.
+
+    Returns:
+        The results of the requests run.
+    """
+    requests = load_requests(requests_path)
+    done = finished_ids(results_path)
+    pending = [request for request in requests if request.id not in done]
+    logger.info(
+        f"[bold]Batch[/]: {len(pending)} requests to run, "
+        f"{len(requests) - len(pending)} already done"
+    )
+    config = dataclasses.replace(config, stream=False)
+    semaphore = asyncio.Semaphore(workers)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+
+    async def run(request: BatchRequest, results: TextIO) -> BatchResult:
+        async with semaphore:
+            logger.info(f"[bold]Batch[/]: starting {request.id}")
+            result = await run_request(client, request, config)
+        # Written from the event loop only, so lines don't interleave.
+        results.write(result.model_dump_json() + "\n")
+        results.flush()
+        logger.info(
+            f"[bold]Batch[/]: {result.id} {result.outcome} after {result.steps} "
+            f"steps, {result.llm_calls} completions ({result.wall_s:.1f}s, "
+            f"{result.throttled_s:.1f}s throttled)"
+        )
+        return result
+
+    start = time.perf_counter()
+    with results_path.open("a") as results:
+        batch_results = await asyncio.gather(
+            *(run(request, results) for request in pending)
+        )
+    outcomes = Counter(result.outcome for result in batch_results)
+    logger.info(
+        f"[bold]Batch[/]: {json.dumps(dict(outcomes))} in "
+        f"{time.perf_counter() - start:.1f}s, results in {results_path}"
+    )
+    return list(batch_results)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Optional
+
+from pydantic import BaseModel
+
+from .actions.completion_cache import COMPLETION_CACHE
+from .actions.rate_limit import RATE_LIMITER
+from .actions.routing import MODEL_ROUTER
+from .actions.schema import response_schema
+from .actions.session_state import current_session
+from .tracing import TRACER
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types.chat import ChatCompletion, ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text and JSON with the OpenAI tokenizers.
+CHARS_PER_TOKEN = 4
+# Per-message overhead for the role and message framing.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of earlier steps:"
+# Route of the summary completions (see `ModelRouter`).
+SUMMARY_ROUTE = "SUMMARY"
+
+
+class Summary(BaseModel):
+    summary: str
+
+
+def message_text(message: ChatCompletionMessageParam) -> str:
+    """Return the text content of a message."""
+    content = message.get("content")
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    return json.dumps(content)
+
+
+def estimate_tokens(message: ChatCompletionMessageParam) -> int:
+    """Estimate the number of prompt tokens used by a message."""
+    return len(message_text(message)) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextManager:
+    """Keep the chat history within a token budget.
+
+    The first `pinned` messages (the system prompt and the user request) and
+    the last `keep_recent` messages are always kept verbatim. Once the budget
+    is exceeded, everything in between is either summarized into a single
+    system message or evicted.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        keep_recent: int = 8,
+        summarize: bool = True,
+        pinned: int = 2,
+    ) -> None:
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.summarize = summarize
+        self.pinned = pinned
+
+    def measure(self, history: list[ChatCompletionMessageParam]) -> int:
+        """Return the estimated token count of the history."""
+        return sum(estimate_tokens(message) for message in history)
+
+    def compact(
+        self, client: OpenAI, history: list[ChatCompletionMessageParam]
+    ) -> bool:
+        """Compact the history in place if it exceeds the budget.
+
+        Returns:
+            Whether the history was compacted.
+        """
+        span = self._older_span(history)
+        if span is None:
+            return False
+        start, end = span
+        summary = None
+        if self.summarize:
+            messages = summary_request(history[start:end])
+            model = summary_model()
+            key = COMPLETION_CACHE.key(model, messages, Summary)
+            summary = cached_summary(key)
+            if summary is None:
+                with TRACER.span(
+                    "llm", history=messages, action="Summary", model=model
+                ) as trace:
+                    started = time.perf_counter()
+                    completion = RATE_LIMITER.call(
+                        functools.partial(
+                            client.chat.completions.create,
+                            model=model,
+                            messages=messages,
+                            response_format=response_schema(Summary).response_format,
+                        ),
+                        messages,
+                    )
+                    MODEL_ROUTER.record_call(
+                        model, time.perf_counter() - started, escalated=False
+                    )
+                    trace.record_usage(completion.usage)
+                summary = parse_summary(completion, model, key)
+        self._replace(history, start, end, summary)
+        return True
+
+    async def acompact(
+        self, client: AsyncOpenAI, history: list[ChatCompletionMessageParam]
+    ) -> bool:
+        """Compact the history in place if it exceeds the budget (see `compact`)."""
+        span = self._older_span(history)
+        if span is None:
+            return False
+        start, end = span
+        summary = None
+        if self.summarize:
+            messages = summary_request(history[start:end])
+            model = summary_model()
+            key = COMPLETION_CACHE.key(model, messages, Summary)
+            summary = cached_summary(key)
+            if summary is None:
+                with TRACER.span(
+                    "llm", history=messages, action="Summary", model=model
+                ) as trace:
+                    started = time.perf_counter()
+                    completion = await RATE_LIMITER.acall(
+                        functools.partial(
+                            client.chat.completions.create,
+                            model=model,
+                            messages=messages,
+                            response_format=response_schema(Summary).response_format,
+                        ),
+                        messages,
+                    )
+                    MODEL_ROUTER.record_call(
+                        model, time.perf_counter() - started, escalated=False
+                    )
+                    trace.record_usage(completion.usage)
+                summary = parse_summary(completion, model, key)
+        self._replace(history, start, end, summary)
+        return True
+
+    def _older_span(
+        self, history: list[ChatCompletionMessageParam]
+    ) -> Optional[tuple[int, int]]:
+        """Return the range of older messages to compact, if over budget."""
+        tokens = self.measure(history)
+        logger.debug(f"History size: {len(history)} messages, ~{tokens} tokens")
+        if tokens <= self.budget:
+            return None
+
+        start = self.pinned
+        end = len(history) - self.keep_recent
+        if end - start < 2:
+            logger.warning(
+                f"History exceeds the token budget ({tokens} > {self.budget}) "
+                "but there are no older turns left to compact"
+            )
+            return None
+        return start, end
+
+    def _replace(
+        self,
+        history: list[ChatCompletionMessageParam],
+        start: int,
+        end: int,
+        summary: Optional[str],
+    ) -> None:
+        """Replace the older messages with their summary or an eviction note."""
+        tokens = self.measure(history)
+        if summary is not None:
+            content = f"{SUMMARY_PREFIX}\n{summary}"
+        else:
+            content = f"{end - start} earlier messages were removed."
+        history[start:end] = [{"role": "system", "content": content}]
+        logger.info(
+            f"[bold]Compacted history[/]: ~{tokens} -> ~{self.measure(history)} tokens"
+        )
+
+
+def summary_request(
+    messages: list[ChatCompletionMessageParam],
+) -> list[ChatCompletionMessageParam]:
+    """Return the request asking the model to summarize a run of messages."""
+    transcript = "\n\n".join(
+        f"[{message['role']}] {message_text(message)}" for message in messages
+    )
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Summarize the following steps taken by an agent. "
+                "Keep every fact, file path, URL, value and decision "
+                "that may be needed to finish the task. "
+                "Drop instructions and repeated boilerplate."
+            ),
+        },
+        {"role": "user", "content": transcript},
+    ]
+
+
+def summary_model() -> str:
+    # A summary is free text, so there is no invalid completion to escalate.
+    return MODEL_ROUTER.models_for(SUMMARY_ROUTE, "fast")[0]
+
+
+def parse_summary(
+    completion: ChatCompletion, model: str, cache_key: Optional[str] = None
+) -> str:
+    logger.debug(completion)
+    if completion.usage is not None:
+        current_session().usage.record(completion.usage, model)
+        MODEL_ROUTER.record_usage(model, completion.usage)
+    message = completion.choices[0].message
+    if message.refusal:
+        raise ValueError(f"Refusal: {message.refusal}")
+    assert message.content is not None
+    COMPLETION_CACHE.put(cache_key, message.content)
+    return response_schema(Summary).parse(message.content).summary
+
+
+def cached_summary(cache_key: Optional[str]) -> Optional[str]:
+    content = COMPLETION_CACHE.get(cache_key)
+    if content is None:
+        return None
+    return Summary.model_validate_json(content).summary
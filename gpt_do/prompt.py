@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import datetime as dt
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
+TIME_ZONE = "Pacific"
+# Matches the output of `volatile_facts`.
+VOLATILE_FACTS_RE = re.compile(r"The current date and time is \S+\.")
+
+
+def system_prompt(tools: str, cacheable: bool) -> str:
+    """Return the system prompt.
+
+    With a cacheable layout the prompt is byte-stable across sessions, so the
+    volatile facts are left out and sent at the end of each request instead.
+    """
+    system_lines = [
+        "You are an agent autonomously executing a task.",
+        "You will have the ability to execute a sequence of actions.",
+        "You must fully fulfill the user's request.",
+        "Do not hallucinate any details.",
+        "You have access to the following tools:",
+        tools,
+    ]
+    if not cacheable:
+        system_lines.append(volatile_facts())
+    system_lines.append(f"The user is in the {TIME_ZONE} time zone")
+    return "\n".join(system_lines)
+
+
+def volatile_facts() -> str:
+    """Return the facts that change between requests."""
+    return f"The current date and time is {dt.datetime.now().isoformat()}."
+
+
+def volatile_message() -> ChatCompletionMessageParam:
+    """Return the volatile facts as a trailing system message."""
+    return {"role": "system", "content": volatile_facts()}
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Sequence
+
+if TYPE_CHECKING:
+    from openai.types import CompletionUsage
+    from openai.types.chat import ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """A timed operation of a session."""
+
+    name: str
+    id: int
+    parent: Optional[int]
+    thread: int
+    start_s: float
+    duration_s: Optional[float] = None
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def record_usage(self, usage: Optional[CompletionUsage]) -> None:
+        """Record the token usage of a completion.
+
+        Streamed usage can arrive after the span is closed, which is fine:
+        spans are only exported at the end of the session.
+        """
+        if usage is None:
+            return
+        self.set(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+        )
+        if usage.prompt_tokens_details is not None:
+            self.set(cached_tokens=usage.prompt_tokens_details.cached_tokens or 0)
+
+
+def history_size(messages: Sequence[ChatCompletionMessageParam]) -> dict[str, int]:
+    """Return the size of a history in messages and bytes."""
+    return {
+        "history_messages": len(messages),
+        "history_bytes": len(json.dumps(messages, default=str).encode()),
+    }
+
+
+class Tracer:
+    """Collect spans and export them as JSONL or Chrome trace events.
+
+    Spans nest through a context variable, so they follow the asyncio tasks
+    of a session, and threads started with a copy of the context. When
+    disabled, `span` yields a detached span that is not recorded.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.spans: list[Span] = []
+        self._ids = itertools.count(1)
+        self._origin = time.perf_counter()
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+            "current_span", default=None
+        )
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None) -> None:
+        if enabled is not None:
+            self.enabled = enabled
+
+    @contextlib.contextmanager
+    def span(
+        self,
+        name: str,
+        history: Optional[Sequence[ChatCompletionMessageParam]] = None,
+        **attrs: Any,
+    ) -> Iterator[Span]:
+        """Time the enclosed block as a span.
+
+        Args:
+            name: The name of the span.
+            history: Messages whose size is recorded, if tracing is enabled.
+            attrs: Other attributes of the span.
+        """
+        parent = self._current.get()
+        span = Span(
+            name=name,
+            id=next(self._ids),
+            parent=parent.id if parent is not None else None,
+            thread=threading.get_ident(),
+            start_s=time.perf_counter() - self._origin,
+            attrs=attrs,
+        )
+        if not self.enabled:
+            yield span
+            return
+        if history is not None:
+            span.set(**history_size(history))
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            self._current.reset(token)
+            span.duration_s = time.perf_counter() - self._origin - span.start_s
+            with self._lock:
+                self.spans.append(span)
+
+    def export_jsonl(self, path: Path) -> None:
+        """Write one JSON object per span, in start order."""
+        with path.open("w") as f:
+            for span in sorted(self.spans, key=lambda span: span.start_s):
+                f.write(json.dumps(asdict(span), default=str) + "\n")
+
+    def export_chrome(self, path: Path) -> None:
+        """Write the spans in the Chrome trace event format.
+
+        The file can be opened in `chrome://tracing` or Perfetto.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "cat": span.name.split(".", maxsplit=1)[0],
+                "ph": "X",
+                "ts": span.start_s * 1e6,
+                "dur": (span.duration_s or 0.0) * 1e6,
+                "pid": pid,
+                "tid": span.thread,
+                "args": span.attrs,
+            }
+            for span in self.spans
+        ]
+        path.write_text(json.dumps({"traceEvents": events}, default=str))
+
+    def summary(self) -> dict[str, tuple[int, float]]:
+        """Return the number of spans and their total duration by name."""
+        totals: dict[str, tuple[int, float]] = {}
+        for span in self.spans:
+            count, total = totals.get(span.name, (0, 0.0))
+            totals[span.name] = (count + 1, total + (span.duration_s or 0.0))
+        return totals
+
+
+TRACER = Tracer()
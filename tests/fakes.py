@@ -0,0 +1,51 @@
+"""Stand-ins for the OpenAI clients, answering from a script."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+from openai.types.chat import ChatCompletion
+
+
+def completion(content: str, model: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "fake",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }
+    )
+
+
+class FakeClient:
+    """Answer chat completions with the scripted contents, in order."""
+
+    def __init__(self, *contents: str) -> None:
+        self.contents = list(contents)
+        self.requests: list[dict[str, Any]] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs: Any) -> ChatCompletion:
+        self.requests.append(kwargs)
+        return completion(self.contents.pop(0), kwargs["model"])
+
+
+class FakeAsyncClient(FakeClient):
+    """Answer chat completions on the event loop (see `FakeClient`)."""
+
+    def __init__(self, *contents: str) -> None:
+        super().__init__(*contents)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+
+    async def acreate(self, **kwargs: Any) -> ChatCompletion:
+        return self.create(**kwargs)
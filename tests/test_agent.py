@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fakes import FakeAsyncClient
+
+from gpt_do import StepLimitReached
+from gpt_do.actions.choose import ActionEnum
+from gpt_do.actions.read_file import ReadFile
+from gpt_do.actions.session_state import SessionState
+from gpt_do.actions.step import Step, aexecute_steps
+from gpt_do.agent import AgentConfig, arun_session
+
+COMPLETE_ARGS = {
+    "completed_objectives": ["Read"],
+    "failed_objectives": [],
+    "summary": "Done.",
+    "tool_feedback": "None.",
+}
+
+
+def read_step(path: Path) -> dict[str, Any]:
+    args = {"path": str(path), "objective": None, "unit": None, "start": None}
+    return {"action": "READ_FILE", "args": {**args, "end": None}}
+
+
+def step(*steps: dict[str, Any]) -> str:
+    return json.dumps({"reasoning": "", "current_plan": [], "steps": list(steps)})
+
+
+def choose(action: str) -> str:
+    value = ActionEnum[action].value
+    return json.dumps({"reasoning": "", "current_plan": [], "action": value})
+
+
+@pytest.fixture(name="files")
+def files_fixture(tmp_path: Path) -> list[Path]:
+    paths = [tmp_path / f"file{i}.txt" for i in range(3)]
+    for i, path in enumerate(paths):
+        path.write_text(f"contents {i}\n")
+    return paths
+
+
+def test_fused_session_on_the_event_loop(files: list[Path]) -> None:
+    client: Any = FakeAsyncClient(
+        step(*(read_step(path) for path in files)),
+        step({"action": "COMPLETE", "args": COMPLETE_ARGS}),
+    )
+    state = SessionState()
+    history = asyncio.run(arun_session(client, "Read the files.", AgentConfig(), state))
+
+    assert state.steps == 2
+    assert len(client.requests) == 2
+    # The step is followed by the outputs of its actions, in order.
+    outputs = [str(message.get("content")) for message in history[4:7]]
+    for i, output in enumerate(outputs):
+        assert f'"contents {i}\\n"' in output
+
+
+def test_two_phase_session_on_the_event_loop() -> None:
+    client: Any = FakeAsyncClient(
+        choose("CHECK_DATE_TIME"),
+        choose("COMPLETE"),
+        json.dumps(COMPLETE_ARGS),
+    )
+    config = AgentConfig(step_mode="two-phase")
+    asyncio.run(arun_session(client, "What time is it?", config, SessionState()))
+    assert len(client.requests) == 3
+
+
+def test_sessions_give_up_after_max_steps(files: list[Path]) -> None:
+    client: Any = FakeAsyncClient(step(read_step(files[0])))
+    config = AgentConfig(max_steps=1)
+    with pytest.raises(StepLimitReached):
+        asyncio.run(arun_session(client, "Read forever.", config, SessionState()))
+
+
+def test_concurrent_actions_are_bounded_by_max_workers(
+    files: list[Path], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    running, peak = 0, 0
+
+    async def aperform(args: ReadFile.Args) -> ReadFile.Output:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return ReadFile.error(f"Not read: {args.path}")
+
+    monkeypatch.setattr(ReadFile, "aperform", aperform)
+    args = Step.Args.model_validate(
+        json.loads(step(*(read_step(path) for path in files * 3)))
+    )
+    context: list[Any] = []
+    outputs = asyncio.run(aexecute_steps(Step.perform(args).steps, context, 2))
+
+    assert peak == 2
+    assert len(outputs) == len(context) == 9
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from gpt_do.batch import BatchPolicy, PolicyPrompter, finished_ids, load_requests
+
+
+def result_line(id_: str, outcome: str) -> str:
+    return json.dumps(
+        {
+            "id": id_,
+            "request": "Do something.",
+            "outcome": outcome,
+            "steps": 1,
+            "llm_calls": 1,
+            "prompt_tokens": 10,
+            "completion_tokens": 5,
+            "cached_tokens": 0,
+            "wall_s": 0.1,
+            "transcript": [],
+        }
+    )
+
+
+def test_requests_get_their_line_number_as_id(tmp_path: Path) -> None:
+    path = tmp_path / "batch.jsonl"
+    path.write_text(
+        json.dumps({"request": "first"})
+        + "\n\n"
+        + json.dumps({"id": "named", "request": "second"})
+        + "\n"
+    )
+    assert [request.id for request in load_requests(path)] == ["line-1", "named"]
+
+
+def test_duplicate_ids_are_rejected(tmp_path: Path) -> None:
+    path = tmp_path / "batch.jsonl"
+    line = json.dumps({"id": "same", "request": "again"})
+    path.write_text(f"{line}\n{line}\n")
+    with pytest.raises(ValueError, match="Duplicate"):
+        load_requests(path)
+
+
+def test_resume_skips_finished_requests_only(tmp_path: Path) -> None:
+    path = tmp_path / "batch.results.jsonl"
+    path.write_text(
+        "\n".join(
+            [
+                result_line("done", "completed"),
+                result_line("denied", "denied"),
+                result_line("failed", "error"),
+                result_line("retried", "error"),
+                result_line("retried", "completed"),
+                result_line("regressed", "completed"),
+                result_line("regressed", "error"),
+                '{"id": "cut", "outc',
+            ]
+        )
+    )
+    assert finished_ids(path) == {"done", "denied", "retried"}
+
+
+def test_resume_without_results(tmp_path: Path) -> None:
+    assert finished_ids(tmp_path / "missing.jsonl") == set()
+
+
+def test_policy_prompter() -> None:
+    prompter = PolicyPrompter(
+        BatchPolicy(approve=["READ_FILE"], answers=["yes"], default_answer="no")
+    )
+    assert prompter.confirm("READ_FILE")
+    assert not prompter.confirm("EXECUTE_BASH_COMMAND")
+    assert [prompter.ask("?"), prompter.ask("?")] == ["yes", "no"]
+    assert PolicyPrompter(BatchPolicy(approve=["*"])).confirm("ANYTHING")
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from openai.types.chat import ChatCompletionMessageParam
+
+from gpt_do.actions.check_date_time import CheckDateTime
+from gpt_do.actions.completion_cache import CompletionCache
+from gpt_do.actions.read_file import ReadFile
+
+MESSAGES: list[ChatCompletionMessageParam] = [
+    {"role": "system", "content": "You are an agent."},
+    {"role": "user", "content": "What time is it?"},
+]
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(name="clock")
+def clock_fixture(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+def open_cache(tmp_path: Path, mode: str, **kwargs: Any) -> CompletionCache:
+    return CompletionCache(path=tmp_path / "cache.sqlite3", mode=mode, **kwargs)
+
+
+def test_keys_ignore_the_current_time() -> None:
+    cache = CompletionCache(mode="read-write")
+    key = cache.key("gpt-4o-mini", MESSAGES, CheckDateTime.Args)
+    now: ChatCompletionMessageParam = {
+        "role": "system",
+        "content": "The current date and time is 2026-10-18T12:00:00.",
+    }
+    later: ChatCompletionMessageParam = {
+        "role": "system",
+        "content": "The current date and time is 2026-10-19T08:30:00.",
+    }
+
+    assert key is not None and len(key) == 64
+    assert cache.key("gpt-4o-mini", MESSAGES, CheckDateTime.Args) == key
+    assert cache.key("gpt-4o-mini", [*MESSAGES, now], CheckDateTime.Args) == (
+        cache.key("gpt-4o-mini", [*MESSAGES, later], CheckDateTime.Args)
+    )
+    assert cache.key("gpt-4o", MESSAGES, CheckDateTime.Args) != key
+    assert cache.key("gpt-4o-mini", MESSAGES[:1], CheckDateTime.Args) != key
+    assert cache.key("gpt-4o-mini", MESSAGES, ReadFile.Args) != key
+
+
+def test_off_has_no_keys() -> None:
+    assert CompletionCache().key("gpt-4o-mini", MESSAGES, ReadFile.Args) is None
+
+
+@pytest.mark.parametrize(
+    ("mode", "reads", "writes"),
+    [
+        ("read-only", True, False),
+        ("read-write", True, True),
+        ("record", False, True),
+    ],
+)
+def test_modes(tmp_path: Path, mode: str, reads: bool, writes: bool) -> None:
+    seeded = open_cache(tmp_path, "read-write")
+    seeded.put("seeded", "cached")
+
+    mode_cache = open_cache(tmp_path, mode)
+    assert (mode_cache.get("seeded") == "cached") is reads
+    mode_cache.put("new", "stored")
+    assert (seeded.get("new") == "stored") is writes
+
+
+def test_entries_expire(tmp_path: Path, clock: Clock) -> None:
+    expiring = open_cache(tmp_path, "read-write", ttl_s=60)
+    expiring.put("key", "content")
+    clock.now += 59
+    assert expiring.get("key") == "content"
+    clock.now += 2
+    assert expiring.get("key") is None
+
+    expiring.put("other", "content")
+    assert expiring.stats.evictions == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path, clock: Clock) -> None:
+    small = open_cache(tmp_path, "read-write", max_bytes=10)
+    small.put("a", "aaaa")
+    clock.now += 1
+    small.put("b", "bbbb")
+    clock.now += 1
+    assert small.get("a") == "aaaa"
+    clock.now += 1
+    small.put("c", "cccc")
+
+    assert small.get("b") is None
+    assert small.get("a") == "aaaa" and small.get("c") == "cccc"
+    assert str(small.stats) == "3 hits, 1 misses, 3 stored, 1 evicted"
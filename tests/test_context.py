@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any
+
+from fakes import FakeAsyncClient, FakeClient
+
+from gpt_do.context import SUMMARY_PREFIX, ContextManager
+
+
+def history(turns: int) -> list[Any]:
+    messages: list[Any] = [
+        {"role": "system", "content": "You are an agent."},
+        {"role": "user", "content": "Do something."},
+    ]
+    for i in range(turns):
+        messages.append({"role": "assistant", "content": f"Step {i}: " + "x" * 400})
+        messages.append({"role": "system", "content": f"Output {i}: " + "y" * 400})
+    return messages
+
+
+def test_within_budget_is_left_alone() -> None:
+    messages = history(2)
+    client: Any = FakeClient()
+    assert not ContextManager(budget=10_000).compact(client, messages)
+    assert messages == history(2)
+
+
+def test_older_turns_are_summarized() -> None:
+    messages = history(10)
+    client: Any = FakeClient(json.dumps({"summary": "Read a file."}))
+    manager = ContextManager(budget=1_000, keep_recent=4)
+
+    assert manager.compact(client, messages)
+    assert messages[:2] == history(10)[:2]
+    assert messages[2] == {
+        "role": "system",
+        "content": f"{SUMMARY_PREFIX}\nRead a file.",
+    }
+    assert messages[3:] == history(10)[-4:]
+    # The summarized turns are sent as one transcript.
+    transcript = client.requests[0]["messages"][1]["content"]
+    assert "Step 0" in transcript and "Output 7" in transcript
+    assert "Step 8" not in transcript
+
+
+def test_older_turns_are_evicted_without_summaries() -> None:
+    messages = history(10)
+    client: Any = FakeClient()
+    manager = ContextManager(budget=1_000, keep_recent=4, summarize=False)
+
+    assert asyncio.run(manager.acompact(client, messages))
+    assert messages[2] == {
+        "role": "system",
+        "content": "16 earlier messages were removed.",
+    }
+    assert len(messages) == 7
+    assert not client.requests
+
+
+def test_recent_turns_are_never_compacted() -> None:
+    messages = history(2)
+    client: Any = FakeAsyncClient()
+    manager = ContextManager(budget=10, keep_recent=4)
+    assert not asyncio.run(manager.acompact(client, messages))
+    assert len(messages) == 6
+
+
+def test_older_turns_are_summarized_on_the_event_loop() -> None:
+    messages = history(10)
+    client: Any = FakeAsyncClient(json.dumps({"summary": "Read a file."}))
+    manager = ContextManager(budget=1_000, keep_recent=4)
+
+    assert asyncio.run(manager.acompact(client, messages))
+    assert messages[2]["content"] == f"{SUMMARY_PREFIX}\nRead a file."
+    assert len(client.requests) == 1
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from gpt_do.actions.file_cache import FileCache, unified_diff
+
+
+def test_lookup_hits_only_unchanged_files(tmp_path: Path) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("one\n")
+    cache = FileCache()
+    cache.advance()
+
+    assert cache.lookup("notes", path.stat()) is None
+    assert cache.update("notes", path.stat(), "one\n") is None
+    cached = cache.lookup("notes", path.stat())
+    assert cached is not None and cached.step == 1
+
+    path.write_text("one\ntwo\n")
+    assert cache.lookup("notes", path.stat()) is None
+    assert (cache.stats.unchanged, cache.stats.misses) == (1, 1)
+
+
+def test_lookup_detects_rewrites_of_the_same_size(tmp_path: Path) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("one\n")
+    cache = FileCache()
+    cache.update("notes", path.stat(), "one\n")
+
+    path.write_text("two\n")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.lookup("notes", path.stat()) is None
+
+
+def test_invalid_entries_are_forgotten(tmp_path: Path) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("one\n")
+    cache = FileCache()
+    cache.update("notes", path.stat(), "one\n", document="doc-1")
+
+    assert cache.lookup("notes", path.stat(), valid=lambda cached: False) is None
+    assert "notes" not in cache.entries
+    assert cache.stats.unchanged == 0
+
+
+def test_update_returns_the_previous_read(tmp_path: Path) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("one\n")
+    cache = FileCache()
+    cache.advance()
+    cache.update("notes", path.stat(), "one\n")
+
+    cache.advance()
+    path.write_text("one\ntwo\n")
+    previous = cache.update("notes", path.stat(), "one\ntwo\n")
+    assert previous is not None and previous.step == 1
+    assert str(cache.stats) == "0 unchanged, 1 diffs, 1 misses"
+
+    diff = unified_diff("notes.txt", previous, "one\ntwo\n")
+    assert diff.startswith("--- notes.txt (step 1)\n+++ notes.txt (now)\n")
+    assert "+two\n" in diff
+
+    cache.clear()
+    assert cache.lookup("notes", path.stat()) is None
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from gpt_do.actions.file_index import FileIndex
+
+
+@pytest.fixture(name="tree")
+def tree_fixture(tmp_path: Path) -> Path:
+    tree = tmp_path / "tree"
+    (tree / "src").mkdir(parents=True)
+    (tree / "src" / "config.py").write_text("MAX_RETRIES = 5\nTIMEOUT_S = 30\n")
+    (tree / "README.md").write_text("Set MAX_RETRIES to retry.\n")
+    (tree / "tmp").mkdir()
+    (tree / "tmp" / "agent.log").write_text("MAX_RETRIES in the log\n")
+    return tree
+
+
+@pytest.fixture(name="index")
+def index_fixture(tmp_path: Path, tree: Path) -> FileIndex:
+    return FileIndex(
+        path=tmp_path / "index.sqlite3", workers=2, exclude=(tree / "tmp",)
+    )
+
+
+def test_search_names_and_contents(tree: Path, index: FileIndex) -> None:
+    stats = index.refresh(str(tree))
+    assert stats.added == 2
+
+    files, lines = index.search(str(tree), "config")
+    assert files == [str(tree / "src" / "config.py")]
+    _, lines = index.search(str(tree), "max_retries", names=False)
+    assert [(match.path, match.line) for match in lines] == [
+        (str(tree / "README.md"), 1),
+        (str(tree / "src" / "config.py"), 1),
+    ]
+    # Too short for the trigram index.
+    _, lines = index.search(str(tree), "S =", names=False)
+    assert len(lines) == 2
+
+
+def test_refresh_is_incremental(tree: Path, index: FileIndex) -> None:
+    index.refresh(str(tree))
+    config = tree / "src" / "config.py"
+    config.write_text("RETRY_LIMIT = 5\n")
+    os.utime(config, ns=(0, 0))
+    (tree / "README.md").unlink()
+
+    stats = index.refresh(str(tree))
+    assert (stats.added, stats.updated, stats.removed) == (0, 1, 1)
+    assert index.search(str(tree), "MAX_RETRIES", names=False) == ([], [])
+    _, lines = index.search(str(tree), "RETRY_LIMIT", names=False)
+    assert [match.path for match in lines] == [str(config)]
+
+
+def test_excluded_directories_are_not_indexed(tree: Path, index: FileIndex) -> None:
+    index.refresh(str(tree))
+    files, lines = index.search(str(tree), "agent")
+    assert not files and not lines
+
+
+def test_refreshed_once_since(tree: Path, index: FileIndex) -> None:
+    step_started = time.monotonic()
+    assert index.refresh(str(tree), since=step_started).added == 2
+    (tree / "src" / "new.py").write_text("")
+
+    # Already refreshed in this step, also for the directories below.
+    assert index.refresh(str(tree), since=step_started).added == 0
+    assert index.refresh(str(tree / "src"), since=step_started).added == 0
+    assert index.refresh(str(tree), since=time.monotonic()).added == 1
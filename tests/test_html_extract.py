@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import pytest
+
+from gpt_do.actions.html_extract import extract
+
+ARTICLE = (
+    "<h1>Release notes</h1>"
+    "<p>The new release makes requests time out after sixty seconds by default.</p>"
+    "<p>Set the timeout option to change how long requests may take.</p>"
+)
+NAV = '<ul><li><a href="/a">Home</a></li><li><a href="/b">Docs</a></li></ul>'
+
+
+@pytest.mark.parametrize(
+    "page",
+    [
+        f'<html><body class="has-sidebar"><div class="sidebar">{NAV}</div>'
+        f"<div>{ARTICLE}</div></body></html>",
+        f'<html><body><article class="post tag-social">{ARTICLE}</article>'
+        "</body></html>",
+        f'<html><body><div id="content" class="with-toc">{ARTICLE}</div>'
+        "</body></html>",
+        f'<html><body><main class="menu">{ARTICLE}</main></body></html>',
+        f'<html><body><div role="main" class="modal">{ARTICLE}</div></body></html>',
+    ],
+    ids=["body-has-sidebar", "article-tag-social", "div-with-toc", "main", "role"],
+)
+def test_content_root_is_kept(page: str) -> None:
+    text, _ = extract(page, "https://example.com/")
+    assert "sixty seconds" in text
+    assert "timeout option" in text
+
+
+def test_element_holding_most_of_the_text_is_kept() -> None:
+    page = (
+        f'<html><body><div class="related">{ARTICLE}</div>'
+        '<div class="share">Share this</div></body></html>'
+    )
+    text, _ = extract(page, "https://example.com/")
+    assert "sixty seconds" in text
+    assert "Share this" not in text
+
+
+def test_page_wrapped_in_a_form_is_kept() -> None:
+    page = f'<html><body><form id="form1">{ARTICLE}</form></body></html>'
+    text, _ = extract(page, "https://example.com/")
+    assert "sixty seconds" in text
+
+
+@pytest.mark.parametrize(
+    "boilerplate",
+    [
+        f'<div class="sidebar">{NAV}</div>',
+        '<div class="cookie-banner">We use cookies.</div>',
+        '<div id="comments">First!</div>',
+        '<div role="navigation">Jump to section</div>',
+        '<form action="/search"><label>Search the docs</label><input></form>',
+    ],
+)
+def test_boilerplate_is_dropped(boilerplate: str) -> None:
+    page = f"<html><body>{boilerplate}<div>{ARTICLE}</div></body></html>"
+    text, _ = extract(page, "https://example.com/")
+    assert "sixty seconds" in text
+    for words in ("Home", "cookies", "First!", "Jump to", "Search the"):
+        assert words not in text
+
+
+def test_links_come_from_the_main_content() -> None:
+    page = (
+        f'<html><body><nav>{NAV}</nav><main>{ARTICLE}<a href="/ref">ref</a></main>'
+        "</body></html>"
+    )
+    _, links = extract(page, "https://example.com/docs/")
+    assert links == ["https://example.com/ref"]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from gpt_do.actions.page_cache import CachedPage, PageCache
+
+
+def cached_page(max_age: float) -> CachedPage:
+    return CachedPage(
+        url="https://example.com/",
+        final_url="https://example.com/",
+        encoding="utf-8",
+        stored_at=time.time() - 2 * max_age,
+        etag='"v1"',
+        max_age=max_age,
+    )
+
+
+def test_revalidated_keeps_freshness_not_restated(tmp_path: Path) -> None:
+    cache = PageCache(directory=tmp_path)
+    page = cached_page(max_age=600)
+    assert not page.fresh
+
+    cache.revalidated(page, {"ETag": '"v1"'})
+
+    assert page.max_age == 600
+    assert page.fresh
+    assert cache.stats.revalidated == 1
+
+
+def test_revalidated_uses_restated_freshness(tmp_path: Path) -> None:
+    cache = PageCache(directory=tmp_path)
+    page = cached_page(max_age=600)
+
+    cache.revalidated(page, {"Cache-Control": "max-age=60, no-cache"})
+
+    assert page.max_age == 60
+    assert page.no_cache
+    assert not page.fresh
+
+
+def test_hits_and_misses_are_counted(tmp_path: Path) -> None:
+    cache = PageCache(directory=tmp_path)
+    cache.hit()
+    cache.hit()
+    cache.miss()
+    assert (cache.stats.hits, cache.stats.misses) == (2, 1)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from gpt_do.actions.load_web_page import LoadWebPage
+from gpt_do.actions.prefetch import Prefetcher, Speculation, plan_targets
+
+
+def test_plan_targets() -> None:
+    plan = ["Load https://example.com/a.html, then read ~/notes.txt.", "Read ./b/c"]
+    assert list(plan_targets(plan)) == [
+        "https://example.com/a.html",
+        "~/notes.txt",
+        "./b/c",
+    ]
+
+
+def test_never_prefetches_actions_needing_confirmation(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    asked = []
+
+    def speculate(target: str) -> Optional[Speculation]:
+        asked.append(target)
+        return ("LOAD_WEB_PAGE", target), lambda: None
+
+    monkeypatch.setattr(LoadWebPage, "speculate", speculate)
+    notes = tmp_path / "notes.txt"
+    notes.write_text("notes\n")
+    prefetcher = Prefetcher(enabled=True)
+    try:
+        prefetcher.speculate([f"Load https://example.com/ and read {notes}"])
+    finally:
+        prefetcher.close()
+
+    assert LoadWebPage.confirm
+    assert not asked
+    assert prefetcher.stats.predicted == 1
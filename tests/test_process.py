@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from gpt_do.actions.process import HeadTail, run_streaming
+
+
+def test_output_and_return_code() -> None:
+    result = run_streaming("echo out; echo err >&2; exit 3", 10, 1024, echo=False)
+    assert result.stdout.text() == "out\n"
+    assert result.stderr.text() == "err\n"
+    assert result.return_code == 3
+    assert not result.timed_out
+
+
+def test_background_children_are_not_waited_for() -> None:
+    result = run_streaming("sleep 5 & echo hi", 10, 1024, echo=False)
+    assert result.stdout.text() == "hi\n"
+    assert result.return_code == 0
+    assert not result.timed_out
+    assert result.duration_s < 3
+
+
+def test_timeout_kills_the_process_group() -> None:
+    result = run_streaming("echo started; sleep 5; echo done", 0.5, 1024, echo=False)
+    assert result.timed_out
+    assert result.return_code != 0
+    assert result.stdout.text() == "started\n"
+    assert result.duration_s < 3
+
+
+def test_head_and_tail_are_kept(tmp_path: Path) -> None:
+    result = run_streaming(
+        "seq 1 100000", 10, 100, spill_prefix=tmp_path / "seq", echo=False
+    )
+    text = result.stdout.text()
+    assert text.startswith("1\n2\n3\n")
+    assert text.endswith("99999\n100000\n")
+    assert "bytes omitted" in text
+    assert result.stdout.spilled is not None
+    spilled = Path(result.stdout.spilled).read_text()
+    assert spilled.splitlines() == [str(i) for i in range(1, 100001)]
+
+
+def test_head_tail_without_overflow() -> None:
+    buffer = HeadTail(limit=4)
+    for chunk in (b"ab", b"cd", b"ef"):
+        buffer.write(chunk)
+    assert buffer.total == 6
+    assert buffer.text() == "abcdef"
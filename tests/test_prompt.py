@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+from fakes import FakeClient
+
+from gpt_do.actions.choose import ActionEnum
+from gpt_do.actions.read_file import ReadFile
+from gpt_do.actions.session_state import SessionState, session_scope
+from gpt_do.prompt import VOLATILE_FACTS_RE, system_prompt, volatile_message
+
+
+def test_cacheable_system_prompt_is_byte_stable() -> None:
+    first = system_prompt(ActionEnum.list(), cacheable=True)
+    second = system_prompt(ActionEnum.list(), cacheable=True)
+    assert first.encode() == second.encode()
+    assert not VOLATILE_FACTS_RE.search(first)
+
+    inline = system_prompt(ActionEnum.list(), cacheable=False)
+    assert VOLATILE_FACTS_RE.search(inline)
+    assert VOLATILE_FACTS_RE.fullmatch(str(volatile_message()["content"]))
+
+
+def read_args(path: Path) -> str:
+    return json.dumps(
+        {"path": str(path), "objective": None, "unit": None, "start": None, "end": None}
+    )
+
+
+def test_cacheable_layout_keeps_instructions_out_of_the_context(
+    tmp_path: Path,
+) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("notes\n")
+    client: Any = FakeClient(read_args(path))
+    context: list[Any] = [{"role": "system", "content": "prompt"}]
+    with session_scope(SessionState()):
+        ReadFile.run(client, context, cacheable=True)
+
+    sent = client.requests[0]["messages"]
+    assert sent[0] == {"role": "system", "content": "prompt"}
+    assert sent[1]["content"] == ReadFile.description()
+    assert VOLATILE_FACTS_RE.fullmatch(sent[-1]["content"])
+    # Only the completion and the output are added, so the context stays a
+    # stable prefix of the next request.
+    assert [message["role"] for message in context] == ["system", "assistant", "system"]
+    assert ReadFile.description() not in json.dumps(context)
+
+
+def test_inline_layout_adds_instructions_to_the_context(tmp_path: Path) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("notes\n")
+    client: Any = FakeClient(read_args(path))
+    context: list[Any] = [{"role": "system", "content": "prompt"}]
+    with session_scope(SessionState()):
+        ReadFile.run(client, context, cacheable=False)
+
+    assert context[1] == {"role": "system", "content": ReadFile.description()}
+    assert client.requests[0]["messages"] == context[:2]
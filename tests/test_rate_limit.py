@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import openai
+import pytest
+
+from gpt_do.actions.rate_limit import (
+    RateLimiter,
+    TokenBucket,
+    parse_duration,
+    retry_after,
+)
+
+
+def status_error(status: int, headers: dict[str, str]) -> openai.APIStatusError:
+    # Only the parts of the response the errors and the limiter read.
+    response: Any = SimpleNamespace(request=None, status_code=status, headers=headers)
+    return openai.APIStatusError("failed", response=response, body=None)
+
+
+def test_parse_duration() -> None:
+    assert parse_duration("1m30s") == 90
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("") is None
+
+
+def test_retry_after_prefers_milliseconds() -> None:
+    assert retry_after({"retry-after-ms": "250", "retry-after": "3"}) == 0.25
+    assert retry_after({"retry-after": "3"}) == 3
+    assert retry_after({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}) is None
+
+
+def test_token_bucket_paces_once_empty() -> None:
+    bucket = TokenBucket()
+    assert bucket.delay(1000) == 0
+
+    bucket.set_rate(60)
+    assert bucket.delay(60) == 0
+    bucket.take(60)
+    # One unit per second, and never more than a minute's worth at once.
+    assert bucket.delay(1) == pytest.approx(1, abs=0.01)
+    assert bucket.delay(600) == pytest.approx(60, abs=0.01)
+
+
+def test_retries_rate_limited_requests() -> None:
+    limiter = RateLimiter()
+    calls: list[None] = []
+
+    def request() -> str:
+        calls.append(None)
+        if len(calls) == 1:
+            raise status_error(429, {"retry-after-ms": "10"})
+        return "done"
+
+    assert limiter.call(request, []) == "done"
+    assert len(calls) == 2
+    assert limiter.stats.retries == 1
+    assert limiter.stats.rate_limited == 1
+
+
+def test_does_not_retry_bad_requests() -> None:
+    limiter = RateLimiter()
+    calls: list[None] = []
+
+    def request() -> str:
+        calls.append(None)
+        raise status_error(400, {})
+
+    with pytest.raises(openai.APIStatusError):
+        limiter.call(request, [])
+    assert len(calls) == 1
+    assert limiter.stats.retries == 0
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from gpt_do.actions.read_file import ReadFile
+from gpt_do.actions.retrieval import DocumentStore
+from gpt_do.actions.session_state import SessionState, session_scope
+
+LINES = [f"line{i}\n" for i in range(1, 11)]
+
+
+def read(
+    path: Path,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    unit: Optional[str] = None,
+) -> ReadFile.Output:
+    args = ReadFile.Args.model_validate(
+        {"path": str(path), "objective": None, "unit": unit, "start": start, "end": end}
+    )
+    # A fresh session, so earlier reads are not referred back to.
+    with session_scope(SessionState()):
+        return ReadFile.perform(args)
+
+
+@pytest.fixture(name="text_file", params=["utf-8", "utf-16", "utf-32"])
+def text_file_fixture(tmp_path: Path, request: pytest.FixtureRequest) -> Path:
+    path = tmp_path / f"lines.{request.param}.txt"
+    path.write_text("".join(LINES), encoding=request.param)
+    return path
+
+
+@pytest.mark.parametrize(
+    ("start", "end", "expected"),
+    [
+        (None, None, LINES),
+        (2, 4, LINES[1:4]),
+        (-3, None, LINES[7:]),
+        (-3, -1, LINES[7:]),
+        (-3, -2, LINES[7:9]),
+        (1, -4, LINES[:7]),
+        (9, 20, LINES[8:]),
+    ],
+)
+def test_line_ranges_are_inclusive(
+    text_file: Path, start: Optional[int], end: Optional[int], expected: list[str]
+) -> None:
+    output = read(text_file, start, end)
+    assert output.error is None
+    assert output.contents == "".join(expected)
+    assert output.line_count == 10
+    assert not output.truncated
+
+
+def test_byte_ranges(tmp_path: Path) -> None:
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(LINES))
+    assert read(path, 6, 12, unit="bytes").contents == "line2\n"
+    assert read(path, -7, None, unit="bytes").contents == "line10\n"
+
+
+@pytest.mark.parametrize(("encoding", "unit"), [("utf-16", 2), ("utf-32", 4)])
+def test_wide_byte_ranges_are_aligned_to_code_units(
+    tmp_path: Path, encoding: str, unit: int
+) -> None:
+    path = tmp_path / "wide.txt"
+    path.write_text("abcdef", encoding=encoding)
+    # Past the byte order mark, and cut in the middle of code units.
+    output = read(path, unit + 1, 4 * unit + 1, unit="bytes")
+    assert output.contents == "abc"
+    assert output.line_count == 1
+
+
+def test_wide_line_count_unknown_past_size_cap(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "wide.txt"
+    path.write_text("".join(LINES), encoding="utf-16")
+    monkeypatch.setattr(ReadFile, "SIZE_CAP", 32)
+    output = read(path)
+    assert output.truncated
+    assert output.line_count is None
+    assert output.contents is not None and output.contents.startswith("line1\n")
+
+
+@pytest.mark.parametrize("encoding", ["utf-16", "utf-32"])
+def test_wide_line_ranges_past_size_cap(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, encoding: str
+) -> None:
+    path = tmp_path / "wide.txt"
+    path.write_text("".join(LINES), encoding=encoding)
+    monkeypatch.setattr(ReadFile, "SIZE_CAP", 64)
+
+    tail = read(path, -2)
+    assert tail.contents == "line9\nline10\n"
+    assert not tail.truncated
+    head = read(path, 1, 2)
+    assert head.contents == "line1\nline2\n"
+    assert not head.truncated
+    for start, end in ((9, 10), (2, -1), (-2, 10)):
+        output = read(path, start, end)
+        assert output.contents is None
+        assert output.error is not None
+
+
+def test_narrow_reads_are_capped_at_a_line(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(LINES))
+    monkeypatch.setattr(ReadFile, "SIZE_CAP", 15)
+    output = read(path)
+    assert output.truncated
+    assert output.contents == "line1\nline2\n"
+    assert output.line_count == 10
+
+
+def test_binary_files_are_refused(tmp_path: Path) -> None:
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 4)
+    output = read(path)
+    assert output.contents is None
+    assert output.error is not None and "Not a text file" in output.error
+
+
+def test_rereads_file_whose_document_was_evicted(tmp_path: Path) -> None:
+    large = "".join(f"Paragraph {i}: " + "lorem ipsum " * 20 + "\n" for i in range(200))
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text(large)
+    second.write_text(large)
+    args = ReadFile.Args(
+        path=str(first), objective=None, unit=None, start=None, end=None
+    )
+    with session_scope(SessionState(documents=DocumentStore(max_documents=1))):
+        handle = ReadFile.perform(args).document
+        assert handle is not None
+        ReadFile.perform(args.model_copy(update={"path": str(second)}))
+
+        reread = ReadFile.perform(args)
+    assert reread.document not in (None, handle)
+    assert reread.contents is not None and "unchanged" not in reread.contents
+
+
+def test_rereads_refer_back_or_show_the_diff(tmp_path: Path) -> None:
+    # Long enough that the diff is shorter than the contents.
+    lines = "".join(f"line{i}\n" for i in range(1, 101))
+    path = tmp_path / "lines.txt"
+    path.write_text(lines)
+    args = ReadFile.Args(
+        path=str(path), objective=None, unit=None, start=None, end=None
+    )
+    session = SessionState()
+    with session_scope(session):
+        session.file_cache.advance()
+        ReadFile.perform(args)
+        session.file_cache.advance()
+        unchanged = ReadFile.perform(args)
+        path.write_text(lines.replace("line50\n", "line fifty\n"))
+        changed = ReadFile.perform(args)
+
+    assert unchanged.contents == "[unchanged since step 1; see the output there]"
+    assert changed.contents is not None
+    assert changed.contents.startswith("[changed since step 1]\n")
+    assert "-line50\n+line fifty\n" in changed.contents
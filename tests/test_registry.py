@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from importlib.metadata import EntryPoint
+from typing import Any
+
+import pytest
+
+from gpt_do.actions import check_date_time, check_location
+from gpt_do.actions.registry import REGISTRY, ActionRegistry
+
+# Abstract to mypy, which rejects them where an action class is expected.
+CheckDateTime: Any = check_date_time.CheckDateTime
+CheckLocation: Any = check_location.CheckLocation
+
+
+def test_actions_register_under_their_name() -> None:
+    registry = ActionRegistry()
+    assert registry.register("CHECK_DATE_TIME")(CheckDateTime) is CheckDateTime
+    registry.add("CHECK_LOCATION", CheckLocation)
+    # Registering the same action again is harmless.
+    registry.add("CHECK_DATE_TIME", CheckDateTime)
+
+    assert registry.get("CHECK_LOCATION") is CheckLocation
+    assert registry.name_of(CheckDateTime) == "CHECK_DATE_TIME"
+    assert [name for name, _ in registry.items()] == [
+        "CHECK_DATE_TIME",
+        "CHECK_LOCATION",
+    ]
+    with pytest.raises(NotImplementedError, match="not implemented: SEND_EMAIL"):
+        registry.get("SEND_EMAIL")
+    with pytest.raises(NotImplementedError, match="not registered"):
+        ActionRegistry().name_of(CheckDateTime)
+
+
+def test_names_are_not_reused() -> None:
+    registry = ActionRegistry()
+    registry.add("CHECK", CheckDateTime)
+    with pytest.raises(ValueError, match="already registered to CheckDateTime"):
+        registry.add("CHECK", CheckLocation)
+
+
+def test_builtin_actions_are_registered() -> None:
+    assert REGISTRY.name_of(CheckDateTime) == "CHECK_DATE_TIME"
+    assert "COMPLETE" in dict(REGISTRY.items())
+
+
+def test_plugins_are_loaded_from_entry_points(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    group = "gpt_do.actions"
+    plugins = [
+        EntryPoint("WHAT_TIME", "gpt_do.actions.check_date_time:CheckDateTime", group),
+        # A module whose actions register themselves.
+        EntryPoint("calendar", "gpt_do.actions.add_to_calendar", group),
+        EntryPoint("BROKEN", "gpt_do_missing_plugin:Action", group),
+    ]
+    monkeypatch.setattr(
+        "gpt_do.actions.registry.entry_points",
+        lambda group: [plugin for plugin in plugins if plugin.group == group],
+    )
+    registry = ActionRegistry()
+    registry.load_plugins()
+
+    assert dict(registry.items()) == {"WHAT_TIME": CheckDateTime}
+    assert "Failed to load action plugin BROKEN" in caplog.text
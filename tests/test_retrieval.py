@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+
+from gpt_do.actions.retrieval import (
+    CHUNK_CHARS,
+    TOP_K,
+    DocumentStore,
+    chunk_text,
+)
+
+
+def test_chunks_split_long_lines() -> None:
+    text = "short line\n" + "x" * (CHUNK_CHARS * 3 + 10) + "\nlast line"
+    chunks = chunk_text(text)
+    assert all(len(chunk) <= CHUNK_CHARS for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == text.replace("\n", "")
+
+
+def test_chunks_split_long_lines_at_whitespace() -> None:
+    chunks = chunk_text("word " * 1000, max_chars=100)
+    assert all(chunk.endswith("word ") for chunk in chunks[:-1])
+
+
+def test_chunks_start_at_headings() -> None:
+    assert chunk_text("intro\n# Title\nbody") == ["intro", "# Title\nbody"]
+
+
+def test_retrieve_returns_part_of_a_single_line_document() -> None:
+    records = [{"id": i, "name": f"item {i}", "tags": ["a", "b"]} for i in range(8000)]
+    text = json.dumps(records)
+    assert "\n" not in text and len(text) > 300_000
+
+    contents, handle = DocumentStore().retrieve("items.json", text, "item 4242")
+
+    assert handle is not None
+    assert len(contents) < (TOP_K + 1) * (CHUNK_CHARS + 100)
+    assert '"item 4242"' in contents
+
+
+def test_small_documents_are_returned_whole() -> None:
+    assert DocumentStore().retrieve("notes.txt", "hello", None) == ("hello", None)
+
+
+def test_store_drops_least_recently_used_documents() -> None:
+    store = DocumentStore(max_documents=2)
+    first = store.add("a", "alpha " * 10)
+    second = store.add("b", "beta " * 10)
+    assert store.get(first.handle) is first
+    third = store.add("c", "gamma " * 10)
+
+    assert store.get(second.handle) is None
+    assert store.get(first.handle) is first
+    assert store.get(third.handle) is third
+
+
+def test_store_is_bounded_by_size() -> None:
+    store = DocumentStore(max_chars=1000)
+    first = store.add("a", "a" * 800)
+    second = store.add("b", "b" * 800)
+    assert store.get(first.handle) is None
+    assert store.get(second.handle) is second
+    assert store.add("c", "c" * 5000).handle == "doc-3"
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from gpt_do.actions.routing import ModelRouter, parse_routes
+from gpt_do.actions.step import Step
+
+
+def router(**routes: str) -> ModelRouter:
+    model_router = ModelRouter()
+    model_router.configure(fast_model="fast-model", strong_model="strong-model")
+    model_router.configure(routes=routes)
+    return model_router
+
+
+def step_args(*steps: dict[str, Any]) -> Step.Args:
+    return Step.Args.model_validate(
+        {"reasoning": "", "current_plan": [], "steps": list(steps)}
+    )
+
+
+def test_fast_tier_escalates_to_strong() -> None:
+    assert router().models_for("STEP", "fast") == ["fast-model", "strong-model"]
+    assert router().models_for("STEP", "strong") == ["strong-model"]
+
+
+def test_routes_override_tier() -> None:
+    model_router = router(STEP="strong", READ_FILE="custom-model")
+    assert model_router.models_for("STEP", "fast") == ["strong-model"]
+    assert model_router.models_for("READ_FILE", "fast") == ["custom-model"]
+    assert model_router.needs_strong("STEP", "fast")
+    assert not model_router.needs_strong("READ_FILE", "strong")
+
+
+def test_no_escalation() -> None:
+    model_router = router()
+    model_router.configure(escalate=False)
+    assert model_router.models_for("STEP", "fast") == ["fast-model"]
+
+
+def test_parse_routes() -> None:
+    assert parse_routes(("step = fast", "READ_FILE=gpt-x")) == {
+        "STEP": "fast",
+        "READ_FILE": "gpt-x",
+    }
+    with pytest.raises(ValueError):
+        parse_routes(("STEP",))
+
+
+def test_step_escalates_actions_needing_strong_model() -> None:
+    assert Step.model_tier == "fast"
+    read_only = step_args({"action": "CHECK_DATE_TIME", "args": {}})
+    assert Step.escalation_reason(read_only) is None
+    answer = step_args(
+        {"action": "DISPLAY_TO_USER", "args": {"message": "Done."}},
+        {
+            "action": "COMPLETE",
+            "args": {
+                "completed_objectives": [],
+                "failed_objectives": [],
+                "summary": "",
+                "tool_feedback": "",
+            },
+        },
+    )
+    assert Step.escalation_reason(answer) is None
+
+    command = step_args(
+        {"action": "CHECK_DATE_TIME", "args": {}},
+        {
+            "action": "EXECUTE_BASH_COMMAND",
+            "args": {"command": "ls", "timeout_s": None},
+        },
+    )
+    reason = Step.escalation_reason(command)
+    assert reason is not None
+    assert "EXECUTE_BASH_COMMAND" in reason
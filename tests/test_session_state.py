@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from gpt_do.actions.list_directory import ListDirectory
+from gpt_do.actions.search_document import SearchDocument
+from gpt_do.actions.session_state import SessionState, session_scope
+
+LARGE_TEXT = "\n".join(f"Paragraph {i}: " + "lorem ipsum " * 20 for i in range(200))
+
+
+def test_document_handles_belong_to_their_session() -> None:
+    first, second = SessionState(), SessionState()
+    _, handle = first.documents.retrieve("notes.txt", LARGE_TEXT, "Paragraph 7")
+    assert handle is not None
+    args = SearchDocument.Args(document=handle, query="Paragraph 150")
+
+    with session_scope(second):
+        assert SearchDocument.perform(args).error is not None
+    with session_scope(first):
+        output = SearchDocument.perform(args)
+    assert output.error is None
+    assert output.text is not None and "Paragraph 150" in output.text
+
+
+def test_walk_cursors_belong_to_their_session(tmp_path: Path) -> None:
+    for i in range(ListDirectory.PAGE_SIZE + 10):
+        (tmp_path / f"file{i:03}.txt").touch()
+    first, second = SessionState(), SessionState()
+    args = ListDirectory.Args(
+        path=str(tmp_path),
+        max_depth=1,
+        globs=None,
+        include_hidden=False,
+        include_ignored=False,
+        cursor=None,
+    )
+    with session_scope(first):
+        page = ListDirectory.perform(args)
+    assert page.cursor is not None
+    args = args.model_copy(update={"cursor": page.cursor})
+
+    with session_scope(second):
+        assert ListDirectory.perform(args).error is not None
+    with session_scope(first):
+        rest = ListDirectory.perform(args)
+    assert len(page.files) + len(rest.files) == ListDirectory.PAGE_SIZE + 10
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+import pytest
+
+from gpt_do.actions.shell_session import Framer, ShellSession
+
+MARKER = b"\n__marker__ "
+
+
+def test_framer_splits_output_from_the_marker_line() -> None:
+    framer = Framer(MARKER)
+    output = framer.feed(b"hello\nwor")
+    output += framer.feed(b"ld")
+    output += framer.feed(b"\n__mark")
+    assert not framer.done
+    output += framer.feed(b"er__ 7\nleftover")
+    assert framer.done
+    assert framer.return_code == 7
+    assert output == b"hello\nworld"
+
+
+def test_framer_releases_what_turns_out_not_to_be_the_marker() -> None:
+    framer = Framer(MARKER)
+    output = framer.feed(b"abc\n__mar")
+    output += framer.feed(b"ch is not a marker\n")
+    assert not framer.done
+    output += framer.feed(MARKER + b"0\n")
+    assert framer.done
+    assert framer.return_code == 0
+    assert output == b"abc\n__march is not a marker\n"
+
+
+@pytest.fixture(name="session")
+def session_fixture() -> Iterator[ShellSession]:
+    session = ShellSession(enabled=True)
+    yield session
+    session.close()
+
+
+def test_state_carries_over(session: ShellSession) -> None:
+    session.run("cd /tmp && export GREETING=hi", 10, 1024, echo=False)
+    result = session.run("echo $GREETING; pwd", 10, 1024, echo=False)
+    assert result.stdout.text() == "hi\n/tmp\n"
+    assert result.return_code == 0
+
+
+def test_return_codes_and_syntax_errors(session: ShellSession) -> None:
+    assert session.run("false", 10, 1024, echo=False).return_code == 1
+    result = session.run("if then", 10, 1024, echo=False)
+    assert result.return_code != 0
+    assert "syntax error" in result.stderr.text()
+    assert session.run("echo still here", 10, 1024, echo=False).return_code == 0
+
+
+def test_output_without_trailing_newline(session: ShellSession) -> None:
+    result = session.run("printf 'no newline'", 10, 1024, echo=False)
+    assert result.stdout.text() == "no newline"
+
+
+def test_timeout_restarts_the_shell(session: ShellSession) -> None:
+    session.run("export KEPT=1", 10, 1024, echo=False)
+    result = session.run("sleep 5", 0.5, 1024, echo=False)
+    assert result.timed_out
+    result = session.run("echo ${KEPT:-lost}", 10, 1024, echo=False)
+    assert result.stdout.text() == "lost\n"
+
+
+def test_exit_restarts_the_shell(session: ShellSession) -> None:
+    result = session.run("sleep 5 & exit 4", 10, 1024, echo=False)
+    assert result.return_code == 4
+    assert not result.timed_out
+    assert result.duration_s < 3
+    assert session.run("echo back", 10, 1024, echo=False).stdout.text() == "back\n"
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from gpt_do.actions.read_file import ReadFile
+from gpt_do.actions.schema import response_schema
+from gpt_do.actions.session_state import SessionState, session_scope
+from gpt_do.actions.step import Step, aexecute_steps, execute_steps
+
+
+def read_step(path: Path) -> dict[str, Any]:
+    return {
+        "action": "READ_FILE",
+        "args": {
+            "path": str(path),
+            "objective": None,
+            "unit": None,
+            "start": None,
+            "end": None,
+        },
+    }
+
+
+def planned(*steps: dict[str, Any]) -> list[Step.Planned]:
+    args = Step.Args.model_validate(
+        {"reasoning": "", "current_plan": [], "steps": list(steps)}
+    )
+    return Step.perform(args).steps
+
+
+def test_steps_are_not_empty() -> None:
+    with pytest.raises(ValidationError):
+        planned()
+    response_format: Any = response_schema(Step.Args).response_format
+    schema = response_format["json_schema"]["schema"]
+    assert schema["properties"]["steps"]["minItems"] == 1
+
+
+def test_complete_parallel_safe_steps_are_dispatched(tmp_path: Path) -> None:
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text("first\n")
+    second.write_text("second\n")
+    command = {"action": "EXECUTE_BASH_COMMAND", "args": {"command": "rm -rf /"}}
+    state = SessionState()
+    with session_scope(state):
+        # The last step is still streaming.
+        Step.dispatch_partial({"steps": [read_step(first), read_step(second)]})
+        Step.dispatch_partial({"steps": [command, read_step(first), {"act": ""}]})
+        assert state.dispatch.stats.started == 1
+
+        outputs = execute_steps(planned(read_step(first), read_step(second)), [])
+    assert state.dispatch.stats.used == 1
+    assert [output.contents for output in outputs] == [  # type: ignore[attr-defined]
+        "first\n",
+        "second\n",
+    ]
+
+
+def test_dispatched_steps_are_used_on_the_event_loop(tmp_path: Path) -> None:
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text("first\n")
+    second.write_text("second\n")
+    state = SessionState()
+    context: list[Any] = []
+    with session_scope(state):
+        Step.dispatch_partial({"steps": [read_step(first), read_step(second)]})
+        steps = planned(read_step(first), read_step(second))
+        outputs = asyncio.run(aexecute_steps(steps, context))
+    assert state.dispatch.stats.used == 1
+    assert isinstance(outputs[0], ReadFile.Output)
+    assert outputs[0].contents == "first\n"
+    assert len(context) == 2
+
+
+def test_steps_not_selected_in_the_end_are_dropped(tmp_path: Path) -> None:
+    first = tmp_path / "a.txt"
+    first.write_text("first\n")
+    state = SessionState()
+    with session_scope(state):
+        Step.dispatch_partial({"steps": [read_step(first), {}]})
+        state.dispatch.clear()
+        execute_steps(planned(read_step(first), read_step(first)), [])
+    assert state.dispatch.stats.started == 1
+    assert state.dispatch.stats.used == 0
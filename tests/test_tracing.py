@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from gpt_do.tracing import Tracer
+
+
+def test_disabled_tracer_records_nothing() -> None:
+    tracer = Tracer()
+    with tracer.span("session") as span:
+        span.set(model="gpt-4o-mini")
+    assert not tracer.spans
+
+
+def test_spans_nest_and_record_attributes() -> None:
+    tracer = Tracer(enabled=True)
+    history: list[Any] = [{"role": "user", "content": "Hi"}]
+    with tracer.span("session"):
+        with tracer.span(
+            "completion.Step", history=history, model="gpt-4o-mini"
+        ) as span:
+            usage: Any = SimpleNamespace(
+                prompt_tokens=100,
+                completion_tokens=20,
+                prompt_tokens_details=SimpleNamespace(cached_tokens=None),
+            )
+            span.record_usage(usage)
+        with pytest.raises(KeyError):
+            with tracer.span("action.READ_FILE"):
+                raise KeyError("path")
+
+    # Spans are recorded as they end.
+    assert [span.name for span in tracer.spans] == [
+        "completion.Step",
+        "action.READ_FILE",
+        "session",
+    ]
+    completion, action, session = tracer.spans[0], tracer.spans[1], tracer.spans[2]
+    assert session.parent is None
+    assert completion.parent == action.parent == session.id
+    assert completion.attrs == {
+        "model": "gpt-4o-mini",
+        "history_messages": 1,
+        "history_bytes": len(json.dumps(history).encode()),
+        "prompt_tokens": 100,
+        "completion_tokens": 20,
+        "cached_tokens": 0,
+    }
+    assert action.attrs == {"error": "KeyError"}
+    assert session.duration_s is not None and completion.duration_s is not None
+    assert session.duration_s >= completion.duration_s
+
+
+def test_spans_follow_tasks_and_threads() -> None:
+    tracer = Tracer(enabled=True)
+
+    async def completion(name: str) -> None:
+        with tracer.span(name):
+            await asyncio.sleep(0.01)
+
+    async def session() -> None:
+        with tracer.span("session"):
+            await asyncio.gather(completion("a"), completion("b"))
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, contextvars.copy_context().run, action)
+
+    def action() -> None:
+        with tracer.span("c"):
+            pass
+
+    asyncio.run(session())
+    by_name = {span.name: span for span in tracer.spans}
+    assert by_name["a"].parent == by_name["b"].parent == by_name["session"].id
+    assert by_name["c"].parent == by_name["session"].id
+    assert by_name["c"].thread != by_name["session"].thread == threading.get_ident()
+
+
+def test_exports(tmp_path: Path) -> None:
+    tracer = Tracer(enabled=True)
+    with tracer.span("session"):
+        with tracer.span("completion.Step", model="gpt-4o-mini"):
+            pass
+        with tracer.span("completion.Step"):
+            pass
+
+    tracer.export_jsonl(tmp_path / "trace.jsonl")
+    lines = (tmp_path / "trace.jsonl").read_text().splitlines()
+    names = [json.loads(line)["name"] for line in lines]
+    assert names == ["session", "completion.Step", "completion.Step"]
+
+    tracer.export_chrome(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert {event["ph"] for event in events} == {"X"}
+    assert {event["cat"] for event in events} == {"session", "completion"}
+    step = next(event for event in events if event["args"])
+    assert step["args"] == {"model": "gpt-4o-mini"}
+
+    count, total = tracer.summary()["completion.Step"]
+    assert count == 2 and total >= 0
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from gpt_do.actions.list_directory import ListDirectory
+from gpt_do.actions.session_state import SessionState, session_scope
+from gpt_do.actions.walk import IgnorePattern, IgnoreRules, Walker
+
+
+def rules(*lines: str, base: str = "") -> IgnoreRules:
+    parsed = (IgnorePattern.parse(line, base) for line in lines)
+    return IgnoreRules(tuple(pattern for pattern in parsed if pattern is not None))
+
+
+def test_last_matching_pattern_wins() -> None:
+    ignore = rules("*.log", "!keep.log", "# comment", "")
+    assert ignore.ignored("debug.log", is_dir=False)
+    assert ignore.ignored("src/debug.log", is_dir=False)
+    assert not ignore.ignored("src/keep.log", is_dir=False)
+    assert not ignore.ignored("debug.txt", is_dir=False)
+
+    assert rules("!keep.log", "*.log").ignored("keep.log", is_dir=False)
+
+
+@pytest.mark.parametrize(
+    ("pattern", "path", "expected"),
+    [
+        ("build", "build", True),
+        ("build", "src/build", True),
+        ("/build", "build", True),
+        ("/build", "src/build", False),
+        ("docs/*.md", "docs/index.md", True),
+        ("docs/*.md", "src/docs/index.md", False),
+        ("**/docs", "src/docs", True),
+        ("\\!important", "!important", True),
+    ],
+)
+def test_patterns_with_a_slash_are_anchored(
+    pattern: str, path: str, expected: bool
+) -> None:
+    assert rules(pattern).ignored(path, is_dir=True) is expected
+
+
+def test_trailing_slash_only_matches_directories() -> None:
+    ignore = rules("out/")
+    assert ignore.ignored("out", is_dir=True)
+    assert not ignore.ignored("out", is_dir=False)
+
+
+def test_patterns_apply_below_their_gitignore() -> None:
+    ignore = rules("*.tmp", "/cache", base="sub")
+    assert ignore.ignored("sub/a.tmp", is_dir=False)
+    assert ignore.ignored("sub/cache", is_dir=True)
+    assert not ignore.ignored("a.tmp", is_dir=False)
+    assert not ignore.ignored("cache", is_dir=True)
+
+
+@pytest.fixture(name="tree")
+def tree_fixture(tmp_path: Path) -> Path:
+    for name in [
+        "README.md",
+        "main.py",
+        "debug.log",
+        "keep.log",
+        ".env",
+        "build/output.bin",
+        "node_modules/pkg/index.js",
+        "src/app.py",
+        "src/build/generated.py",
+        "src/deep/nested/module.py",
+        "sub/notes.tmp",
+        "sub/notes.txt",
+    ]:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    (tmp_path / ".gitignore").write_text("*.log\n!keep.log\n/build/\n")
+    (tmp_path / "sub" / ".gitignore").write_text("*.tmp\n")
+    return tmp_path
+
+
+def walk(root: Path, **kwargs: Any) -> tuple[set[str], set[str]]:
+    """Return the relative paths of the listed and of the ignored entries."""
+    entries = list(Walker(str(root), **kwargs))
+    listed = {Path(e.path).relative_to(root).as_posix() for e in entries}
+    ignored = {Path(e.path).relative_to(root).as_posix() for e in entries if e.ignored}
+    return listed - ignored, ignored
+
+
+def test_walk_follows_gitignore_files(tree: Path) -> None:
+    listed, ignored = walk(tree)
+    assert ignored == {"build", "node_modules"}
+    assert "keep.log" in listed and "debug.log" not in listed
+    assert "src/build/generated.py" in listed
+    assert "sub/notes.txt" in listed and "sub/notes.tmp" not in listed
+    assert ".env" not in listed and ".gitignore" not in listed
+
+
+def test_walk_options(tree: Path) -> None:
+    listed, _ = walk(tree, include_hidden=True)
+    assert {".env", ".gitignore"} <= listed
+
+    listed, ignored = walk(tree, include_ignored=True)
+    assert not ignored
+    assert {"debug.log", "build/output.bin", "node_modules/pkg/index.js"} <= listed
+
+    listed, _ = walk(tree, globs=["*.py"])
+    files = {path for path in listed if path.endswith((".py", ".md", ".txt"))}
+    assert files == {
+        "main.py",
+        "src/app.py",
+        "src/build/generated.py",
+        "src/deep/nested/module.py",
+    }
+
+    listed, _ = walk(tree, globs=["src/*.py"])
+    assert "src/app.py" in listed and "main.py" not in listed
+
+    listed, _ = walk(tree, max_depth=2)
+    assert "src/deep" in listed and "src/deep/nested" not in listed
+
+    listed, ignored = walk(tree, exclude=[str(tree / "src")])
+    assert "src" in ignored and "src/app.py" not in listed
+
+
+def test_walk_is_taken_in_pages(tree: Path) -> None:
+    everything = [entry.path for entry in Walker(str(tree))]
+    walker = Walker(str(tree))
+    pages = []
+    more = True
+    while more:
+        page, more = walker.take(3)
+        pages.append([entry.path for entry in page])
+    assert [path for page in pages for path in page] == everything
+    assert all(len(page) == 3 for page in pages[:-1])
+    assert walker.take(3) == ([], False)
+
+
+def test_listing_resumes_from_a_cursor(
+    tree: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(ListDirectory, "PAGE_SIZE", 4)
+    args = ListDirectory.Args(
+        path=str(tree),
+        max_depth=None,
+        globs=None,
+        include_hidden=False,
+        include_ignored=False,
+        cursor=None,
+    )
+    listed: list[str] = []
+    with session_scope(SessionState()):
+        output = ListDirectory.perform(args)
+        while True:
+            listed += output.files + [d.path for d in output.dirs] + output.ignored
+            if output.cursor is None:
+                break
+            cursor = output.cursor
+            output = ListDirectory.perform(args.model_copy(update={"cursor": cursor}))
+        exhausted = ListDirectory.perform(args.model_copy(update={"cursor": cursor}))
+
+    assert sorted(listed) == sorted(entry.path for entry in Walker(str(tree)))
+    assert exhausted.error is not None and "exhausted" in exhausted.error